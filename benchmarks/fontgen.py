@@ -0,0 +1,138 @@
+import struct
+import argparse
+from pathlib import Path
+
+# -------------------------------------------------------------------
+# 合成字体生成器：写出最小但合法的 TrueType 文件，用于基准测试
+# 每个字形都是同样的方框轮廓（36 字节），cmap 很大的字体文件也只有几百 KB
+# -------------------------------------------------------------------
+UNITS_PER_EM = 1000
+ASCII_RANGE = (0x20, 0x7E)
+# 大字符集依次从这些区间里取码位
+EXTRA_RANGES = ((0x00A0, 0x024F), (0x0370, 0x03FF), (0x0400, 0x04FF), (0x3040, 0x30FF), (0x4E00, 0x9FFF), (0x20000, 0x2A6DF))
+STYLES = (  # (子族名, usWeightClass, 斜体)
+    ("Regular", 400, False), ("Bold", 700, False), ("Italic", 400, True),
+    ("Light", 300, False), ("Black", 900, False), ("Bold Italic", 700, True),
+)
+WIDTH_CLASSES = (5, 3, 7, 5, 4, 6)
+DEFAULT_CMAP_SIZES = (95, 256, 1024, 4096)
+
+def pick_codepoints(count):
+    codepoints = list(range(ASCII_RANGE[0], ASCII_RANGE[1] + 1))[:count]
+    for start, end in EXTRA_RANGES:
+        if len(codepoints) >= count: break
+        codepoints.extend(range(start, min(end + 1, start + count - len(codepoints))))
+    return codepoints
+
+def _checksum(data):
+    data += b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(f">{len(data) // 4}I", data)) & 0xFFFFFFFF
+
+def _ranges(codepoints):
+    # 连续码位合并成 (起, 止, 起始字形号)；字形号按码位顺序从 1 开始
+    groups = []
+    for gid, cp in enumerate(codepoints, start=1):
+        if groups and cp == groups[-1][1] + 1 and gid == groups[-1][2] + cp - groups[-1][0]:
+            groups[-1][1] = cp
+        else:
+            groups.append([cp, cp, gid])
+    return groups
+
+def _cmap(codepoints):
+    groups = _ranges(codepoints)
+    # 格式 4 只放 BMP 部分
+    segments = []
+    for start, end, gid in groups:
+        if start > 0xFFFF: break
+        end = min(end, 0xFFFE)
+        segments.append((start, end, (gid - start) & 0xFFFF))
+    segments.append((0xFFFF, 0xFFFF, 1))
+    seg_count = len(segments)
+    search_range = 2 * (1 << (seg_count.bit_length() - 1)); entry_selector = seg_count.bit_length() - 1
+    f4 = struct.pack(">4H", seg_count * 2, search_range, entry_selector, seg_count * 2 - search_range)
+    f4 += struct.pack(f">{seg_count}H", *(s[1] for s in segments)) + b"\0\0"
+    f4 += struct.pack(f">{seg_count}H", *(s[0] for s in segments))
+    f4 += struct.pack(f">{seg_count}H", *(s[2] for s in segments))
+    f4 += struct.pack(f">{seg_count}H", *([0] * seg_count))
+    f4 = struct.pack(">3H", 4, 6 + len(f4), 0) + f4
+    f12 = b"".join(struct.pack(">3I", start, end, gid) for start, end, gid in groups)
+    f12 = struct.pack(">HHIII", 12, 0, 16 + len(f12), 0, len(groups)) + f12
+    header = struct.pack(">HH", 0, 2) + struct.pack(">HHI", 3, 1, 20) + struct.pack(">HHI", 3, 10, 20 + len(f4))
+    return header + f4 + f12
+
+def _name(family, style):
+    records = {1: family, 2: style, 3: f"{family} {style};synthetic", 4: f"{family} {style}", 6: f"{family}-{style}".replace(" ", "")}
+    strings = b""; entries = b""
+    for name_id, value in records.items():
+        encoded = value.encode("utf-16-be")
+        entries += struct.pack(">6H", 3, 1, 0x409, name_id, len(encoded), len(strings))
+        strings += encoded
+    return struct.pack(">3H", 0, len(records), 6 + len(entries)) + entries + strings
+
+def build_font(family, style="Regular", weight=400, italic=False, width_class=5, cmap_size=95, monospace=False, panose=bytes(10)):
+    codepoints = pick_codepoints(cmap_size)
+    num_glyphs = len(codepoints) + 1
+    advance = 600 if monospace else 1000
+    # 方框轮廓：1 个轮廓 4 个点，坐标用相对增量；.notdef 为空字形
+    box = struct.pack(">hhhhh", 1, 50, 0, advance - 50, 700) + struct.pack(">HH", 3, 0) + bytes([1, 1, 1, 1])
+    box += struct.pack(">4h", 50, 0, advance - 100, 0) + struct.pack(">4h", 0, 700, 0, -700)
+    box += b"\0" * (-len(box) % 4)
+    glyf = box * (num_glyphs - 1)
+    loca = struct.pack(">I", 0) + struct.pack(f">{num_glyphs}I", *(len(box) * i for i in range(num_glyphs)))
+    mac_style = (1 if weight >= 700 else 0) | (2 if italic else 0)
+    head = struct.pack(">IIIIHHqqhhhhHHhhh", 0x00010000, 0x00010000, 0, 0x5F0F3CF5, 0x000B, UNITS_PER_EM,
+                       0, 0, 0, 0, advance, 700, mac_style, 8, 2, 1, 0)
+    hhea = struct.pack(">I3hH6h4hhH", 0x00010000, 800, -200, 0, advance, 0, 50, advance - 50, 1, 0, 0, 0, 0, 0, 0, 0, 1)
+    hmtx = struct.pack(">Hh", advance, 0) + struct.pack(f">{num_glyphs - 1}h", *([50] * (num_glyphs - 1)))
+    maxp = struct.pack(">I14H", 0x00010000, num_glyphs, 4, 1, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, 0)
+    unicode_ranges = [1, 0, 0, 0]                      # bit 0: Basic Latin
+    if any(0x4E00 <= cp <= 0x9FFF for cp in codepoints): unicode_ranges[1] |= 1 << (59 - 32)
+    if any(0x3040 <= cp <= 0x30FF for cp in codepoints): unicode_ranges[1] |= (1 << (49 - 32)) | (1 << (50 - 32))
+    if any(cp > 0xFFFF for cp in codepoints): unicode_ranges[1] |= 1 << (57 - 32)
+    fs_selection = (0x01 if italic else 0) | (0x20 if weight >= 700 else 0) | (0x40 if weight < 700 and not italic else 0)
+    os2 = struct.pack(">HhHHH", 4, advance, weight, width_class, 0) + struct.pack(">8h", 650, 600, 0, 75, 650, 600, 0, 350)
+    os2 += struct.pack(">hhh", 50, 250, 0) + panose + struct.pack(">4I", *unicode_ranges) + b"AFVS"
+    os2 += struct.pack(">HHH", fs_selection, min(codepoints[0], 0xFFFF), min(codepoints[-1], 0xFFFF))
+    os2 += struct.pack(">hhhHH", 800, -200, 0, 800, 200) + struct.pack(">2I", 1, 0) + struct.pack(">hhHHH", 500, 700, 0, 32, 1)
+    post = struct.pack(">IihhIIIII", 0x00030000, -12 << 16 if italic else 0, -100, 50, 1 if monospace else 0, 0, 0, 0, 0)
+    tables = {
+        b"OS/2": os2, b"cmap": _cmap(codepoints), b"glyf": glyf, b"head": head, b"hhea": hhea,
+        b"hmtx": hmtx, b"loca": loca, b"maxp": maxp, b"name": _name(family, style), b"post": post,
+    }
+    num_tables = len(tables)
+    search_range = 16 * (1 << (num_tables.bit_length() - 1)); entry_selector = num_tables.bit_length() - 1
+    out = struct.pack(">IHHHH", 0x00010000, num_tables, search_range, entry_selector, num_tables * 16 - search_range)
+    offset = 12 + 16 * num_tables; directory = b""; body = b""; head_offset = 0
+    for tag in sorted(tables):
+        data = tables[tag]
+        if tag == b"head": head_offset = offset
+        directory += struct.pack(">4sIII", tag, _checksum(data), offset, len(data))
+        padded = data + b"\0" * (-len(data) % 4)
+        body += padded; offset += len(padded)
+    font = bytearray(out + directory + body)
+    struct.pack_into(">I", font, head_offset + 8, (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
+
+def generate_library(out_dir, count, cmap_sizes=DEFAULT_CMAP_SIZES, prefix="AFV Synthetic"):
+    # 生成 count 个字体文件，名字、字重、宽度、斜体、字符集大小轮流变化，返回文件路径列表
+    out_dir = Path(out_dir); out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        style, weight, italic = STYLES[i % len(STYLES)]
+        family = f"{prefix} {i // len(STYLES):05d}"
+        path = out_dir / f"{family.replace(' ', '')}-{style.replace(' ', '')}.ttf"
+        if not path.exists():
+            data = build_font(family, style, weight, italic, WIDTH_CLASSES[i % len(WIDTH_CLASSES)],
+                              cmap_sizes[i % len(cmap_sizes)], monospace=(i % 7 == 0))
+            with open(path, 'wb') as f: f.write(data)
+        paths.append(str(path))
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成 TrueType 字体库")
+    parser.add_argument("out_dir")
+    parser.add_argument("-n", "--count", type=int, default=100)
+    parser.add_argument("--cmap-sizes", default=",".join(map(str, DEFAULT_CMAP_SIZES)), help="逗号分隔，轮流使用的字符集大小")
+    args = parser.parse_args()
+    paths = generate_library(args.out_dir, args.count, tuple(int(x) for x in args.cmap_sizes.split(",")))
+    print(f"已生成 {len(paths)} 个字体到 {args.out_dir}")
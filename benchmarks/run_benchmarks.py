@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import contextlib
+from pathlib import Path
+
+# 无界面运行，必须在导入 Qt 之前设置
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt, QT_VERSION_STR, PYQT_VERSION_STR
+
+import main
+from fontgen import generate_library, build_font
+
+# -------------------------------------------------------------------
+# 基准测试：冷/热启动、列表填充、切换字体、各字号预览耗时
+# 结果输出为 JSON，并和保存的基线比较
+# -------------------------------------------------------------------
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+LIST_SIZES = (1000, 10000, 50000)
+PREVIEW_SIZES = (main.MIN_FONT_SIZE, 16, 32, 64, 128, 200, main.MAX_FONT_SIZE)
+LONG_SAMPLE = "The quick brown fox jumps over the lazy dog. 敏捷的棕色狐狸跳过了懒狗。" * 8
+CHAPTER_PARAGRAPHS = 300
+GLYPH_MAP_CMAP_SIZE = 60000
+GLYPH_SEARCH_QUERIES = ("cat face", "U+4E00", "latin small letter", "cjk unified ideograph")
+CORPUS_MB = 64
+CORPUS_FONTS = 10000
+FACET_FONTS = 50000
+FACET_TOGGLES = (("italic", 1), ("weight", 2), ("scripts", 9), ("weight", 3), ("scripts", 9), ("italic", 1), ("weight", 2), ("weight", 3))
+
+class BenchViewer(main.FontViewerApp):
+    # 把程序目录指向临时目录，不碰用户自己的 fonts 和配置
+    app_dir = None
+    def get_app_path(self): return self.app_dir
+
+def wait_until(app, predicate, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline: raise TimeoutError("等待超时")
+        app.processEvents()
+        time.sleep(0.0005)
+
+def make_viewer(app, app_dir):
+    BenchViewer.app_dir = Path(app_dir)
+    start = time.perf_counter()
+    viewer = BenchViewer(); viewer.show()
+    wait_until(app, lambda: viewer.first_paint_done)
+    first_paint = (time.perf_counter() - start) * 1000
+    wait_until(app, lambda: "consistent_ms" in viewer.startup_timings)
+    consistent = (time.perf_counter() - start) * 1000
+    return viewer, first_paint, consistent
+
+def close_viewer(app, viewer):
+    viewer.close(); app.processEvents(); viewer.deleteLater(); app.processEvents()
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def bench_startup(app, work_dir, font_paths, metrics):
+    app_dir = work_dir / "startup"; fonts_dir = app_dir / "fonts"; fonts_dir.mkdir(parents=True)
+    for p in font_paths: shutil.copy(p, fonts_dir)
+    # 冷启动：没有快照；热启动：上一次退出时已经写好快照
+    viewer, first_paint, consistent = make_viewer(app, app_dir)
+    metrics["startup.cold.first_paint_ms"] = first_paint; metrics["startup.cold.consistent_ms"] = consistent
+    viewer.font_list_widget.setCurrentRow(0); close_viewer(app, viewer)
+    viewer, first_paint, consistent = make_viewer(app, app_dir)
+    metrics["startup.warm.first_paint_ms"] = first_paint; metrics["startup.warm.consistent_ms"] = consistent
+    close_viewer(app, viewer)
+
+def bench_list_population(app, work_dir, sizes, metrics):
+    app_dir = work_dir / "empty"; (app_dir / "fonts").mkdir(parents=True)
+    for n in sizes:
+        viewer, _, _ = make_viewer(app, app_dir)
+        paths = [f"/nonexistent/bench/font_{i:06d}.ttf" for i in range(n)]
+        start = time.perf_counter()
+        for p in paths: viewer.add_font_to_list(p)
+        app.processEvents()
+        metrics[f"list.populate.{n}.ms"] = (time.perf_counter() - start) * 1000
+        viewer.font_list_widget.clear(); viewer.font_items.clear(); close_viewer(app, viewer)
+        (app_dir / "fonts" / "library_snapshot.json").unlink(missing_ok=True)
+
+def bench_font_switch(app, work_dir, font_paths, metrics):
+    app_dir = work_dir / "switch"; (app_dir / "fonts").mkdir(parents=True)
+    viewer, _, _ = make_viewer(app, app_dir)
+    for p in font_paths: viewer.add_font_to_list(p)
+    for label in ("cold", "warm"):
+        timings = []
+        for row in range(viewer.font_list_widget.count()):
+            item = viewer.font_list_widget.item(row); path = item.data(Qt.UserRole)
+            start = time.perf_counter()
+            viewer.font_list_widget.setCurrentItem(item); viewer.on_font_selected(item)
+            wait_until(app, lambda: viewer.font_path_label.text() == path)
+            timings.append((time.perf_counter() - start) * 1000)
+            viewer.font_path_label.setText("")
+        metrics[f"switch.{label}.median_ms"] = statistics.median(timings)
+        metrics[f"switch.{label}.p95_ms"] = percentile(timings, 0.95)
+    close_viewer(app, viewer)
+
+def bench_preview(app, work_dir, font_path, repeats, metrics):
+    app_dir = work_dir / "preview"; (app_dir / "fonts").mkdir(parents=True)
+    viewer, _, _ = make_viewer(app, app_dir)
+    viewer.add_font_to_list(font_path); item = viewer.font_list_widget.item(0)
+    viewer.on_font_selected(item); wait_until(app, lambda: viewer.current_font_family)
+    for sample_name, sample in (("short", ""), ("long", LONG_SAMPLE)):
+        viewer.text_entry.blockSignals(True); viewer.text_entry.setText(sample); viewer.text_entry.blockSignals(False)
+        for size in PREVIEW_SIZES:
+            viewer.preview_font_size = size
+            timings = []
+            for _ in range(repeats):
+                # 瓦片在后台绘制：计时到视口内的瓦片全部画好为止，每次先清空瓦片缓存
+                viewer.preview_canvas.clear_tiles()
+                start = time.perf_counter(); viewer.update_preview()
+                wait_until(app, lambda: not viewer.preview_canvas.missing_tiles())
+                timings.append((time.perf_counter() - start) * 1000)
+            metrics[f"preview.{sample_name}.{size}pt.ms"] = statistics.median(timings)
+        # 按住滑块拖动：只缩放上一次的完整渲染，应当与字号无关
+        viewer.preview_font_size = main.INITIAL_FONT_SIZE; viewer.update_preview()
+        wait_until(app, lambda: not viewer.preview_canvas.missing_tiles())
+        viewer.size_slider.setSliderDown(True); timings = []
+        for size in range(main.MIN_FONT_SIZE, main.MAX_FONT_SIZE + 1, 4):
+            start = time.perf_counter(); viewer.on_size_changed(size); timings.append((time.perf_counter() - start) * 1000)
+        viewer.size_slider.setSliderDown(False)
+        metrics[f"preview.{sample_name}.drag.median_ms"] = statistics.median(timings)
+        metrics[f"preview.{sample_name}.drag.p95_ms"] = percentile(timings, 0.95)
+    close_viewer(app, viewer)
+
+def bench_resize(app, work_dir, font_path, metrics, widths=(1000, 1400)):
+    # 在两个窗口宽度之间来回切换：第一次需要重新排版和绘制，之后应当命中场景和瓦片缓存
+    app_dir = work_dir / "resize"; (app_dir / "fonts").mkdir(parents=True)
+    viewer, _, _ = make_viewer(app, app_dir)
+    viewer.add_font_to_list(font_path); viewer.on_font_selected(viewer.font_list_widget.item(0))
+    wait_until(app, lambda: viewer.current_font_family)
+    viewer.text_entry.setText(LONG_SAMPLE); canvas = viewer.preview_canvas
+    for label in ("first", "repeat"):
+        timings = []
+        for width in widths:
+            viewer.resize(width, 700); app.processEvents()
+            start = time.perf_counter(); canvas.on_resize_settled()
+            wait_until(app, lambda: canvas.scene.width == canvas.viewport().width() and not canvas.missing_tiles())
+            timings.append((time.perf_counter() - start) * 1000)
+        metrics[f"resize.{label}.ms"] = statistics.median(timings)
+    close_viewer(app, viewer)
+
+def bench_typing(app, work_dir, font_path, metrics, sizes=(16, 64), keystrokes=20):
+    # 多行模式下在几百段的长文本开头逐字输入：只有改动的段落需要重新排版
+    app_dir = work_dir / "typing"; (app_dir / "fonts").mkdir(parents=True)
+    viewer, _, _ = make_viewer(app, app_dir)
+    viewer.add_font_to_list(font_path); viewer.on_font_selected(viewer.font_list_widget.item(0))
+    wait_until(app, lambda: viewer.current_font_family)
+    viewer.multiline_button.setChecked(True); editor = viewer.sample_editor; canvas = viewer.preview_canvas
+    chapter = "\n".join(f"{i} {LONG_SAMPLE}" for i in range(CHAPTER_PARAGRAPHS))
+    for size in sizes:
+        viewer.preview_font_size = size; editor.setPlainText(chapter)
+        wait_until(app, lambda: not canvas.missing_tiles())
+        timings = []
+        for _ in range(keystrokes):
+            editor.moveCursor(editor.textCursor().Start)
+            start = time.perf_counter(); editor.insertPlainText("x")
+            wait_until(app, lambda: not canvas.missing_tiles())
+            timings.append((time.perf_counter() - start) * 1000)
+        metrics[f"typing.{size}pt.median_ms"] = statistics.median(timings)
+        metrics[f"typing.{size}pt.p95_ms"] = percentile(timings, 0.95)
+    close_viewer(app, viewer)
+
+def bench_compare(app, work_dir, font_paths, metrics):
+    # 对比模式：多选几个字体到全部格子画好为止；再改一次文字，所有格子重新排版绘制
+    app_dir = work_dir / "compare"; (app_dir / "fonts").mkdir(parents=True)
+    viewer, _, _ = make_viewer(app, app_dir)
+    for p in font_paths: viewer.add_font_to_list(p)
+    viewer.text_entry.setText(LONG_SAMPLE); viewer.compare_button.setChecked(True)
+    def settled(text):
+        panes = viewer.compare_panel.panes.values()
+        return len(panes) == len(font_paths) and all(p.canvas.scene is not None and p.canvas.scene.text == text and not p.canvas.missing_tiles() for p in panes)
+    start = time.perf_counter()
+    for row in range(viewer.font_list_widget.count()): viewer.font_list_widget.item(row).setSelected(True)
+    wait_until(app, lambda: settled(LONG_SAMPLE))
+    metrics[f"compare.{len(font_paths)}.first.ms"] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter(); viewer.text_entry.setText(LONG_SAMPLE[::-1])
+    wait_until(app, lambda: settled(LONG_SAMPLE[::-1]))
+    metrics[f"compare.{len(font_paths)}.edit.ms"] = (time.perf_counter() - start) * 1000
+    close_viewer(app, viewer)
+
+def bench_glyph_map(app, work_dir, metrics, positions=(0.0, 0.5, 1.0)):
+    # 字符表：60000 个字符的字体，第一屏画好的时间；再跳到开头、中间、末尾，格子画好之后单帧重绘的耗时应当一样
+    app_dir = work_dir / "glyph_map"; (app_dir / "fonts").mkdir(parents=True)
+    font_path = work_dir / "GlyphMapLarge.ttf"; font_path.write_bytes(build_font("AFV Glyph Map", cmap_size=GLYPH_MAP_CMAP_SIZE))
+    viewer, _, _ = make_viewer(app, app_dir)
+    viewer.add_font_to_list(str(font_path)); viewer.glyph_map_button.setChecked(True); viewer.show()
+    view = viewer.glyph_map_panel.view
+    def settled(): return len(view.codepoints) == GLYPH_MAP_CMAP_SIZE and not any(view.row_missing(r, view.columns()) for r in view.visible_rows(margin_rows=0))
+    start = time.perf_counter(); item = viewer.font_list_widget.item(0); viewer.font_list_widget.setCurrentItem(item); viewer.on_font_selected(item)
+    wait_until(app, settled)
+    metrics["glyph_map.first.ms"] = (time.perf_counter() - start) * 1000
+    bar = view.verticalScrollBar()
+    for position in positions:
+        bar.setValue(int(bar.maximum() * position)); wait_until(app, settled)
+        timings = []
+        for _ in range(20):
+            start = time.perf_counter(); view.viewport().repaint(); timings.append((time.perf_counter() - start) * 1000)
+        metrics[f"glyph_map.paint.{int(position * 100)}.median_ms"] = statistics.median(timings)
+    # 字符名搜索：第一次要生成并保存索引，之后每次查询只在内存里求交
+    panel = viewer.glyph_map_panel
+    start = time.perf_counter(); panel.search_edit.setText(GLYPH_SEARCH_QUERIES[0])
+    wait_until(app, lambda: panel.name_index is not None)
+    metrics["glyph_search.index_build.ms"] = (time.perf_counter() - start) * 1000
+    for query in GLYPH_SEARCH_QUERIES:
+        timings = []
+        for _ in range(10):
+            panel.search_edit.setText(""); start = time.perf_counter(); panel.search_edit.setText(query); timings.append((time.perf_counter() - start) * 1000)
+        metrics[f"glyph_search.{query.replace(' ', '_').lower()}.median_ms"] = statistics.median(timings)
+    close_viewer(app, viewer)
+
+def bench_corpus(app, work_dir, font_paths, metrics):
+    # 语料覆盖率：流式统计 64 MB 中英混合语料的字频，再给 1 万个字体打分，最后按得分重排 1 万项的列表
+    corpus_path = work_dir / "corpus.txt"; line = (LONG_SAMPLE + "\n").encode("utf-8")
+    with open(corpus_path, 'wb') as f:
+        for _ in range(CORPUS_MB * 1024 * 1024 // len(line)): f.write(line)
+    start = time.perf_counter(); histogram = main.corpus_histogram(str(corpus_path))
+    metrics[f"corpus.histogram.{CORPUS_MB}mb.ms"] = (time.perf_counter() - start) * 1000
+    indexed = [main.index_font_file(p)[1] for p in font_paths]
+    entries = [(f"/bench/font_{i:06d}.ttf", indexed[i % len(indexed)]) for i in range(CORPUS_FONTS)]
+    start = time.perf_counter(); scores = main.corpus_scores(entries, histogram)
+    metrics[f"corpus.score.{CORPUS_FONTS}.ms"] = (time.perf_counter() - start) * 1000
+    app_dir = work_dir / "corpus"; (app_dir / "fonts").mkdir(parents=True)
+    viewer, _, _ = make_viewer(app, app_dir)
+    for path, _ in entries: viewer.add_font_to_list(path); viewer.font_items[path].setData(main.FONT_CORPUS_ROLE, scores[path])
+    viewer.sort_combo.show(); app.processEvents()
+    start = time.perf_counter(); viewer.sort_combo.setCurrentIndex(2); app.processEvents()
+    metrics[f"corpus.sort.{CORPUS_FONTS}.ms"] = (time.perf_counter() - start) * 1000
+    viewer.font_list_widget.clear(); viewer.font_items.clear(); close_viewer(app, viewer)
+
+def bench_facets(app, work_dir, font_paths, metrics):
+    # 分面筛选：5 万个字体（元数据轮流取自几个合成字体），依次勾选/取消几个选项，每次从点击到列表和计数都更新好的耗时
+    app_dir = work_dir / "facets"; (app_dir / "fonts").mkdir(parents=True)
+    viewer, _, _ = make_viewer(app, app_dir)
+    # 只在 PANOSE 里标等宽（post.isFixedPitch 为 0）的字体也要归到"等宽"，很多编程字体就是这样
+    panose_mono = app_dir / "PanoseMono.ttf"; panose_mono.write_bytes(build_font("AFV Panose Mono", panose=bytes([2, 0, 0, 9, 0, 0, 0, 0, 0, 0])))
+    if not main.facet_values(main.index_font_file(str(panose_mono))[1])["monospace"]: raise RuntimeError("只在 PANOSE 中标记等宽的字体没有被识别为等宽")
+    values = [main.facet_values(main.index_font_file(p)[1]) for p in font_paths]
+    paths = [f"/nonexistent/bench/font_{i:06d}.ttf" for i in range(FACET_FONTS)]
+    for p in paths: viewer.add_font_to_list(p)
+    viewer.facets.update((p, values[i % len(values)]) for i, p in enumerate(paths))
+    viewer.filter_button.setEnabled(True); viewer.filter_button.setChecked(True); app.processEvents()
+    timings = []; store_timings = []
+    for name, option in FACET_TOGGLES:
+        button = viewer.facet_panel.buttons[name, option][0]
+        start = time.perf_counter(); button.setChecked(not button.isChecked()); app.processEvents(); timings.append((time.perf_counter() - start) * 1000)
+        # 单独计时列存储的筛选和计数（列表项已经是最新状态，不含隐藏/显示列表项的开销）
+        start = time.perf_counter(); viewer.facets.apply(viewer.facet_panel.selection()); store_timings.append((time.perf_counter() - start) * 1000)
+    metrics[f"facets.toggle.{FACET_FONTS}.median_ms"] = statistics.median(timings)
+    metrics[f"facets.toggle.{FACET_FONTS}.max_ms"] = max(timings)
+    metrics[f"facets.store.{FACET_FONTS}.median_ms"] = statistics.median(store_timings)
+    viewer.filter_button.setChecked(False); viewer.font_list_widget.clear(); viewer.font_items.clear(); close_viewer(app, viewer)
+
+def compare(metrics, baseline, tolerance):
+    # 返回 (行列表, 是否有退化)；只比较两边都有的指标
+    rows = []; regressed = False
+    for name in sorted(metrics):
+        if name not in baseline: rows.append((name, metrics[name], None, "新指标")); continue
+        base = baseline[name]; ratio = metrics[name] / base if base else 1.0
+        status = "退化" if ratio > 1 + tolerance else "提升" if ratio < 1 - tolerance else "持平"
+        regressed |= status == "退化"
+        rows.append((name, metrics[name], base, f"{status} ({ratio:.2f}x)"))
+    return rows, regressed
+
+def run(args):
+    work_dir = Path(tempfile.mkdtemp(prefix="afv-bench-"))
+    try:
+        library = generate_library(work_dir / "library", args.fonts)
+        app = QApplication.instance() or QApplication([sys.argv[0]])
+        metrics = {}
+        bench_startup(app, work_dir, library, metrics)
+        bench_list_population(app, work_dir, args.list_sizes, metrics)
+        bench_font_switch(app, work_dir, library[:args.switch_fonts], metrics)
+        bench_preview(app, work_dir, library[0], args.repeats, metrics)
+        bench_resize(app, work_dir, library[0], metrics)
+        bench_typing(app, work_dir, library[0], metrics)
+        bench_compare(app, work_dir, library[:6], metrics)
+        bench_glyph_map(app, work_dir, metrics)
+        bench_corpus(app, work_dir, library[:6], metrics)
+        bench_facets(app, work_dir, library[:12], metrics)
+        return metrics
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="字体预览器基准测试（无界面）")
+    parser.add_argument("--fonts", type=int, default=300, help="启动测试使用的合成字体数量")
+    parser.add_argument("--list-sizes", default=",".join(map(str, LIST_SIZES)), help="列表填充测试的规模，逗号分隔")
+    parser.add_argument("--switch-fonts", type=int, default=40, help="切换字体测试使用的字体数量")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="结果 JSON 写入的文件（默认输出到标准输出）")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为新的基线")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="超过基线多少比例算退化")
+    args = parser.parse_args()
+    args.list_sizes = tuple(int(x) for x in args.list_sizes.split(","))
+    # 没有基线就没法判断退化，不能悄悄跳过比较；第一次运行请加 --save-baseline
+    baseline_path = Path(args.baseline)
+    if not args.save_baseline and not baseline_path.exists():
+        parser.error(f"找不到基线文件 {baseline_path}，请先用 --save-baseline 生成")
+
+    # 程序本身的日志打到标准错误，标准输出只留 JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        metrics = run(args)
+    result = {
+        "meta": {"python": platform.python_version(), "qt": QT_VERSION_STR, "pyqt": PYQT_VERSION_STR,
+                 "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "fonts": args.fonts},
+        "metrics": {k: round(v, 3) for k, v in metrics.items()},
+    }
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output: Path(args.output).write_text(text, encoding="utf-8")
+    else: print(text)
+
+    regressed = False
+    if not args.save_baseline:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8")).get("metrics", {})
+        rows, regressed = compare(result["metrics"], baseline, args.tolerance)
+        for name, value, base, status in rows:
+            print(f"{name:40s} {value:10.2f} ms  基线 {'-' if base is None else f'{base:.2f}':>10s}  {status}", file=sys.stderr)
+    if args.save_baseline:
+        baseline_path.write_text(text, encoding="utf-8"); print(f"基线已保存到 {baseline_path}", file=sys.stderr)
+    sys.exit(1 if regressed else 0)
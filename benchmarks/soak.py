@@ -0,0 +1,111 @@
+import os
+import gc
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from run_benchmarks import make_viewer, close_viewer, wait_until
+from fontgen import generate_library
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QFontDatabase, QPixmap, QTextDocument
+from PyQt5.QtCore import Qt
+
+# -------------------------------------------------------------------
+# 内存浸泡测试：反复切换整个字体库，采样 RSS、tracemalloc 和仍然注册着的
+# 应用字体数量，热身之后增长超过阈值就判定为泄漏（退出码 1）
+# -------------------------------------------------------------------
+def rss_bytes():
+    try:
+        with open("/proc/self/statm", 'r') as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # 其它平台只能拿到峰值（macOS 单位是字节，其余是 KB）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def live_application_fonts(max_id):
+    # Qt 不提供应用字体的总数，只能逐个 id 检查是否还能查到字体家族
+    return sum(1 for font_id in range(max_id + 1) if QFontDatabase.applicationFontFamilies(font_id))
+
+def count_wrappers(*types):
+    gc.collect()
+    return {t.__name__: sum(1 for o in gc.get_objects() if isinstance(o, t)) for t in types}
+
+def take_sample(viewer, selections, max_font_id, snapshot_store):
+    snapshot_store.append(tracemalloc.take_snapshot())
+    current, peak = tracemalloc.get_traced_memory()
+    return {"selections": selections, "rss": rss_bytes(), "traced": current, "traced_peak": peak,
+            "font_cache": viewer.font_data_cache_bytes, "app_fonts": live_application_fonts(max_font_id), **count_wrappers(QPixmap, QTextDocument)}
+
+def soak(app, font_paths, work_dir, cycles, sample_every):
+    app_dir = work_dir / "soak"; (app_dir / "fonts").mkdir(parents=True, exist_ok=True)
+    viewer, _, _ = make_viewer(app, app_dir)
+    for p in font_paths: viewer.add_font_to_list(p)
+    samples = []; snapshots = []; selections = 0; max_font_id = 0
+    tracemalloc.start(10)
+    samples.append(take_sample(viewer, 0, max_font_id, snapshots))
+    for _ in range(cycles):
+        for row in range(viewer.font_list_widget.count()):
+            item = viewer.font_list_widget.item(row); path = item.data(Qt.UserRole)
+            viewer.font_list_widget.setCurrentItem(item); viewer.on_font_selected(item)
+            wait_until(app, lambda: viewer.font_path_label.text() == path)
+            viewer.font_path_label.setText("")
+            max_font_id = max(max_font_id, viewer.current_font_id); selections += 1
+            if selections % sample_every == 0: samples.append(take_sample(viewer, selections, max_font_id, snapshots))
+    samples.append(take_sample(viewer, selections, max_font_id, snapshots))
+    close_viewer(app, viewer)
+    return samples, snapshots
+
+def report(samples, snapshots, warmup_fraction, threshold_mb, top):
+    # 跳过前面一段热身（缓存填充、字体数据库初始化），只看之后的增长
+    base = samples[min(len(samples) - 1, max(1, int(len(samples) * warmup_fraction)))]
+    last = samples[-1]
+    # 预取缓存有上限，属于正常占用，从增长里扣掉
+    cache_growth = last["font_cache"] - base["font_cache"]
+    rss_growth = (last["rss"] - base["rss"] - cache_growth) / 1024 / 1024
+    traced_growth = (last["traced"] - base["traced"] - cache_growth) / 1024 / 1024
+    failures = []
+    if rss_growth > threshold_mb: failures.append(f"RSS 增长 {rss_growth:.1f} MB 超过阈值 {threshold_mb} MB")
+    if traced_growth > threshold_mb: failures.append(f"Python 分配增长 {traced_growth:.1f} MB 超过阈值 {threshold_mb} MB")
+    if last["app_fonts"] > 1: failures.append(f"仍有 {last['app_fonts']} 个应用字体处于注册状态（应当只有当前字体 1 个）")
+    top_stats = [str(stat) for stat in snapshots[-1].compare_to(snapshots[samples.index(base)], "lineno")[:top]]
+    return {"rss_growth_mb": round(rss_growth, 2), "traced_growth_mb": round(traced_growth, 2),
+            "failures": failures, "top_allocations": top_stats, "samples": samples}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="字体预览器内存浸泡测试（无界面）")
+    parser.add_argument("--fonts-dir", help="使用已有的字体目录；不指定则生成合成字体")
+    parser.add_argument("--fonts", type=int, default=200, help="合成字体数量")
+    parser.add_argument("--cycles", type=int, default=3, help="完整遍历字体库的次数")
+    parser.add_argument("--sample-every", type=int, default=50, help="每切换多少次采样一次")
+    parser.add_argument("--warmup", type=float, default=0.2, help="作为热身忽略的采样比例")
+    parser.add_argument("--threshold-mb", type=float, default=32.0, help="热身之后允许的内存增长")
+    parser.add_argument("--top", type=int, default=10, help="输出增长最多的几处 Python 分配")
+    parser.add_argument("--output", help="报告 JSON 写入的文件（默认输出到标准输出）")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="afv-soak-"))
+    try:
+        if args.fonts_dir:
+            font_paths = sorted(str(p) for p in Path(args.fonts_dir).iterdir() if p.suffix.lower() in (".ttf", ".otf", ".ttc"))
+        else:
+            font_paths = generate_library(work_dir / "library", args.fonts)
+        app = QApplication.instance() or QApplication([sys.argv[0]])
+        with contextlib.redirect_stdout(sys.stderr):
+            samples, snapshots = soak(app, font_paths, work_dir, args.cycles, args.sample_every)
+        result = report(samples, snapshots, args.warmup, args.threshold_mb, args.top)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output: Path(args.output).write_text(text, encoding="utf-8")
+    else: print(text)
+    for failure in result["failures"]: print(f"失败：{failure}", file=sys.stderr)
+    sys.exit(1 if result["failures"] else 0)
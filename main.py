@@ -2,7 +2,29 @@ import sys
 import os
 import shutil
 import json
+import time
+import threading
+import argparse
+import traceback
+import faulthandler
+import atexit
+import functools
+import multiprocessing
+import struct
+import bisect
+import hashlib
+import base64
+import array
+import unicodedata
+import math
+import itertools
+import copy
+from collections import deque, OrderedDict, Counter
 from pathlib import Path
+try: import numpy as np
+except ImportError: np = None   # 可选依赖：字体差异比较要用；字符名搜索和语料覆盖率没有它时退回纯 Python 实现
+
+APP_START_TIME = time.perf_counter()
 
 # -------------------------------------------------------------------
 # 辅助函数
@@ -14,13 +36,14 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def app_path():
+    if getattr(sys, 'frozen', False):
+        return Path(os.path.dirname(sys.executable))
+    return Path(os.path.dirname(os.path.abspath(__file__)))
+
 def setup_external_fonts():
     try:
-        if getattr(sys, 'frozen', False):
-            application_path = Path(os.path.dirname(sys.executable))
-        else:
-            application_path = Path(os.path.dirname(os.path.abspath(__file__)))
-        external_fonts_dir = application_path / "fonts"
+        external_fonts_dir = app_path() / "fonts"
         if not external_fonts_dir.exists():
             external_fonts_dir.mkdir(parents=True, exist_ok=True)
             internal_default_fonts_dir = Path(resource_path("default_fonts"))
@@ -53,10 +76,986 @@ from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLineEdit, QLabel, QFileDialog, QMessageBox, QFrame,
     QListWidget, QListWidgetItem, QSplitter, QSlider, QGraphicsDropShadowEffect,
-    QStyledItemDelegate, QStyle, QStyleOptionViewItem, QMenu
+    QStyledItemDelegate, QStyle, QStyleOptionViewItem, QMenu, QShortcut, QGridLayout, QAbstractScrollArea, QPlainTextEdit, QScrollArea, QComboBox, QToolTip
+)
+from PyQt5.QtGui import QFont, QFontDatabase, QRawFont, QGlyphRun, QPainter, QPixmap, QColor, QTextDocument, QIcon, QFontInfo, QKeySequence, QImage, QGuiApplication, QTextLayout, QTextLine, QPainterPath, QRegion, QTextOption
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QRunnable, QThreadPool, QTimer, QEvent, QByteArray, QBuffer, QIODevice, QDataStream, QTextBoundaryFinder, QRectF, QPointF, QRect, QItemSelectionModel
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+
+# -------------------------------------------------------------------
+# 性能追踪（--trace FILE 或环境变量 AFV_TRACE=FILE 开启）
+# 记录命名区间和所在线程，输出 Chrome Trace Event JSON，可直接拖进 Perfetto 查看。
+# 关闭时 span() 只返回一个共享的空上下文，开销可以忽略
+# -------------------------------------------------------------------
+class _NullSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer; self.name = name; self.args = args
+    def __enter__(self):
+        self.start = time.perf_counter(); return self
+    def __exit__(self, *exc):
+        self.tracer.add_complete(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False; self.path = None
+        self.events = []; self.thread_names = {}; self.pid = os.getpid()
+
+    def enable(self, path):
+        if self.enabled: return
+        self.enabled = True; self.path = Path(path)
+        atexit.register(self.save)
+
+    def span(self, name, **args):
+        if not self.enabled: return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def add_complete(self, name, start, end, args=None):
+        tid = threading.get_ident()
+        if tid not in self.thread_names:
+            thread_name = threading.current_thread().name
+            # 线程池里的 Qt 线程在 Python 这边没有名字
+            self.thread_names[tid] = f"worker-{len(self.thread_names)}" if thread_name.startswith("Dummy") else thread_name
+        # list.append 在 GIL 下是原子的，多线程记录不需要额外加锁
+        self.events.append({"name": name, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+                            "pid": self.pid, "tid": tid, "args": args or {}})
+
+    def save(self):
+        if not self.enabled or self.path is None: return
+        meta = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                for tid, name in list(self.thread_names.items())]
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({"traceEvents": meta + list(self.events), "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+            print(f"性能追踪已写入 {self.path}（{len(self.events)} 个区间）")
+        except OSError as e: print(f"写入性能追踪失败: {e}")
+
+TRACER = Tracer()
+
+def traced(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled: return fn(*args, **kwargs)
+            with TRACER.span(name): return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# -------------------------------------------------------------------
+# 任务调度器
+# 索引、缩略图、预取、预览加载等工作统一在这里排队，按优先级通道分配线程，
+# 避免各个功能各自开线程和界面抢 CPU
+# -------------------------------------------------------------------
+LANE_PREVIEW = 0      # 交互预览（最高优先级）
+LANE_THUMBNAIL = 1    # 可见行缩略图
+LANE_PREFETCH = 2     # 预取相邻字体
+LANE_BACKGROUND = 3   # 后台索引、导入等（最低优先级）
+LANE_QUERY = 4        # 本地查询接口的请求（排在预取之后、后台索引之前）
+LANE_COMPARE = 5      # 对比模式各格的排版和瓦片（仅次于交互预览）
+LANES = (LANE_PREVIEW, LANE_COMPARE, LANE_THUMBNAIL, LANE_PREFETCH, LANE_QUERY, LANE_BACKGROUND)
+LANE_NAMES = {LANE_PREVIEW: "预览", LANE_COMPARE: "对比预览", LANE_THUMBNAIL: "缩略图", LANE_PREFETCH: "预取", LANE_QUERY: "外部查询", LANE_BACKGROUND: "后台索引"}
+DEFAULT_LANE_LIMITS = {LANE_PREVIEW: 2, LANE_COMPARE: 4, LANE_THUMBNAIL: 2, LANE_PREFETCH: 1, LANE_QUERY: 2, LANE_BACKGROUND: 1}
+IDLE_DELAY_MS = 400   # 距离上次用户输入超过这个时间才算空闲
+
+class CancelToken:
+    # 取消令牌：任务开始前会检查，耗时任务也可以在执行中自行检查 cancelled
+    __slots__ = ("_cancelled",)
+    def __init__(self): self._cancelled = False
+    def cancel(self): self._cancelled = True
+    @property
+    def cancelled(self): return self._cancelled
+
+class _Task:
+    __slots__ = ("lane", "fn", "args", "kwargs", "token", "callback", "error_callback", "idle_only", "queued_at")
+    def __init__(self, lane, fn, args, kwargs, token, callback, error_callback, idle_only):
+        self.lane = lane; self.fn = fn; self.args = args; self.kwargs = kwargs; self.token = token
+        self.callback = callback; self.error_callback = error_callback; self.idle_only = idle_only
+        self.queued_at = time.perf_counter()
+
+class _TaskRunnable(QRunnable):
+    def __init__(self, scheduler, task):
+        super().__init__()
+        self.scheduler = scheduler; self.task = task
+    def run(self):
+        task = self.task; result = None; error = None
+        if not task.token.cancelled:
+            start = time.perf_counter()
+            try: result = task.fn(*task.args, **task.kwargs)
+            except Exception as e: error = e
+            if TRACER.enabled:
+                TRACER.add_complete(f"task:{getattr(task.fn, '__name__', 'task')}", start, time.perf_counter(),
+                                    {"lane": LANE_NAMES[task.lane], "queued_ms": round((start - task.queued_at) * 1000, 2)})
+        # 调度器对象位于主线程，这里发射信号会被排队回主线程处理
+        self.scheduler._task_finished.emit(task, result, error)
+
+class TaskScheduler(QObject):
+    queueChanged = pyqtSignal()
+    _task_finished = pyqtSignal(object, object, object)
+    _INPUT_EVENTS = frozenset((QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseMove, QEvent.KeyPress, QEvent.Wheel))
+
+    def __init__(self, parent=None, lane_limits=None, max_threads=None):
+        super().__init__(parent)
+        self.lane_limits = dict(DEFAULT_LANE_LIMITS)
+        if lane_limits: self.lane_limits.update(lane_limits)
+        self.pool = QThreadPool(self)
+        if max_threads is None: max_threads = min(sum(self.lane_limits.values()), max(2, os.cpu_count() or 2))
+        self.pool.setMaxThreadCount(max_threads)
+        self.queues = {lane: deque() for lane in LANES}
+        self.running = {lane: 0 for lane in LANES}
+        self._last_input = time.monotonic()
+        self._closed = False
+        self._idle_timer = QTimer(self); self._idle_timer.setSingleShot(True); self._idle_timer.timeout.connect(self._dispatch)
+        self._task_finished.connect(self._on_task_finished)
+        app = QApplication.instance()
+        if app is not None: app.installEventFilter(self)
+
+    def submit(self, lane, fn, *args, callback=None, error_callback=None, token=None, idle_only=False, **kwargs):
+        # 提交任务，返回取消令牌；callback/error_callback 总是在主线程中调用
+        if token is None: token = CancelToken()
+        if self._closed: token.cancel(); return token
+        self.queues[lane].append(_Task(lane, fn, args, kwargs, token, callback, error_callback, idle_only))
+        self._dispatch()
+        self.queueChanged.emit()
+        return token
+
+    def cancel_lane(self, lane):
+        for task in self.queues[lane]: task.token.cancel()
+        self.queues[lane].clear()
+        self.queueChanged.emit()
+
+    def is_idle(self):
+        if any(self.queues[lane] or self.running[lane] for lane in (LANE_PREVIEW, LANE_COMPARE)): return False
+        return (time.monotonic() - self._last_input) * 1000 >= IDLE_DELAY_MS
+
+    def stats(self):
+        return {lane: (len(self.queues[lane]), self.running[lane], self.lane_limits[lane]) for lane in LANES}
+
+    def eventFilter(self, obj, event):
+        if event.type() in self._INPUT_EVENTS: self._last_input = time.monotonic()
+        return False
+
+    def _dispatch(self):
+        if self._closed: return
+        max_threads = self.pool.maxThreadCount(); total = sum(self.running.values()); waiting_for_idle = False
+        for lane in LANES:
+            queue = self.queues[lane]
+            # 给交互预览预留一个线程，低优先级通道不能把线程池占满
+            lane_cap = max_threads if lane == LANE_PREVIEW else max_threads - 1
+            while queue and self.running[lane] < self.lane_limits[lane] and total < lane_cap:
+                task = queue[0]
+                if task.token.cancelled: queue.popleft(); continue
+                if task.idle_only and not self.is_idle(): waiting_for_idle = True; break
+                queue.popleft(); self.running[lane] += 1; total += 1
+                self.pool.start(_TaskRunnable(self, task))
+        if waiting_for_idle and not self._idle_timer.isActive(): self._idle_timer.start(IDLE_DELAY_MS)
+
+    def _on_task_finished(self, task, result, error):
+        self.running[task.lane] -= 1
+        if not task.token.cancelled and not self._closed:
+            if error is not None:
+                if task.error_callback: task.error_callback(error)
+                else: print(f"后台任务 {getattr(task.fn, '__name__', task.fn)} 失败: {error}")
+            elif task.callback: task.callback(result)
+        self._dispatch()
+        self.queueChanged.emit()
+
+    def shutdown(self, timeout_ms=2000):
+        self._closed = True
+        for lane in LANES:
+            for task in self.queues[lane]: task.token.cancel()
+            self.queues[lane].clear()
+        self.pool.clear(); self.pool.waitForDone(timeout_ms)
+
+class SchedulerDebugPanel(QWidget):
+    # 调试面板：显示各通道的排队数/运行数/并发上限（Ctrl+Shift+D 打开）
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent, Qt.Tool)
+        self.scheduler = scheduler
+        self.setWindowTitle("任务调度器"); self.setMinimumWidth(280)
+        layout = QGridLayout(self)
+        for col, header in enumerate(("通道", "排队", "运行", "上限")): layout.addWidget(QLabel(f"<b>{header}</b>"), 0, col)
+        self.cells = {}
+        for row, lane in enumerate(LANES, start=1):
+            layout.addWidget(QLabel(LANE_NAMES[lane]), row, 0)
+            self.cells[lane] = [QLabel("0") for _ in range(3)]
+            for col, lb in enumerate(self.cells[lane], start=1): layout.addWidget(lb, row, col)
+        self.idle_label = QLabel(); layout.addWidget(self.idle_label, len(LANES) + 1, 0, 1, 4)
+        # 队列变化可能非常频繁，用定时器合并刷新
+        self.refresh_timer = QTimer(self); self.refresh_timer.setSingleShot(True); self.refresh_timer.setInterval(100); self.refresh_timer.timeout.connect(self.refresh)
+        scheduler.queueChanged.connect(self.refresh_timer.start)
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible(): return
+        for lane, (queued, running, limit) in self.scheduler.stats().items():
+            for lb, value in zip(self.cells[lane], (queued, running, limit)): lb.setText(str(value))
+        self.idle_label.setText("状态：空闲" if self.scheduler.is_idle() else "状态：忙碌")
+
+    def showEvent(self, event):
+        super().showEvent(event); self.refresh()
+
+@traced("copy_font_file")
+def copy_font_file(source_path, target_path):
+    shutil.copy(source_path, target_path)
+
+def read_font_bytes(filepath):
+    with open(filepath, 'rb') as f: return f.read()
+
+# -------------------------------------------------------------------
+# 外部快捷方式检查：按挂载点分组，每组带超时，不可达的标记为离线而不是丢掉
+# -------------------------------------------------------------------
+PATH_OK = "ok"
+PATH_MISSING = "missing"     # 挂载点可访问，但文件已不存在
+PATH_OFFLINE = "offline"     # 挂载点在超时内没有响应（网络共享断开、USB 休眠等）
+MOUNT_PROBE_TIMEOUT = 3.0    # 每个挂载点的检查超时（秒）
+
+def list_mount_points():
+    mounts = []
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/mounts", 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) > 1: mounts.append(parts[1].replace("\\040", " "))
+        except OSError: pass
+    return mounts
+
+def mount_point_of(path, mounts=None):
+    # 只做字符串匹配，不碰文件系统，离线挂载点上的 stat 本身就可能卡住
+    path = str(path)
+    if mounts:
+        best = "/"
+        for m in mounts:
+            if len(m) > len(best) and (path == m or path.startswith(m.rstrip("/") + "/")): best = m
+        return best
+    if sys.platform == "darwin" and path.startswith("/Volumes/"):
+        return "/".join(path.split("/")[:3])
+    return Path(path).anchor or "/"
+
+def group_by_mount(paths, mounts=None):
+    groups = {}
+    for p in paths: groups.setdefault(mount_point_of(p, mounts), []).append(p)
+    return groups
+
+def validate_paths(paths, timeout=MOUNT_PROBE_TIMEOUT):
+    # 每个挂载点一个守护线程同时检查，超时后仍未返回的整组记为离线。
+    # 卡在内核里的 stat 无法取消，所以这里不占用调度器的线程池等待它
+    statuses = {}
+    probes = []
+    for mount, group in group_by_mount(paths, list_mount_points()).items():
+        results = {}
+        def probe(group=group, results=results):
+            for p in group: results[p] = PATH_OK if os.path.exists(p) else PATH_MISSING
+        t = threading.Thread(target=probe, name=f"probe {mount}", daemon=True); t.start()
+        probes.append((t, group, results))
+    deadline = time.monotonic() + timeout
+    for t, group, results in probes:
+        t.join(max(0.0, deadline - time.monotonic()))
+        for p in group: statuses[p] = results.get(p, PATH_OFFLINE)
+    return statuses
+
+def list_fonts_dir(fonts_dir):
+    if not fonts_dir.is_dir(): return []
+    return [str(p) for p in sorted(fonts_dir.glob("*.ttf")) + sorted(fonts_dir.glob("*.otf"))]
+
+def scan_library(fonts_dir, saved_paths):
+    # 后台对账：扫描 fonts 目录并检查外部快捷方式，返回 (完整有序列表, 各快捷方式状态)
+    setup_external_fonts()
+    font_files = list_fonts_dir(fonts_dir)
+    statuses = validate_paths(saved_paths)
+    return font_files + [p for p in saved_paths if statuses[p] != PATH_MISSING], statuses
+
+FONT_INDEX_VERSION = 2
+
+# -------------------------------------------------------------------
+# 快捷方式列表的持久化
+# 增删先记在内存里，防抖后一次性追加到日志文件；日志攒多了再把完整列表
+# 通过“临时文件 + fsync + 重命名”原子地写回 saved_paths.json
+# -------------------------------------------------------------------
+SAVE_DEBOUNCE_MS = 500
+JOURNAL_COMPACT_THRESHOLD = 256   # 日志超过这么多条就合并回主文件
+
+def atomic_write_text(path, text):
+    path = Path(path); tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text); f.flush(); os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if os.name == "posix":
+        # 让重命名本身也落盘
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try: os.fsync(dir_fd)
+        except OSError: pass
+        finally: os.close(dir_fd)
+
+class SavedPathsStore(QObject):
+    def __init__(self, config_path, parent=None):
+        super().__init__(parent)
+        self.config_path = Path(config_path)
+        self.journal_path = self.config_path.with_suffix(".journal")
+        self.paths = []; self._members = set()
+        self.pending = []; self.journal_entries = 0
+        self.flush_timer = QTimer(self); self.flush_timer.setSingleShot(True); self.flush_timer.setInterval(SAVE_DEBOUNCE_MS)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def load(self):
+        # 读取主文件后重放日志；崩溃时日志末尾可能有半行，直接忽略
+        paths = []
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f: paths = list(json.load(f))
+        except (OSError, ValueError): pass
+        self.paths = []; self._members = set()
+        for p in paths: self._apply("add", p)
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try: entry = json.loads(line)
+                    except ValueError: continue
+                    self._apply(entry.get("op"), entry.get("path")); self.journal_entries += 1
+        except OSError: pass
+        return self.paths
+
+    def __contains__(self, path): return path in self._members
+    def __iter__(self): return iter(self.paths)
+    def __len__(self): return len(self.paths)
+
+    def add(self, path):
+        if path in self._members: return False
+        self._apply("add", path); self._record("add", path)
+        return True
+
+    def remove(self, path): self.remove_many([path])
+
+    def remove_many(self, paths):
+        paths = [p for p in paths if p in self._members]
+        if not paths: return
+        removed = set(paths)
+        self.paths = [p for p in self.paths if p not in removed]; self._members -= removed
+        for p in paths: self._record("remove", p)
+
+    def _apply(self, op, path):
+        if op == "add" and path not in self._members: self.paths.append(path); self._members.add(path)
+        elif op == "remove" and path in self._members: self.paths.remove(path); self._members.discard(path)
+
+    def _record(self, op, path):
+        self.pending.append({"op": op, "path": path})
+        self.flush_timer.start()
+
+    def flush(self):
+        self.flush_timer.stop()
+        if not self.pending: return
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in self.pending)
+        try:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(lines); f.flush(); os.fsync(f.fileno())
+            self.journal_entries += len(self.pending); self.pending = []
+        except OSError as e: print(f"保存路径失败: {e}"); return
+        if self.journal_entries >= JOURNAL_COMPACT_THRESHOLD: self.compact()
+
+    def compact(self):
+        # 先原子替换主文件再清空日志；两步之间崩溃也没关系，重放日志是幂等的
+        self.pending = []
+        try:
+            atomic_write_text(self.config_path, json.dumps(self.paths, indent=4, ensure_ascii=False))
+            with open(self.journal_path, 'w', encoding='utf-8'): pass
+            self.journal_entries = 0
+        except OSError as e: print(f"保存路径失败: {e}")
+
+    def close(self):
+        self.flush()
+        if self.journal_entries: self.compact()
+
+FONT_STATUS_ROLE = Qt.UserRole + 1   # 列表项的路径状态（PATH_OK / PATH_OFFLINE）
+FONT_CORPUS_ROLE = Qt.UserRole + 2   # 语料覆盖率得分 (覆盖字符数, 覆盖比例, 加权覆盖比例)，统计过语料才有
+
+# -------------------------------------------------------------------
+# 字体元数据：直接解析 sfnt 表（不依赖 Qt，可以在子进程里并行），
+# 结果按 (大小, 修改时间) 缓存在 fonts/font_index.json 里
+# -------------------------------------------------------------------
+UNICODE_BLOCKS = (  # (起, 止, 名称)，常用区块
+    (0x0000, 0x007F, "Basic Latin"), (0x0080, 0x00FF, "Latin-1 Supplement"), (0x0100, 0x017F, "Latin Extended-A"),
+    (0x0180, 0x024F, "Latin Extended-B"), (0x0250, 0x02AF, "IPA Extensions"), (0x02B0, 0x02FF, "Spacing Modifier Letters"),
+    (0x0300, 0x036F, "Combining Diacritical Marks"), (0x0370, 0x03FF, "Greek and Coptic"), (0x0400, 0x04FF, "Cyrillic"),
+    (0x0500, 0x052F, "Cyrillic Supplement"), (0x0530, 0x058F, "Armenian"), (0x0590, 0x05FF, "Hebrew"), (0x0600, 0x06FF, "Arabic"),
+    (0x0700, 0x074F, "Syriac"), (0x0750, 0x077F, "Arabic Supplement"), (0x0780, 0x07BF, "Thaana"), (0x07C0, 0x07FF, "NKo"),
+    (0x0800, 0x083F, "Samaritan"), (0x08A0, 0x08FF, "Arabic Extended-A"), (0x0900, 0x097F, "Devanagari"), (0x0980, 0x09FF, "Bengali"),
+    (0x0A00, 0x0A7F, "Gurmukhi"), (0x0A80, 0x0AFF, "Gujarati"), (0x0B00, 0x0B7F, "Oriya"), (0x0B80, 0x0BFF, "Tamil"),
+    (0x0C00, 0x0C7F, "Telugu"), (0x0C80, 0x0CFF, "Kannada"), (0x0D00, 0x0D7F, "Malayalam"), (0x0D80, 0x0DFF, "Sinhala"),
+    (0x0E00, 0x0E7F, "Thai"), (0x0E80, 0x0EFF, "Lao"), (0x0F00, 0x0FFF, "Tibetan"), (0x1000, 0x109F, "Myanmar"),
+    (0x10A0, 0x10FF, "Georgian"), (0x1100, 0x11FF, "Hangul Jamo"), (0x1200, 0x137F, "Ethiopic"), (0x13A0, 0x13FF, "Cherokee"),
+    (0x1400, 0x167F, "Unified Canadian Aboriginal Syllabics"), (0x1680, 0x169F, "Ogham"), (0x16A0, 0x16FF, "Runic"),
+    (0x1780, 0x17FF, "Khmer"), (0x1800, 0x18AF, "Mongolian"), (0x1AB0, 0x1AFF, "Combining Diacritical Marks Extended"),
+    (0x1C80, 0x1C8F, "Cyrillic Extended-C"), (0x1CD0, 0x1CFF, "Vedic Extensions"), (0x1D00, 0x1D7F, "Phonetic Extensions"),
+    (0x1D80, 0x1DBF, "Phonetic Extensions Supplement"), (0x1DC0, 0x1DFF, "Combining Diacritical Marks Supplement"),
+    (0x1E00, 0x1EFF, "Latin Extended Additional"), (0x1F00, 0x1FFF, "Greek Extended"), (0x2000, 0x206F, "General Punctuation"),
+    (0x2070, 0x209F, "Superscripts and Subscripts"), (0x20A0, 0x20CF, "Currency Symbols"),
+    (0x20D0, 0x20FF, "Combining Diacritical Marks for Symbols"), (0x2100, 0x214F, "Letterlike Symbols"), (0x2150, 0x218F, "Number Forms"),
+    (0x2190, 0x21FF, "Arrows"), (0x2200, 0x22FF, "Mathematical Operators"), (0x2300, 0x23FF, "Miscellaneous Technical"),
+    (0x2400, 0x243F, "Control Pictures"), (0x2440, 0x245F, "Optical Character Recognition"), (0x2460, 0x24FF, "Enclosed Alphanumerics"),
+    (0x2500, 0x257F, "Box Drawing"), (0x2580, 0x259F, "Block Elements"), (0x25A0, 0x25FF, "Geometric Shapes"),
+    (0x2600, 0x26FF, "Miscellaneous Symbols"), (0x2700, 0x27BF, "Dingbats"), (0x27C0, 0x27EF, "Miscellaneous Mathematical Symbols-A"),
+    (0x27F0, 0x27FF, "Supplemental Arrows-A"), (0x2800, 0x28FF, "Braille Patterns"), (0x2900, 0x297F, "Supplemental Arrows-B"),
+    (0x2980, 0x29FF, "Miscellaneous Mathematical Symbols-B"), (0x2A00, 0x2AFF, "Supplemental Mathematical Operators"),
+    (0x2B00, 0x2BFF, "Miscellaneous Symbols and Arrows"), (0x2C60, 0x2C7F, "Latin Extended-C"), (0x2D00, 0x2D2F, "Georgian Supplement"),
+    (0x2DE0, 0x2DFF, "Cyrillic Extended-A"), (0x2E00, 0x2E7F, "Supplemental Punctuation"), (0x2E80, 0x2EFF, "CJK Radicals Supplement"),
+    (0x2F00, 0x2FDF, "Kangxi Radicals"), (0x2FF0, 0x2FFF, "Ideographic Description Characters"),
+    (0x3000, 0x303F, "CJK Symbols and Punctuation"), (0x3040, 0x309F, "Hiragana"), (0x30A0, 0x30FF, "Katakana"),
+    (0x3100, 0x312F, "Bopomofo"), (0x3130, 0x318F, "Hangul Compatibility Jamo"), (0x3190, 0x319F, "Kanbun"),
+    (0x31A0, 0x31BF, "Bopomofo Extended"), (0x31C0, 0x31EF, "CJK Strokes"), (0x31F0, 0x31FF, "Katakana Phonetic Extensions"),
+    (0x3200, 0x32FF, "Enclosed CJK Letters and Months"), (0x3300, 0x33FF, "CJK Compatibility"),
+    (0x3400, 0x4DBF, "CJK Unified Ideographs Extension A"), (0x4DC0, 0x4DFF, "Yijing Hexagram Symbols"),
+    (0x4E00, 0x9FFF, "CJK Unified Ideographs"), (0xA000, 0xA48F, "Yi Syllables"), (0xA490, 0xA4CF, "Yi Radicals"),
+    (0xA640, 0xA69F, "Cyrillic Extended-B"), (0xA700, 0xA71F, "Modifier Tone Letters"), (0xA720, 0xA7FF, "Latin Extended-D"),
+    (0xA980, 0xA9DF, "Javanese"), (0xAA00, 0xAA5F, "Cham"), (0xAB30, 0xAB6F, "Latin Extended-E"), (0xAC00, 0xD7AF, "Hangul Syllables"),
+    (0xD7B0, 0xD7FF, "Hangul Jamo Extended-B"), (0xE000, 0xF8FF, "Private Use Area"), (0xF900, 0xFAFF, "CJK Compatibility Ideographs"),
+    (0xFB00, 0xFB4F, "Alphabetic Presentation Forms"), (0xFB50, 0xFDFF, "Arabic Presentation Forms-A"),
+    (0xFE00, 0xFE0F, "Variation Selectors"), (0xFE10, 0xFE1F, "Vertical Forms"), (0xFE20, 0xFE2F, "Combining Half Marks"),
+    (0xFE30, 0xFE4F, "CJK Compatibility Forms"), (0xFE50, 0xFE6F, "Small Form Variants"), (0xFE70, 0xFEFF, "Arabic Presentation Forms-B"),
+    (0xFF00, 0xFFEF, "Halfwidth and Fullwidth Forms"), (0xFFF0, 0xFFFF, "Specials"),
+    (0x10000, 0x1007F, "Linear B Syllabary"), (0x10300, 0x1032F, "Old Italic"), (0x10330, 0x1034F, "Gothic"),
+    (0x13000, 0x1342F, "Egyptian Hieroglyphs"), (0x1D100, 0x1D1FF, "Musical Symbols"),
+    (0x1D400, 0x1D7FF, "Mathematical Alphanumeric Symbols"), (0x1F000, 0x1F02F, "Mahjong Tiles"), (0x1F0A0, 0x1F0FF, "Playing Cards"),
+    (0x1F100, 0x1F1FF, "Enclosed Alphanumeric Supplement"), (0x1F200, 0x1F2FF, "Enclosed Ideographic Supplement"),
+    (0x1F300, 0x1F5FF, "Miscellaneous Symbols and Pictographs"), (0x1F600, 0x1F64F, "Emoticons"),
+    (0x1F650, 0x1F67F, "Ornamental Dingbats"), (0x1F680, 0x1F6FF, "Transport and Map Symbols"), (0x1F700, 0x1F77F, "Alchemical Symbols"),
+    (0x1F780, 0x1F7FF, "Geometric Shapes Extended"), (0x1F800, 0x1F8FF, "Supplemental Arrows-C"),
+    (0x1F900, 0x1F9FF, "Supplemental Symbols and Pictographs"), (0x1FA00, 0x1FA6F, "Chess Symbols"),
+    (0x1FA70, 0x1FAFF, "Symbols and Pictographs Extended-A"), (0x20000, 0x2A6DF, "CJK Unified Ideographs Extension B"),
+    (0x2A700, 0x2B73F, "CJK Unified Ideographs Extension C"), (0x2B740, 0x2B81F, "CJK Unified Ideographs Extension D"),
+    (0x2B820, 0x2CEAF, "CJK Unified Ideographs Extension E"), (0x2CEB0, 0x2EBEF, "CJK Unified Ideographs Extension F"),
+    (0x2F800, 0x2FA1F, "CJK Compatibility Ideographs Supplement"), (0x30000, 0x3134F, "CJK Unified Ideographs Extension G"),
+    (0xE0000, 0xE007F, "Tags"), (0xE0100, 0xE01EF, "Variation Selectors Supplement"),
+)
+_BLOCK_STARTS = [b[0] for b in UNICODE_BLOCKS]
+COLOR_TABLES = ((b"COLR", "COLR"), (b"CBDT", "CBDT"), (b"sbix", "sbix"), (b"SVG ", "SVG"))
+# cmap 子表优先顺序：完整 Unicode 的优先，其次 BMP，最后 Symbol
+CMAP_PREFERENCE = ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0), (3, 0))
+
+class FontParseError(Exception):
+    pass
+
+def _u16(data, offset): return struct.unpack_from(">H", data, offset)[0]
+def _u32(data, offset): return struct.unpack_from(">I", data, offset)[0]
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]: merged[-1][1] = end
+        else: merged.append([start, end])
+    return merged
+
+def _parse_cmap_subtable(data, offset):
+    fmt = _u16(data, offset); ranges = []
+    if fmt == 4:
+        seg_count = _u16(data, offset + 6) // 2
+        ends = offset + 14; starts = ends + seg_count * 2 + 2; deltas = starts + seg_count * 2; range_offsets = deltas + seg_count * 2
+        for i in range(seg_count):
+            start = _u16(data, starts + i * 2); end = _u16(data, ends + i * 2)
+            if start == 0xFFFF: continue
+            range_offset = _u16(data, range_offsets + i * 2)
+            if range_offset == 0: ranges.append((start, end)); continue
+            # 通过 glyphIdArray 映射的段要逐个排除映射到 0 号字形的码位
+            base = range_offsets + i * 2 + range_offset
+            run_start = None
+            for cp in range(start, end + 1):
+                pos = base + (cp - start) * 2
+                glyph = _u16(data, pos) if pos + 2 <= len(data) else 0
+                if glyph and run_start is None: run_start = cp
+                elif not glyph and run_start is not None: ranges.append((run_start, cp - 1)); run_start = None
+            if run_start is not None: ranges.append((run_start, end))
+    elif fmt in (12, 13):
+        groups = _u32(data, offset + 12)
+        for i in range(groups):
+            start, end, _ = struct.unpack_from(">3I", data, offset + 16 + i * 12)
+            ranges.append((start, min(end, 0x10FFFF)))
+    elif fmt == 6:
+        first = _u16(data, offset + 6); count = _u16(data, offset + 8)
+        ranges.extend((first + i, first + i) for i in range(count) if _u16(data, offset + 10 + i * 2))
+    elif fmt == 0:
+        ranges.extend((cp, cp) for cp in range(256) if data[offset + 6 + cp])
+    return merge_ranges(ranges)
+
+def _select_cmap(data, offset):
+    # 按 CMAP_PREFERENCE 选一个子表，返回 ((平台, 编码), 子表偏移)，没有可用的返回 (None, None)
+    subtables = {}
+    for i in range(_u16(data, offset + 2)):
+        platform_id, encoding_id, sub_offset = struct.unpack_from(">HHI", data, offset + 4 + i * 8)
+        subtables.setdefault((platform_id, encoding_id), offset + sub_offset)
+    for key in CMAP_PREFERENCE:
+        if key in subtables: return key, subtables[key]
+    return None, None
+
+def _parse_cmap(data, offset):
+    key, sub_offset = _select_cmap(data, offset)
+    if key is None: return []
+    ranges = _parse_cmap_subtable(data, sub_offset)
+    if key == (3, 0):
+        # Symbol 字体的字符放在 U+F000 区，同时也能用 U+0000-00FF 访问
+        ranges = merge_ranges(ranges + [[s - 0xF000, e - 0xF000] for s, e in ranges if s >= 0xF000 and e <= 0xF0FF])
+    return ranges
+
+def _parse_cmap_glyphs(data, offset):
+    # 码位 -> 字形号（只在比较轮廓时用到，覆盖范围只需要 _parse_cmap）
+    key, offset = _select_cmap(data, offset)
+    if key is None: return {}
+    fmt = _u16(data, offset); glyphs = {}
+    if fmt == 4:
+        seg_count = _u16(data, offset + 6) // 2
+        ends = offset + 14; starts = ends + seg_count * 2 + 2; deltas = starts + seg_count * 2; range_offsets = deltas + seg_count * 2
+        for i in range(seg_count):
+            start = _u16(data, starts + i * 2); end = _u16(data, ends + i * 2); delta = _u16(data, deltas + i * 2)
+            if start == 0xFFFF: continue
+            range_offset = _u16(data, range_offsets + i * 2)
+            if range_offset == 0:
+                glyphs.update((cp, (cp + delta) & 0xFFFF) for cp in range(start, end + 1)); continue
+            base = range_offsets + i * 2 + range_offset
+            for cp in range(start, end + 1):
+                pos = base + (cp - start) * 2
+                glyph = _u16(data, pos) if pos + 2 <= len(data) else 0
+                if glyph: glyphs[cp] = (glyph + delta) & 0xFFFF
+    elif fmt in (12, 13):
+        for i in range(_u32(data, offset + 12)):
+            start, end, glyph = struct.unpack_from(">3I", data, offset + 16 + i * 12)
+            end = min(end, 0x10FFFF)
+            if fmt == 12: glyphs.update(zip(range(start, end + 1), range(glyph, glyph + end - start + 1)))
+            else: glyphs.update(dict.fromkeys(range(start, end + 1), glyph))
+    elif fmt == 6:
+        first = _u16(data, offset + 6)
+        glyphs.update((first + i, _u16(data, offset + 10 + i * 2)) for i in range(_u16(data, offset + 8)))
+    elif fmt == 0:
+        glyphs.update((cp, data[offset + 6 + cp]) for cp in range(256))
+    glyphs = {cp: g for cp, g in glyphs.items() if g}
+    if key == (3, 0): glyphs.update({cp - 0xF000: g for cp, g in glyphs.items() if 0xF000 <= cp <= 0xF0FF})
+    return glyphs
+
+def _parse_names(data, offset):
+    count = _u16(data, offset + 2); storage = offset + _u16(data, offset + 4)
+    best = {}
+    for i in range(count):
+        platform_id, encoding_id, language_id, name_id, length, str_offset = struct.unpack_from(">6H", data, offset + 6 + i * 12)
+        if name_id not in (1, 2, 4, 16, 17): continue
+        raw = data[storage + str_offset: storage + str_offset + length]
+        # 英文 Windows 名称优先，其次任意 Windows 名称，最后 Mac/Unicode 平台
+        if platform_id == 3: rank = 0 if language_id == 0x409 else 1; text = raw.decode("utf-16-be", "replace")
+        elif platform_id == 0: rank = 2; text = raw.decode("utf-16-be", "replace")
+        elif platform_id == 1 and encoding_id == 0: rank = 3; text = raw.decode("mac_roman", "replace")
+        else: continue
+        if name_id not in best or rank < best[name_id][0]: best[name_id] = (rank, text)
+    return {name_id: text for name_id, (rank, text) in best.items()}
+
+def _table_directory(data, face_offset):
+    # 表标签 -> (偏移, 长度)
+    if face_offset + 12 > len(data): raise FontParseError("文件被截断")
+    tables = {}
+    for i in range(_u16(data, face_offset + 4)):
+        tag, _, offset, length = struct.unpack_from(">4sIII", data, face_offset + 12 + i * 16)
+        if offset + length > len(data): raise FontParseError(f"表 {tag.decode('latin-1')} 超出文件范围")
+        tables[tag] = (offset, length)
+    return tables
+
+def _face_offsets(data):
+    if len(data) < 12: raise FontParseError("不是有效的字体文件")
+    tag = data[:4]
+    if tag == b"ttcf": return [_u32(data, 12 + i * 4) for i in range(_u32(data, 8))]
+    if tag in (b"\x00\x01\x00\x00", b"OTTO", b"true", b"typ1"): return [0]
+    raise FontParseError("不支持的字体格式")
+
+def parse_sfnt_face(data, face_offset):
+    tables = _table_directory(data, face_offset)
+    names = _parse_names(data, tables[b"name"][0]) if b"name" in tables else {}
+    weight, width, italic, unicode_ranges, code_pages, panose_mono = 400, 5, False, [0, 0, 0, 0], [0, 0], False
+    if b"OS/2" in tables:
+        offset, length = tables[b"OS/2"]
+        weight = _u16(data, offset + 4); width = _u16(data, offset + 6)
+        italic = bool(_u16(data, offset + 62) & 0x01)
+        # PANOSE（偏移 32）：拉丁文本类（bFamilyType 2）的 bProportion 为 9 表示等宽
+        panose_mono = data[offset + 32] == 2 and data[offset + 35] == 9
+        unicode_ranges = list(struct.unpack_from(">4I", data, offset + 42))
+        if _u16(data, offset) >= 1 and length >= 86: code_pages = list(struct.unpack_from(">2I", data, offset + 78))
+    if b"head" in tables: italic = italic or bool(_u16(data, tables[b"head"][0] + 44) & 0x02)
+    glyph_count = _u16(data, tables[b"maxp"][0] + 4) if b"maxp" in tables else 0
+    # 很多等宽字体的 post.isFixedPitch 是 0（如 Source Code Pro），只在 OS/2 的 PANOSE 里标了等宽
+    monospace = panose_mono or (bool(_u32(data, tables[b"post"][0] + 12)) if b"post" in tables else False)
+    color = []
+    for tag, label in COLOR_TABLES:
+        if tag in tables:
+            if tag == b"COLR": label = f"COLRv{_u16(data, tables[tag][0])}"
+            color.append(label)
+    coverage = _parse_cmap(data, tables[b"cmap"][0]) if b"cmap" in tables else []
+    outline = "CFF" if (b"CFF " in tables or b"CFF2" in tables) else "TrueType" if b"glyf" in tables else "bitmap"
+    return {
+        "family": names.get(16) or names.get(1) or "", "style": names.get(17) or names.get(2) or "",
+        "full_name": names.get(4) or "", "weight": weight, "width": width, "italic": italic, "monospace": monospace,
+        "glyph_count": glyph_count, "outline": outline, "color": color, "unicode_ranges": unicode_ranges,
+        "code_pages": code_pages, "coverage": coverage,
+    }
+
+def parse_font_data(data):
+    # 返回每个字体面的元数据列表（TTC 集合里有多个面）
+    face_offsets = _face_offsets(data)
+    try: return [parse_sfnt_face(data, offset) for offset in face_offsets]
+    except (struct.error, IndexError) as e: raise FontParseError(f"字体表损坏: {e}")
+
+def index_font_file(path):
+    # 读一次文件同时算哈希和解析；返回 (路径, 索引条目)，出错时条目里带 error
+    try:
+        st = os.stat(path)
+        with open(path, 'rb') as f: data = f.read()
+        entry = {"size": st.st_size, "mtime": st.st_mtime_ns, "hash": hashlib.sha1(data).hexdigest()}
+        entry["faces"] = parse_font_data(data)
+    except (OSError, FontParseError) as e:
+        entry = {"error": str(e)}
+    return path, entry
+
+def coverage_count(ranges): return sum(end - start + 1 for start, end in ranges)
+
+def coverage_blocks(ranges):
+    # 统计覆盖范围落在各 Unicode 区块里的字符数
+    counts = {}
+    for start, end in ranges:
+        i = max(bisect.bisect_right(_BLOCK_STARTS, start) - 1, 0)
+        while i < len(UNICODE_BLOCKS) and UNICODE_BLOCKS[i][0] <= end:
+            block_start, block_end, name = UNICODE_BLOCKS[i]
+            overlap = min(end, block_end) - max(start, block_start) + 1
+            if overlap > 0: counts[name] = counts.get(name, 0) + overlap
+            i += 1
+    return counts
+
+class FontIndex:
+    # 路径 -> {size, mtime, hash, faces}；文件大小或修改时间变了就视为失效
+    def __init__(self, index_path):
+        self.index_path = Path(index_path); self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f: data = json.load(f)
+            if data.get("version") == FONT_INDEX_VERSION: self.entries = data.get("fonts", {})
+        except (OSError, ValueError, AttributeError): self.entries = {}
+        return self
+
+    def lookup(self, path, st=None):
+        entry = self.entries.get(path)
+        if entry is None or "error" in entry: return None
+        try: st = st or os.stat(path)
+        except OSError: return None
+        if entry.get("size") != st.st_size or entry.get("mtime") != st.st_mtime_ns: return None
+        return entry
+
+    def put(self, path, entry):
+        self.entries[path] = entry
+
+    def save(self, entries=None):
+        # 在后台线程保存时传入 entries 的浅拷贝，避免主线程同时修改字典
+        try:
+            # 全新检出时还没有 fonts 目录（例如直接用 --dump-metadata 导出）
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.index_path, json.dumps({"version": FONT_INDEX_VERSION, "fonts": self.entries if entries is None else entries},
+                                                          ensure_ascii=False, separators=(",", ":")))
+        except OSError as e: print(f"保存字体索引失败: {e}")
+
+    def missing(self, paths):
+        # 可以在后台线程里调用：返回需要（重新）解析的路径
+        return [p for p in paths if self.lookup(p) is None]
+
+def refresh_index(index, paths):
+    return [index_font_file(p) for p in index.missing(paths)]
+
+def face_records(path, entry):
+    # 把索引条目展开成每个字体面一条、适合导出的记录
+    if "error" in entry:
+        yield {"path": path, "error": entry["error"]}; return
+    for face_index, face in enumerate(entry["faces"]):
+        coverage = face["coverage"]
+        yield {
+            "path": path, "face_index": face_index, "size": entry["size"], "hash": entry["hash"],
+            "family": face["family"], "style": face["style"], "weight": face["weight"], "width": face["width"],
+            "italic": face["italic"], "monospace": face["monospace"], "glyph_count": face["glyph_count"],
+            "outline": face["outline"], "color": face["color"] or None,
+            "coverage": {"codepoints": coverage_count(coverage), "ranges": len(coverage),
+                         "first": coverage[0][0] if coverage else None, "last": coverage[-1][1] if coverage else None},
+            "blocks": coverage_blocks(coverage),
+        }
+
+# -------------------------------------------------------------------
+# 卡顿监视器（可选，--watchdog 或环境变量 AFV_WATCHDOG 开启）
+# 主线程用定时器打心跳，监视线程发现心跳停了超过阈值就抓取主线程的调用栈，
+# 卡顿结束后把时长和调用栈追加到 stall_reports.jsonl，方便汇总分析
+# -------------------------------------------------------------------
+DEFAULT_STALL_THRESHOLD_MS = 100
+HARD_STALL_SECONDS = 5   # 主线程卡死（连监视线程都拿不到 GIL）时由 faulthandler 兜底输出所有线程栈
+
+class StallWatchdog(QObject):
+    def __init__(self, report_path, threshold_ms=DEFAULT_STALL_THRESHOLD_MS, parent=None):
+        super().__init__(parent)
+        self.report_path = Path(report_path); self.threshold = threshold_ms / 1000
+        self.gui_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic(); self._stall_stack = None; self._stall_detected_at = None; self._fault_armed_at = None
+        self._stop = threading.Event()
+        self.heartbeat_timer = QTimer(self); self.heartbeat_timer.setInterval(max(10, threshold_ms // 4)); self.heartbeat_timer.timeout.connect(self.heartbeat)
+        try: self.fault_file = open(self.report_path.with_suffix(".fault.log"), 'a', encoding='utf-8')
+        except OSError: self.fault_file = None
+        self.monitor = threading.Thread(target=self._monitor_loop, name="stall-watchdog", daemon=True)
+
+    def start(self):
+        self._last_beat = time.monotonic()
+        self.heartbeat_timer.start(); self.monitor.start()
+        print(f"卡顿监视已开启：阈值 {self.threshold * 1000:.0f} ms，报告写入 {self.report_path}")
+
+    def stop(self):
+        self._stop.set(); self.heartbeat_timer.stop()
+        if self.fault_file: faulthandler.cancel_dump_traceback_later(); self.fault_file.close(); self.fault_file = None
+
+    def heartbeat(self):
+        now = time.monotonic()
+        if self._stall_stack is not None:
+            self.write_report(now - self._last_beat, self._stall_stack, self._stall_detected_at - self._last_beat)
+            self._stall_stack = None
+        self._last_beat = now
+        # 每次 dump_traceback_later 都会停掉并重建 faulthandler 的监视线程，不能每个心跳都调；
+        # 最多每半个 HARD_STALL_SECONDS 重新计时一次，超时设成 1.5 倍，保证卡满 HARD_STALL_SECONDS 才会输出
+        if self.fault_file and (self._fault_armed_at is None or now - self._fault_armed_at >= HARD_STALL_SECONDS / 2):
+            faulthandler.dump_traceback_later(HARD_STALL_SECONDS * 1.5, file=self.fault_file); self._fault_armed_at = now
+
+    def _monitor_loop(self):
+        interval = self.threshold / 4
+        while not self._stop.wait(interval):
+            last_beat = self._last_beat
+            if self._stall_stack is None and time.monotonic() - last_beat > self.threshold:
+                frame = sys._current_frames().get(self.gui_thread_id)
+                if frame is None: continue
+                self._stall_detected_at = time.monotonic()
+                self._stall_stack = traceback.format_stack(frame)
+
+    def write_report(self, duration, stack, detected_after):
+        # 用栈顶几帧的函数名作为签名，便于跨用户聚合同一处卡顿
+        signature = " < ".join(line.strip().splitlines()[0].split(", in ")[-1] for line in reversed(stack[-3:]))
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration_ms": round(duration * 1000, 1),
+            "threshold_ms": round(self.threshold * 1000),
+            "detected_after_ms": round(detected_after * 1000, 1),
+            "signature": signature,
+            "stack": stack,
+        }
+        print(f"检测到界面卡顿 {report['duration_ms']:.0f} ms：{signature}")
+        try:
+            with open(self.report_path, 'a', encoding='utf-8') as f: f.write(json.dumps(report, ensure_ascii=False) + "\n")
+        except OSError as e: print(f"写入卡顿报告失败: {e}")
+
+# -------------------------------------------------------------------
+# 单实例：第二次启动时把要打开的文件交给已经在运行的窗口，自己立即退出，
+# 不再重复初始化界面和扫描字体库（--new-instance 可以强制另开一个）
+# -------------------------------------------------------------------
+INSTANCE_CONNECT_TIMEOUT_MS = 200
+
+def instance_server_name():
+    # 按用户和程序目录区分，不同用户、不同安装位置各自单实例
+    user = os.environ.get("USER") or os.environ.get("USERNAME") or ""
+    return "AFontViewer-" + hashlib.sha1(f"{user}:{app_path()}".encode("utf-8")).hexdigest()[:12]
+
+def connect_to_running_instance(timeout_ms=INSTANCE_CONNECT_TIMEOUT_MS):
+    # 不需要 QApplication；没有运行中的实例时返回 None
+    socket = QLocalSocket()
+    socket.connectToServer(instance_server_name())
+    return socket if socket.waitForConnected(timeout_ms) else None
+
+def forward_to_running_instance(paths, timeout_ms=INSTANCE_CONNECT_TIMEOUT_MS):
+    socket = connect_to_running_instance(timeout_ms)
+    if socket is None: return False
+    socket.write((json.dumps({"open": [os.path.abspath(p) for p in paths]}, ensure_ascii=False) + "\n").encode("utf-8"))
+    ok = socket.waitForBytesWritten(timeout_ms)
+    socket.disconnectFromServer()
+    return ok
+
+class InstanceServer(QObject):
+    filesReceived = pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.server = QLocalServer(self); self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+
+    def listen(self):
+        # 带访问权限选项时 Qt 会直接覆盖已有的套接字文件，所以先确认没有别的实例在监听；
+        # 连不上说明是上次异常退出留下的失效文件，清掉再监听
+        other = connect_to_running_instance()
+        if other is not None:
+            other.disconnectFromServer(); print("已有实例在运行，本实例不接收转发"); return False
+        name = instance_server_name(); QLocalServer.removeServer(name)
+        if self.server.listen(name): return True
+        print(f"单实例服务启动失败: {self.server.errorString()}")
+        return False
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.readyRead.connect(lambda s=socket: self.on_ready_read(s))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def on_ready_read(self, socket):
+        while socket.canReadLine():
+            try: message = json.loads(bytes(socket.readLine()).decode("utf-8"))
+            except ValueError as e: print(f"单实例消息格式错误: {e}"); continue
+            self.filesReceived.emit([p for p in message.get("open", []) if isinstance(p, str)])
+
+# -------------------------------------------------------------------
+# 分面筛选
+# 字体库的元数据按列存放（array 模块，每个字体一行，有 NumPy 时直接在同一块内存上向量化）；
+# 数据变化后每个选项重建一次行掩码，之后切换选项只是掩码的与/或和计数
+# -------------------------------------------------------------------
+SCRIPT_FACETS = (  # (名称, OS/2 ulUnicodeRange 位, 核心字符范围)
+    ("拉丁", 0, (0x41, 0x5A)), ("希腊", 7, (0x391, 0x3C9)), ("西里尔", 9, (0x410, 0x44F)), ("希伯来", 11, (0x5D0, 0x5EA)),
+    ("阿拉伯", 13, (0x621, 0x64A)), ("天城文", 15, (0x905, 0x939)), ("泰文", 24, (0xE01, 0xE2E)), ("假名", 49, (0x3041, 0x3096)),
+    ("韩文", 56, (0xAC00, 0xAC1B)), ("汉字", 59, (0x4E00, 0x4EFF)), ("表情符号", None, (0x1F600, 0x1F64F)),
+)
+FACETS = (  # (列名, 标题, 选项)；选项是 (名称, 最小值, 最大值)，文字一栏按位判断
+    ("weight", "字重", (("细", 1, 349), ("常规", 350, 549), ("粗", 550, 749), ("特粗", 750, 1000))),
+    ("width", "宽度", (("窄", 1, 4), ("标准", 5, 5), ("宽", 6, 9))),
+    ("italic", "样式", (("正体", 0, 0), ("斜体", 1, 1))),
+    ("scripts", "文字", tuple((name, 1 << bit, 1 << bit) for bit, (name, _, _) in enumerate(SCRIPT_FACETS))),
+    ("color", "颜色", (("单色", 0, 0), ("彩色", 1, 1))),
+    ("monospace", "间距", (("等宽", 1, 1), ("比例", 0, 0))),
 )
-from PyQt5.QtGui import QFont, QFontDatabase, QPainter, QPixmap, QColor, QTextDocument, QIcon, QFontInfo
-from PyQt5.QtCore import Qt, pyqtSignal
+FACET_COLUMNS = (("alive", "B"), ("valid", "B"), ("shown", "B"), ("weight", "H"), ("width", "B"), ("italic", "B"), ("scripts", "I"), ("color", "B"), ("monospace", "B"))
+
+def script_covered(ranges, lo, hi):
+    # ranges 是合并过、按起点排序的 [起, 止]，直接对它二分，不必先拆出起点列表
+    i = max(bisect.bisect_right(ranges, [lo, 0x110000]) - 1, 0); count = 0
+    while i < len(ranges) and ranges[i][0] <= hi:
+        count += max(0, min(ranges[i][1], hi) - max(ranges[i][0], lo) + 1); i += 1
+    return count
+
+def facet_values(entry):
+    # 取文件的第一个字体面；文字：OS/2 声明了并且 cmap 里确实有，或者 cmap 覆盖了核心字符的一半以上
+    face = entry["faces"][0]; ranges = face["coverage"]; unicode_ranges = face.get("unicode_ranges", (0, 0, 0, 0)); scripts = 0
+    for bit, (_, os2_bit, (lo, hi)) in enumerate(SCRIPT_FACETS):
+        covered = script_covered(ranges, lo, hi)
+        declared = os2_bit is not None and unicode_ranges[os2_bit >> 5] >> (os2_bit & 31) & 1
+        if covered * 2 > hi - lo + 1 or declared and covered: scripts |= 1 << bit
+    return {"weight": min(face["weight"], 0xFFFF), "width": min(face["width"], 0xFF), "italic": int(face["italic"]), "scripts": scripts,
+            "color": int(bool(face["color"])), "monospace": int(face["monospace"])}
+
+def facet_rows(entries):
+    # 在工作线程里运行：[(路径, 索引条目)] -> [(路径, 各列的值)]
+    return [(path, facet_values(entry)) for path, entry in entries if entry.get("faces")]
+
+def compact_count(n): return str(n) if n < 10000 else f"{n // 1000}k"
+
+class FacetStore:
+    def __init__(self):
+        self.paths = []; self.rows = {}; self.masks = None
+        self.columns = {name: array.array(code) for name, code in FACET_COLUMNS}
+
+    def add(self, path):
+        if path in self.rows: return
+        self.rows[path] = len(self.paths); self.paths.append(path)
+        for name, column in self.columns.items(): column.append(1 if name in ("alive", "shown") else 0)
+        self.masks = None
+
+    def remove(self, path):
+        row = self.rows.pop(path, None)
+        if row is None: return
+        self.paths[row] = None; self.columns["alive"][row] = 0; self.columns["shown"][row] = 0; self.masks = None
+
+    def update(self, rows):
+        for path, values in rows:
+            row = self.rows.get(path)
+            if row is None: continue
+            for name, value in values.items(): self.columns[name][row] = value
+            self.columns["valid"][row] = 1
+        self.masks = None
+
+    def mark_all_shown(self):
+        # 列表条目被取出再放回（重新排序）之后，隐藏状态都被清掉了
+        self.columns["shown"] = array.array("B", self.columns["alive"])
+
+    def build_masks(self):
+        # NumPy 时掩码是布尔数组，否则是 Python 整数位集；两者都支持 & 和 |
+        n = len(self.paths); masks = {}
+        if np is not None:
+            columns = {name: np.frombuffer(column, dtype=column.typecode) if n else np.zeros(0, dtype=column.typecode) for name, column in self.columns.items()}
+            masks["alive"] = columns["alive"] != 0; masks["valid"] = (columns["valid"] != 0) & masks["alive"]
+            for name, _, options in FACETS:
+                column = columns[name]
+                for i, (_, lo, hi) in enumerate(options):
+                    masks[name, i] = (column & lo) != 0 if name == "scripts" else (column >= lo) & (column <= hi)
+            del columns
+        else:
+            pack = lambda flags: int("".join("1" if f else "0" for f in reversed(flags)) or "0", 2)
+            alive = self.columns["alive"]; masks["alive"] = pack(alive); masks["valid"] = pack([a and v for a, v in zip(alive, self.columns["valid"])])
+            for name, _, options in FACETS:
+                column = self.columns[name]
+                for i, (_, lo, hi) in enumerate(options):
+                    masks[name, i] = pack([v & lo for v in column] if name == "scripts" else [lo <= v <= hi for v in column])
+        self.masks = masks
+
+    def apply(self, selection):
+        # selection: 列名 -> 选中的选项序号集合；同一栏内是“或”，栏与栏之间是“与”
+        # 返回 (可见数, 各选项的计数, 要显示的行, 要隐藏的行)；计数按其它栏的选择算，表示再选上它会剩多少
+        if self.masks is None: self.build_masks()
+        masks = self.masks; count = (lambda m: int(np.count_nonzero(m))) if np is not None else (lambda m: bin(m).count("1"))
+        chosen = {}
+        for name, options in selection.items():
+            if options: chosen[name] = functools.reduce(lambda a, b: a | b, (masks[name, i] for i in options))
+        visible = functools.reduce(lambda a, b: a & b, chosen.values(), masks["valid"]) if chosen else masks["alive"]
+        counts = {}
+        for name, _, options in FACETS:
+            others = functools.reduce(lambda a, b: a & b, (m for n, m in chosen.items() if n != name), masks["valid"])
+            counts[name] = [count(others & masks[name, i]) for i in range(len(options))]
+        shown_column = self.columns["shown"]
+        if np is not None:
+            shown = np.frombuffer(shown_column, dtype=np.uint8) if self.paths else np.zeros(0, dtype=np.uint8)
+            show_rows = np.flatnonzero(visible & (shown == 0)).tolist(); hide_rows = np.flatnonzero(~visible & (shown != 0)).tolist()
+            shown[:] = visible; del shown
+        else:
+            bits = bin(visible)[:1:-1].ljust(len(self.paths), "0")
+            show_rows = [row for row, (bit, s) in enumerate(zip(bits, shown_column)) if bit == "1" and not s]
+            hide_rows = [row for row, (bit, s) in enumerate(zip(bits, shown_column)) if bit == "0" and s]
+            for row in show_rows: shown_column[row] = 1
+            for row in hide_rows: shown_column[row] = 0
+        return count(visible), counts, show_rows, hide_rows
+
+class FacetPanel(QFrame):
+    selectionChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("FacetPanel")
+        layout = QGridLayout(self); layout.setContentsMargins(0, 0, 0, 0); layout.setHorizontalSpacing(4); layout.setVerticalSpacing(4)
+        self.buttons = {}; row = 0
+        for name, title, options in FACETS:
+            label = QLabel(title); label.setObjectName("FacetTitle"); layout.addWidget(label, row, 0, Qt.AlignTop)
+            for i, (text, _, _) in enumerate(options):
+                button = QPushButton(text); button.setObjectName("FacetOption"); button.setCheckable(True); button.toggled.connect(lambda _: self.selectionChanged.emit())
+                layout.addWidget(button, row + i // 3, 1 + i % 3); self.buttons[name, i] = (button, text)
+            row += (len(options) + 2) // 3
+        self.summary_label = QLabel(); self.summary_label.setObjectName("FacetSummary")
+        clear_button = QPushButton("清除"); clear_button.setObjectName("FacetOption"); clear_button.clicked.connect(self.clear)
+        layout.addWidget(self.summary_label, row, 0, 1, 3); layout.addWidget(clear_button, row, 3)
+
+    def selection(self):
+        selection = {}
+        for (name, i), (button, _) in self.buttons.items():
+            if button.isChecked(): selection.setdefault(name, set()).add(i)
+        return selection
+
+    def clear(self):
+        if not self.selection(): return
+        for button, _ in self.buttons.values(): button.blockSignals(True); button.setChecked(False); button.blockSignals(False)
+        self.selectionChanged.emit()
+
+    def set_counts(self, visible, total, counts):
+        # 计数为 0 的选项变灰，已经选中的保持可点，方便取消
+        for (name, i), (button, text) in self.buttons.items():
+            n = counts[name][i]; button.setText(f"{text} {compact_count(n)}"); button.setEnabled(bool(n) or button.isChecked())
+        self.summary_label.setText(f"显示 {visible} / {total} 个字体")
 
 # -------------------------------------------------------------------
 # CustomItemDelegate
@@ -65,14 +1064,33 @@ class CustomItemDelegate(QStyledItemDelegate):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.font = QFont("sans-serif", 12)
+        self.score_column = 2   # 列表右侧显示语料得分的哪一项（1 覆盖比例，2 加权覆盖比例）
     def paint(self, painter, option, index):
         opt = QStyleOptionViewItem(option); self.initStyleOption(opt, index); painter.save(); rect = opt.rect; text = opt.text
         is_selected = opt.state & QStyle.State_Selected; is_active = opt.state & QStyle.State_Active
         bg_color = QColor("#4A90E2") if (is_selected and is_active) else Qt.transparent
         text_color = Qt.white if (is_selected and is_active) else QColor("#1A2530") if is_selected else QColor("#333333")
+        if index.data(FONT_STATUS_ROLE) == PATH_OFFLINE:
+            text = f"{text}（离线）"
+            if not (is_selected and is_active): text_color = QColor("#9AA5B1")
+        # 列表统一了行尺寸，条目宽度按第一项算；这里一律铺满可见宽度，长文件名省略显示
+        if opt.widget is not None: rect.setRight(opt.widget.viewport().width() - 1)
         bg_rect = rect.adjusted(9, 4, -5, -4); text_rect = bg_rect.adjusted(6, 0, -6, 0)
         painter.setBrush(bg_color); painter.setPen(Qt.NoPen); painter.drawRoundedRect(bg_rect, 8, 8)
-        painter.setFont(self.font); painter.setPen(text_color); painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter, text)
+        painter.setFont(self.font)
+        score = index.data(FONT_CORPUS_ROLE)
+        if score is not None:
+            score_text = f"{score[self.score_column]:.1%}"; score_width = painter.fontMetrics().horizontalAdvance(score_text)
+            painter.setPen(text_color if is_selected and is_active else QColor("#7A8794")); painter.drawText(text_rect, Qt.AlignRight | Qt.AlignVCenter, score_text)
+            text_rect.setRight(text_rect.right() - score_width - 8)
+        thumbnail = opt.widget.thumbnail(index.data(Qt.UserRole)) if isinstance(opt.widget, FontListWidget) else None
+        if thumbnail is not None:
+            # 缩略图靠右，最多占剩余宽度的一半，超出的部分裁掉
+            dpr = thumbnail.devicePixelRatio(); width = min(thumbnail.width() / dpr, text_rect.width() / 2); height = thumbnail.height() / dpr
+            painter.drawImage(QRectF(text_rect.right() - width, text_rect.center().y() - height / 2, width, height), thumbnail, QRectF(0, 0, width * dpr, thumbnail.height()))
+            text_rect.setRight(int(text_rect.right() - width - 8))
+        text = painter.fontMetrics().elidedText(text, Qt.ElideRight, text_rect.width())
+        painter.setPen(text_color); painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter, text)
         painter.restore()
     def sizeHint(self, option, index):
         size = super().sizeHint(option, index); size.setHeight(36); return size
@@ -80,19 +1098,68 @@ class CustomItemDelegate(QStyledItemDelegate):
 # -------------------------------------------------------------------
 # 自定义字体列表控件，以支持拖放安装
 # -------------------------------------------------------------------
+THUMBNAIL_TEXT = "Aa永"
+THUMBNAIL_HEIGHT = 22       # 列表行内样张缩略图的高度（逻辑像素）
+THUMBNAIL_CACHE = 512       # 最多缓存多少个字体的缩略图
+THUMBNAIL_DELAY_MS = 60     # 滚动停下这么久才给可见行提交缩略图任务
+
+def render_font_thumbnail(path, height, dpr):
+    # 列表行里的小样张：不经过字体数据库，直接用 QRawFont 画；字体里没有的字跳过，一个都没有就返回 None
+    size = int(height * dpr); raw = QRawFont(QByteArray(read_font_bytes(path)), size * 0.7)
+    if not raw.isValid(): return None
+    glyphs = [g for g in raw.glyphIndexesForString(THUMBNAIL_TEXT) if g]
+    if not glyphs: return None
+    baseline = (size - raw.ascent() - raw.descent()) / 2 + raw.ascent(); positions = []; x = 0
+    for advance in raw.advancesForGlyphIndexes(glyphs): positions.append(QPointF(x, baseline)); x += advance.x()
+    image = draw_glyphs(raw, glyphs, positions, x, size); image.setDevicePixelRatio(dpr)
+    return image
+
 class FontListWidget(QListWidget):
     # 定义一个信号，当字体被成功拖放并复制后，发射这个信号
     fontDropped = pyqtSignal(str)
 
-    def __init__(self, parent=None):
+    def __init__(self, scheduler, parent=None):
         super().__init__(parent)
         self.setAcceptDrops(True)
         self.fonts_dir = self.get_app_path() / "fonts"
+        self.scheduler = scheduler
+        self.pending_copies = set()
+        self.thumbnails = OrderedDict()   # 路径 -> QImage（None 表示画不出来）
+        self.thumbnail_tokens = {}        # 路径 -> 排队中的缩略图任务的取消令牌
+        # 委托画到缺缩略图的行时启动这个计时器；滚动、筛选、排序都会重画，所以不用单独监听
+        self.thumbnail_timer = QTimer(self); self.thumbnail_timer.setSingleShot(True); self.thumbnail_timer.setInterval(THUMBNAIL_DELAY_MS)
+        self.thumbnail_timer.timeout.connect(self.request_visible_thumbnails)
+
+    def thumbnail(self, path):
+        if path in self.thumbnails: self.thumbnails.move_to_end(path); return self.thumbnails[path]
+        if path not in self.thumbnail_tokens: self.thumbnail_timer.start()
+        return None
+
+    def request_visible_thumbnails(self):
+        # 只给当前可见的行提交缩略图任务（从上往下排队）；滚出视口的任务取消掉，快速滚动时不会排一长串
+        rect = self.viewport().rect(); visible = {}
+        top = self.indexAt(rect.topLeft()); bottom = self.indexAt(rect.bottomLeft())
+        if top.isValid():
+            for row in range(top.row(), (bottom.row() if bottom.isValid() else self.count() - 1) + 1):
+                item = self.item(row)
+                if item.isHidden() or item.data(FONT_STATUS_ROLE) == PATH_OFFLINE: continue
+                visible[item.data(Qt.UserRole)] = None
+        for path in [p for p in self.thumbnail_tokens if p not in visible]: self.thumbnail_tokens.pop(path).cancel()
+        dpr = self.devicePixelRatioF()
+        for path in visible:
+            if path in self.thumbnails or path in self.thumbnail_tokens: continue
+            self.thumbnail_tokens[path] = self.scheduler.submit(
+                LANE_THUMBNAIL, render_font_thumbnail, path, THUMBNAIL_HEIGHT, dpr,
+                callback=lambda image, p=path: self.on_thumbnail(p, image),
+                error_callback=lambda e, p=path: self.on_thumbnail(p, None))
+
+    def on_thumbnail(self, path, image):
+        self.thumbnail_tokens.pop(path, None); self.thumbnails[path] = image
+        while len(self.thumbnails) > THUMBNAIL_CACHE: self.thumbnails.popitem(last=False)
+        self.viewport().update()
 
     def get_app_path(self):
-        if getattr(sys, 'frozen', False):
-            return Path(os.path.dirname(sys.executable))
-        return Path(os.path.dirname(os.path.abspath(__file__)))
+        return app_path()
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -108,6 +1175,7 @@ class FontListWidget(QListWidget):
         else:
             event.ignore()
 
+    @traced("dropEvent")
     def dropEvent(self, event):
         urls = event.mimeData().urls()
         for url in urls:
@@ -118,21 +1186,30 @@ class FontListWidget(QListWidget):
 
             target_path = self.fonts_dir / source_path.name
 
-            if target_path.exists():
+            if target_path.exists() or target_path in self.pending_copies:
                 print(f"字体 '{source_path.name}' 已存在，跳过。")
                 continue
 
-            try:
-                shutil.copy(source_path, target_path)
-                # 发射信号，并传递新复制的字体文件的路径
-                self.fontDropped.emit(str(target_path))
-            except Exception as e:
-                print(f"复制字体 '{source_path.name}' 时失败: {e}")
-                msg_box = QMessageBox()
-                msg_box.setIcon(QMessageBox.Warning)
-                msg_box.setText(f"无法安装字体 '{source_path.name}'。")
-                msg_box.setInformativeText(str(e))
-                msg_box.exec_()
+            # 大文件复制放到后台通道，避免拖放时界面卡住
+            self.pending_copies.add(target_path)
+            self.scheduler.submit(
+                LANE_BACKGROUND, copy_font_file, source_path, target_path,
+                callback=lambda _, t=target_path: self.on_copy_finished(t),
+                error_callback=lambda e, s=source_path, t=target_path: self.on_copy_failed(s, t, e))
+
+    def on_copy_finished(self, target_path):
+        self.pending_copies.discard(target_path)
+        # 发射信号，并传递新复制的字体文件的路径
+        self.fontDropped.emit(str(target_path))
+
+    def on_copy_failed(self, source_path, target_path, e):
+        self.pending_copies.discard(target_path)
+        print(f"复制字体 '{source_path.name}' 时失败: {e}")
+        msg_box = QMessageBox()
+        msg_box.setIcon(QMessageBox.Warning)
+        msg_box.setText(f"无法安装字体 '{source_path.name}'。")
+        msg_box.setInformativeText(str(e))
+        msg_box.exec_()
 
 # -------------------------------------------------------------------
 # QSS
@@ -161,6 +1238,7 @@ CUSTOM_STYLESHEET_TEMPLATE = """
     }}
     QPushButton:hover {{ background-color: #F5F8FA; }}
     QPushButton:pressed {{ background-color: #E1E8ED; }}
+    QPushButton:checked {{ background-color: #4A90E2; color: #FFFFFF; border-color: #4A90E2; }}
     QLineEdit {{
         background-color: #FFFFFF;
         border: 1px solid #DDE4E8;
@@ -170,6 +1248,51 @@ CUSTOM_STYLESHEET_TEMPLATE = """
         color: #222;
     }}
     QLineEdit:focus {{ border: 2px solid #4A90E2; }}
+    QPlainTextEdit {{
+        background-color: #FFFFFF;
+        border: 1px solid #DDE4E8;
+        border-radius: 8px;
+        padding: 6px;
+        font-size: 16px;
+        color: #222;
+    }}
+    QPlainTextEdit:focus {{ border: 2px solid #4A90E2; }}
+    QFrame#ComparePane {{
+        background-color: #FFFFFF;
+        border: 1px solid #E1E8ED;
+        border-radius: 12px;
+    }}
+    QLabel#CompareCaption {{
+        color: #586A7A;
+        font-size: 13px;
+    }}
+    QPushButton#CompareClose {{
+        border: none;
+        padding: 2px 8px;
+        background-color: transparent;
+    }}
+    QFrame#GlyphMapPanel {{
+        background-color: #FFFFFF;
+        border: 1px solid #E1E8ED;
+        border-radius: 12px;
+    }}
+    #GlyphMapView {{
+        border: none;
+        background-color: #FFFFFF;
+    }}
+    QLabel#GlyphMapStatus {{
+        color: #586A7A;
+        font-size: 13px;
+    }}
+    QPushButton#FacetOption {{
+        padding: 3px 6px;
+        border-radius: 10px;
+        font-size: 12px;
+        font-weight: normal;
+    }}
+    QPushButton#FacetOption:disabled {{ color: #B0BAC4; }}
+    QLabel#FacetTitle {{ color: #586A7A; font-size: 12px; padding-top: 4px; }}
+    QLabel#FacetSummary {{ color: #586A7A; font-size: 12px; }}
     QListWidget {{
         border: none;
         background-color: transparent;
@@ -184,6 +1307,20 @@ CUSTOM_STYLESHEET_TEMPLATE = """
         min-height: 20px;
         border-radius: 4px;
     }}
+    #PreviewCanvas {{
+        border: none;
+        background-color: #FFFFFF;
+        border-radius: 12px;
+    }}
+    #PreviewCanvas QScrollBar:vertical {{
+        width: 8px;
+        background: transparent;
+    }}
+    #PreviewCanvas QScrollBar::handle:vertical {{
+        background: #c0c0c0;
+        min-height: 20px;
+        border-radius: 4px;
+    }}
     QSlider::groove:horizontal {{
         border: 1px solid #DDE4E8;
         height: 4px;
@@ -245,46 +1382,1482 @@ FILE_DIALOG_STYLESHEET = """
         background-color: #D0D8E0;
     }
 """
+# -------------------------------------------------------------------
+# 预览渲染（界面预览和命令行样张共用）
+# -------------------------------------------------------------------
+DEFAULT_SAMPLE_TEXT = "从左边选一个字体开始查看吧！"
+PREVIEW_MARGIN = 10
+
+def make_preview_font(family, point_size):
+    # family 也可以是 (家族, 粗细, 斜体)：同一家族的几个字重同时注册时，按它挑出对应的那一个
+    if isinstance(family, tuple): font = QFont(family[0], point_size, family[1], family[2])
+    else: font = QFont(family, point_size)
+    font.setStyleStrategy(QFont.PreferAntialias)
+    return font
+
+def layout_preview_text(font, text, width):
+    doc = QTextDocument(); doc.setDefaultFont(font); doc.setPlainText(text if text else DEFAULT_SAMPLE_TEXT); doc.setTextWidth(width - 2 * PREVIEW_MARGIN)
+    return doc
+
+def paint_preview(painter, font, doc, height):
+    # 文本在给定高度内垂直居中，放不下时从顶部开始；返回文本顶端的 y
+    painter.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform); painter.setFont(font); painter.setPen(QColor("#222"))
+    y = max((height - doc.size().height()) / 2, 0); painter.translate(PREVIEW_MARGIN, y); doc.drawContents(painter)
+    return y
+
+def render_text_image(family, text, point_size, width, height=0, transparent=False):
+    # 不依赖窗口，可以在工作线程里画到 QImage 上；高度为 0 时按排版结果自动决定
+    font = make_preview_font(family, point_size)
+    doc = layout_preview_text(font, text, width)
+    image_height = height or int(doc.size().height()) + 2 * PREVIEW_MARGIN
+    image = QImage(width, image_height, QImage.Format_ARGB32_Premultiplied); image.fill(Qt.transparent if transparent else Qt.white)
+    p = QPainter(image); paint_preview(p, font, doc, image_height); p.end()
+    return image
+
+# -------------------------------------------------------------------
+# 矢量文本缓存：在参考字号下排版一次，把字形轮廓按断行机会切成段存成 QPainterPath，
+# 换字号只是缩放绘制；换算到参考字号后的换行宽度变了才重新断行，而断行只是累加宽度。
+# 位图字体和彩色字形（COLR/CBDT/sbix/SVG）没有可用的轮廓，返回 None 走原来的排版绘制
+# -------------------------------------------------------------------
+REFERENCE_POINT_SIZE = 100
+VECTOR_MIN_POINT_SIZE = 48      # 小字号仍用原生渲染：有 hinting，字形缓存也比画轮廓快
+TEXT_PATH_CACHE_PARAGRAPHS = 4096
+TEXT_DOCUMENT_MARGIN = 4        # QTextDocument 默认的 documentMargin，保持和原生渲染对齐
+NON_VECTOR_TABLES = ("COLR", "CBDT", "sbix", "SVG ")
+RTL_CLASSES = frozenset(("R", "AL", "RLE", "RLO", "RLI"))
+_vector_fonts = {}
+
+def raw_font_key(raw):
+    return (raw.familyName(), raw.styleName(), raw.weight(), raw.style())
+
+def raw_font_is_vector(raw):
+    key = raw_font_key(raw)
+    if key not in _vector_fonts:
+        has_outlines = any(not raw.fontTable(tag).isEmpty() for tag in ("glyf", "CFF ", "CFF2"))
+        _vector_fonts[key] = has_outlines and all(raw.fontTable(tag).isEmpty() for tag in NON_VECTOR_TABLES)
+    return _vector_fonts[key]
+
+def line_breaks(text):
+    finder = QTextBoundaryFinder(QTextBoundaryFinder.Line, text); breaks = [0]
+    while True:
+        position = finder.toNextBoundary()
+        if position < 0: break
+        breaks.append(position)
+    if breaks[-1] != len(text): breaks.append(len(text))
+    return breaks
+
+class ParagraphPaths:
+    # 一个段落的字形轮廓段 [(轮廓, 宽度, 末尾空白宽度)]，坐标都是参考字号下的像素
+    def __init__(self, segments, line_height):
+        self.segments = segments; self.line_height = line_height; self._wraps = {}
+
+    def wrap(self, width):
+        # 返回 [[(x, 轮廓), ...], ...]，每行一个列表；按换算后的换行宽度缓存
+        key = int(width)
+        lines = self._wraps.get(key)
+        if lines is None:
+            lines = []; current = []; x = 0
+            for path, advance, trailing in self.segments:
+                if current and x + advance - trailing > width: lines.append(current); current = []; x = 0
+                current.append((x, path)); x += advance
+            lines.append(current)
+            if len(self._wraps) > 16: self._wraps.clear()
+            self._wraps[key] = lines
+        return lines
+
+class TextPathLayout:
+    # 整段文本由各段落的 ParagraphPaths 拼成；段落单独缓存，编辑时只有改动的段落要重新取轮廓
+    def __init__(self, paragraphs):
+        self.paragraphs = paragraphs; self.line_height = max(p.line_height for p in paragraphs)
+
+    def lines_for(self, point_size, width):
+        ref_width = (width - 2 * PREVIEW_MARGIN - 2 * TEXT_DOCUMENT_MARGIN) * REFERENCE_POINT_SIZE / point_size
+        lines = []
+        for paragraph in self.paragraphs: lines.extend(paragraph.wrap(ref_width))
+        return lines
+
+    def text_height(self, point_size, lines):
+        return len(lines) * self.line_height * point_size / REFERENCE_POINT_SIZE + 2 * TEXT_DOCUMENT_MARGIN
+
+    def paint(self, painter, point_size, lines, clip_top=0, clip_bottom=math.inf):
+        # 以文本左上角为原点，只画和 [clip_top, clip_bottom) 相交的行（上下各多画一行，容纳伸出行框的笔画）。
+        # lines 由主线程用 lines_for 预先算好，这里只读，可以在工作线程里调用
+        scale = point_size / REFERENCE_POINT_SIZE; line_px = self.line_height * scale
+        first = max(int((clip_top - TEXT_DOCUMENT_MARGIN) // line_px) - 1, 0)
+        last = len(lines) if clip_bottom == math.inf else min(int((clip_bottom - TEXT_DOCUMENT_MARGIN) // line_px) + 2, len(lines))
+        # 颜色和 QTextDocument 默认调色板的文字颜色一致
+        painter.setRenderHint(QPainter.Antialiasing); painter.setPen(Qt.NoPen); painter.setBrush(QColor(Qt.black))
+        painter.translate(PREVIEW_MARGIN + TEXT_DOCUMENT_MARGIN, TEXT_DOCUMENT_MARGIN); painter.scale(scale, scale)
+        for row in range(first, last):
+            y = row * self.line_height
+            for x, path in lines[row]:
+                painter.translate(x, y); painter.drawPath(path); painter.translate(-x, -y)
+
+def build_paragraph_paths(font, paragraph, glyph_paths):
+    # glyph_paths: (字体, 字形号) -> 轮廓，跨段落共用，同一个字形只取一次
+    # 双向文本的视觉顺序和逻辑顺序不一致，不按段切分，交给原生排版
+    if any(unicodedata.bidirectional(c) in RTL_CLASSES for c in paragraph): return None
+    layout = QTextLayout(paragraph, font); layout.beginLayout(); line = layout.createLine(); line.setNumColumns(max(len(paragraph), 1)); layout.endLayout()
+    glyphs = []
+    for run in layout.glyphRuns():
+        raw = run.rawFont()
+        if not raw_font_is_vector(raw): return None
+        font_key = raw_font_key(raw)
+        glyphs.extend((pos.x(), pos.y(), raw, font_key, gid) for gid, pos in zip(run.glyphIndexes(), run.positions()))
+    glyphs.sort(key=lambda g: g[0])
+    breaks = line_breaks(paragraph); xs = [line.cursorToX(b)[0] for b in breaks]
+    segments = []; g = 0
+    for i in range(len(breaks) - 1):
+        start, end = breaks[i], breaks[i + 1]; x0, x1 = xs[i], xs[i + 1]
+        path = QPainterPath()
+        while g < len(glyphs) and (glyphs[g][0] < x1 or i == len(breaks) - 2):
+            x, y, raw, font_key, gid = glyphs[g]; glyph = glyph_paths.get((font_key, gid))
+            if glyph is None: glyph = glyph_paths[(font_key, gid)] = raw.pathForGlyph(gid)
+            path.addPath(glyph.translated(x - x0, y)); g += 1
+        stripped = len(paragraph[start:end].rstrip())
+        segments.append((path, x1 - x0, x1 - line.cursorToX(start + stripped)[0]))
+    return ParagraphPaths(segments, line.height())
+
+class TextPathCache:
+    # (字体家族, 段落文本) -> ParagraphPaths；不能矢量化的段落也记下 None，避免反复尝试
+    def __init__(self, max_paragraphs=TEXT_PATH_CACHE_PARAGRAPHS):
+        self.max_paragraphs = max_paragraphs; self.entries = OrderedDict(); self.glyph_paths = {}
+
+    def get(self, family, text):
+        font = None; paragraphs = []
+        for paragraph in (text if text else DEFAULT_SAMPLE_TEXT).split("\n"):
+            key = (family, paragraph)
+            if key in self.entries:
+                self.entries.move_to_end(key); paths = self.entries[key]
+            else:
+                if font is None: font = make_preview_font(family, REFERENCE_POINT_SIZE)
+                paths = self.entries[key] = build_paragraph_paths(font, paragraph, self.glyph_paths)
+            if paths is None: paragraphs = None; break
+            paragraphs.append(paths)
+        while len(self.entries) > self.max_paragraphs: self.entries.popitem(last=False)
+        return TextPathLayout(paragraphs) if paragraphs else None
+
+    def clear(self):
+        self.entries.clear(); self.glyph_paths.clear(); _vector_fonts.clear()
+
+# 原生排版同样按段落缓存。QTextLayout 不能被两个线程同时使用，所以键里带线程 id，每个线程只取自己排的；
+# 所有线程共用一个加锁的 LRU 和总数上限。字体卸载时只把代数加一，旧代的条目不再命中，随 LRU 淘汰
+PARAGRAPH_LAYOUT_CACHE = 4096   # 所有线程合计
+_paragraph_layouts = OrderedDict()   # (线程 id, 家族, 字号, 换行宽度, 段落) -> (代数, QTextLayout)
+_paragraph_layouts_lock = threading.Lock()
+_paragraph_layout_generation = 0
+
+def paragraph_layout(family, point_size, width, text):
+    key = (threading.get_ident(), family, point_size, width, text)
+    with _paragraph_layouts_lock:
+        entry = _paragraph_layouts.get(key); generation = _paragraph_layout_generation
+        if entry is not None and entry[0] == generation: _paragraph_layouts.move_to_end(key); return entry[1]
+    # 排版在锁外进行，其它线程不用等
+    layout = QTextLayout(text, make_preview_font(family, point_size))
+    option = QTextOption(); option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere); layout.setTextOption(option)
+    layout.beginLayout(); y = 0
+    while True:
+        line = layout.createLine()
+        if not line.isValid(): break
+        line.setLineWidth(width); line.setPosition(QPointF(0, y)); y += line.height()
+    layout.endLayout()
+    with _paragraph_layouts_lock:
+        _paragraph_layouts[key] = (generation, layout); _paragraph_layouts.move_to_end(key)
+        while len(_paragraph_layouts) > PARAGRAPH_LAYOUT_CACHE: _paragraph_layouts.popitem(last=False)
+    return layout
+
+def clear_paragraph_layouts():
+    global _paragraph_layout_generation
+    with _paragraph_layouts_lock: _paragraph_layout_generation += 1
+
+# -------------------------------------------------------------------
+# 预览画布：排好版的文本按固定大小的瓦片光栅化，只画视口里（和上下各一行）的瓦片，
+# 瓦片在调度器的预览通道上并行绘制，按字节上限做 LRU 缓存；长文本可以滚动，
+# Ctrl+滚轮缩放字号，任意长度和字号都不需要分配整张大图
+# -------------------------------------------------------------------
+TILE_SIZE = 256                          # 瓦片边长（逻辑像素）
+TILE_CACHE_BUDGET = 64 * 1024 * 1024     # 瓦片缓存上限（字节）
+ZOOM_STEP = 1.1                          # Ctrl+滚轮每格缩放的倍数
+RESIZE_SETTLE_MS = 150                   # 调整大小停下这么久才按新宽度重新排版
+MISSING_MARK_COLOR = QColor(229, 57, 53)
+
+def utf16_length(text):
+    return len(text) + sum(1 for c in text if ord(c) > 0xFFFF)
+
+def utf16_to_index(text, position):
+    # QTextLayout 的位置按 UTF-16 计，换算成 Python 字符串下标
+    units = 0
+    for i, c in enumerate(text):
+        if units >= position: return i
+        units += 2 if ord(c) > 0xFFFF else 1
+    return len(text)
+
+class PreviewScene:
+    # 一次预览的不可变描述，key 相同的场景画出来完全一样，瓦片缓存按它区分
+    # （key 最后一项区分矢量绘制和原生排版，两者的瓦片不能混用）
+    def __init__(self, family, text, point_size, width, paths=None):
+        self.family = family; self.text = text; self.point_size = point_size; self.width = width; self.paths = paths
+        self.key = (family, text, point_size, width, paths is not None)
+        self.marks = {}; self.marks_coverage = None   # 段落下标 -> 缺字的矩形，按覆盖位图缓存
+        if paths is not None:
+            self.lines = paths.lines_for(point_size, width); self.height = paths.text_height(point_size, self.lines)
+        else:
+            # 原生排版按段落缓存：编辑时只有改动的段落重新排版，其余段落只是累加高度
+            self.lines = None; self.paragraphs = (text if text else DEFAULT_SAMPLE_TEXT).split("\n")
+            self.wrap_width = width - 2 * PREVIEW_MARGIN - 2 * TEXT_DOCUMENT_MARGIN
+            self.offsets = [TEXT_DOCUMENT_MARGIN]   # 各段落顶端 y，最后一项是文本底部
+            for paragraph in self.paragraphs:
+                self.offsets.append(self.offsets[-1] + paragraph_layout(family, point_size, self.wrap_width, paragraph).boundingRect().height())
+            self.height = self.offsets[-1] + TEXT_DOCUMENT_MARGIN
+
+    def paint(self, painter, clip):
+        # 以内容左上角为原点绘制，clip 是内容坐标里需要的区域
+        if self.paths is not None: self.paths.paint(painter, self.point_size, self.lines, clip.top(), clip.bottom()); return
+        painter.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform); painter.setPen(QColor(Qt.black))
+        for index in range(max(bisect.bisect_right(self.offsets, clip.top()) - 1, 0), len(self.paragraphs)):
+            if self.offsets[index] > clip.bottom(): break
+            paragraph_layout(self.family, self.point_size, self.wrap_width, self.paragraphs[index]).draw(painter, QPointF(PREVIEW_MARGIN + TEXT_DOCUMENT_MARGIN, self.offsets[index]))
+
+    # 以下只用于原生排版的场景：段落排版在各线程里都有缓存，命中测试和标记缺字不用重新排版
+    def paragraph_indexes(self, top, bottom):
+        first = max(bisect.bisect_right(self.offsets, top) - 1, 0)
+        return range(first, min(bisect.bisect_right(self.offsets, bottom), len(self.paragraphs)))
+
+    def hit_test(self, x, y):
+        # 内容坐标 -> (段落下标, 段落里的 UTF-16 位置)；不在字符上返回 None。矢量场景没有逐段排版，直接返回
+        if self.paths is not None or not self.paragraphs: return None
+        index = bisect.bisect_right(self.offsets, y) - 1
+        if not 0 <= index < len(self.paragraphs): return None
+        layout = paragraph_layout(self.family, self.point_size, self.wrap_width, self.paragraphs[index])
+        x -= PREVIEW_MARGIN + TEXT_DOCUMENT_MARGIN; y -= self.offsets[index]
+        for n in range(layout.lineCount()):
+            line = layout.lineAt(n)
+            if line.y() <= y < line.y() + line.height():
+                if not 0 <= x < line.naturalTextWidth(): return None
+                position = line.xToCursor(x, QTextLine.CursorOnCharacter)
+                return (index, position) if position < line.textStart() + line.textLength() else None
+        return None
+
+    def character_info(self, index, position):
+        # 返回 (字符, 字形号, 实际用来绘制的字体家族)；字形号和家族取自排版结果，回退字体也能看出来
+        paragraph = self.paragraphs[index]; char = paragraph[utf16_to_index(paragraph, position)]
+        runs = paragraph_layout(self.family, self.point_size, self.wrap_width, paragraph).glyphRuns(position, utf16_length(char))
+        glyphs = runs[0].glyphIndexes() if runs else []
+        return char, glyphs[0] if glyphs else None, runs[0].rawFont().familyName() if runs else ""
+
+    def missing_rects(self, index, coverage):
+        # 当前字体 cmap 里没有的字符（控制字符和空白除外）在内容坐标里的矩形
+        if coverage is not self.marks_coverage: self.marks = {}; self.marks_coverage = coverage
+        rects = self.marks.get(index)
+        if rects is not None: return rects
+        paragraph = self.paragraphs[index]; rects = self.marks[index] = []; layout = None; position = 0
+        for char in paragraph:
+            cp = ord(char); units = 2 if cp > 0xFFFF else 1
+            if not coverage[cp >> 3] >> (cp & 7) & 1 and not char.isspace() and unicodedata.category(char)[0] != "C":
+                if layout is None: layout = paragraph_layout(self.family, self.point_size, self.wrap_width, paragraph)
+                line = layout.lineForTextPosition(position)
+                if line.isValid():
+                    x1 = line.cursorToX(position)[0]; x2 = line.cursorToX(position + units)[0]
+                    rects.append(QRectF(PREVIEW_MARGIN + TEXT_DOCUMENT_MARGIN + min(x1, x2), self.offsets[index] + line.y(), max(abs(x2 - x1), 2), line.height()))
+            position += units
+        return rects
+
+def render_tile(scene, col, row, dpr):
+    image = QImage(int(TILE_SIZE * dpr), int(TILE_SIZE * dpr), QImage.Format_ARGB32_Premultiplied); image.setDevicePixelRatio(dpr); image.fill(Qt.transparent)
+    p = QPainter(image); p.translate(-col * TILE_SIZE, -row * TILE_SIZE); scene.paint(p, QRectF(col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE)); p.end()
+    return image
+
+class PreviewCanvas(QAbstractScrollArea):
+    zoomRequested = pyqtSignal(int)
+    layoutWidthChanged = pyqtSignal(int)
+
+    def __init__(self, scheduler, placeholder, parent=None, lane=LANE_PREVIEW):
+        super().__init__(parent)
+        self.setObjectName("PreviewCanvas")
+        self.scheduler = scheduler; self.placeholder = placeholder; self.lane = lane
+        self.scene = None
+        self.tiles = OrderedDict(); self.tile_bytes = 0   # (场景 key, dpr, 列, 行) -> QImage
+        self.pending = {}                                 # 同样的键 -> 取消令牌
+        # 拖动滑块时的临时画面：抓取的视口图像、当时的场景和内容顶端 y；interim_size 不为 None 时只画它
+        self.backdrop = None; self.interim_size = None
+        # 换宽度后新瓦片画好之前，用上一个宽度的场景（已缓存的瓦片）缩放垫底
+        self.stand_in = None
+        # 缺字检查：当前字体的覆盖位图，不为 None 时在瓦片上面标出缺字，鼠标悬停显示字符信息
+        self.coverage = None; self.hovered = None
+        self.resize_timer = QTimer(self); self.resize_timer.setSingleShot(True); self.resize_timer.setInterval(RESIZE_SETTLE_MS); self.resize_timer.timeout.connect(self.on_resize_settled)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff); self.setFrameShape(QFrame.NoFrame)
+        self.verticalScrollBar().setSingleStep(24)
+
+    def set_coverage(self, coverage):
+        self.coverage = coverage; self.hovered = None
+        self.viewport().setMouseTracking(coverage is not None); QToolTip.hideText(); self.viewport().update()
+
+    def set_scene(self, scene):
+        if self.backdrop is not None and self.backdrop[1].key[:2] != scene.key[:2]: self.backdrop = None
+        old = self.scene
+        if old is not None and old.key[:3] == scene.key[:3] and old.width != scene.width: self.stand_in = old
+        elif old is None or old.key[:3] != scene.key[:3]: self.stand_in = None
+        self.scene = scene; self.interim_size = None
+        self.update_scrollbar(); self.viewport().update()
+
+    def show_interim(self, point_size):
+        # 先抓一次当前画面，之后只对它做缩放变换，直到下一个 set_scene。
+        # 瓦片还没画全时抓到的画面会缺块：这时沿用上一次完整画面的截图，没有的话先不进入临时画面，照常显示当前场景
+        if self.scene is None: return
+        if self.interim_size is None:
+            if self.viewport().width() == self.scene.width and not self.missing_tiles(): self.backdrop = (self.viewport().grab(), self.scene, self.content_top())
+            elif self.backdrop is None: return
+        self.interim_size = point_size; self.viewport().update()
+
+    def clear_tiles(self):
+        for token in self.pending.values(): token.cancel()
+        self.pending.clear(); self.tiles.clear(); self.tile_bytes = 0; self.backdrop = None; self.stand_in = None
+
+    def content_top(self, scene=None, scale=1.0):
+        # 内容比视口矮时垂直居中，否则跟随滚动条；scale 是把 scene 缩放显示时的倍数
+        scene = scene or self.scene
+        return max((self.viewport().height() / scale - scene.height) / 2, 0) - self.verticalScrollBar().value() / scale
+
+    def update_scrollbar(self):
+        bar = self.verticalScrollBar(); height = self.scene.height if self.scene else 0
+        bar.setRange(0, max(math.ceil(height - self.viewport().height()), 0)); bar.setPageStep(self.viewport().height())
+
+    def visible_tiles(self, margin_rows=1, scene=None, scale=1.0):
+        # 视口内的瓦片按从上到下排在前面，预读的上下几行排在最后
+        scene = scene or self.scene
+        top = self.content_top(scene, scale); height = self.viewport().height() / scale; row_count = math.ceil(scene.height / TILE_SIZE)
+        first = max(int(-top // TILE_SIZE), 0); last = min(int((height - top) // TILE_SIZE), max(row_count - 1, 0))
+        cols = range(max(math.ceil(self.viewport().width() / scale / TILE_SIZE), 1))
+        rows = list(range(first, last + 1)) + [r for k in range(1, margin_rows + 1) for r in (last + k, first - k) if 0 <= r < row_count]
+        return [(col, row) for row in rows for col in cols]
+
+    def tile_key(self, col, row, scene=None):
+        return ((scene or self.scene).key, self.devicePixelRatioF(), col, row)
+
+    def missing_tiles(self):
+        if self.scene is None: return []
+        return [t for t in self.visible_tiles(margin_rows=0) if self.tile_key(*t) not in self.tiles]
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event); self.update_scrollbar()
+        if self.scene is not None and self.viewport().width() != self.scene.width:
+            # 拖动窗口或分隔条时先缩放现有瓦片顶着，停下来再按最终宽度排版一次；还没显示时直接排版
+            if self.isVisible(): self.resize_timer.start()
+            else: self.on_resize_settled()
+
+    def on_resize_settled(self):
+        if self.scene is not None and self.viewport().width() != self.scene.width: self.layoutWidthChanged.emit(self.viewport().width())
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def wheelEvent(self, event):
+        if event.modifiers() & Qt.ControlModifier:
+            steps = round(event.angleDelta().y() / 120)
+            if steps: self.zoomRequested.emit(steps)
+            event.accept(); return
+        super().wheelEvent(event)
+
+    def paintEvent(self, event):
+        p = QPainter(self.viewport())
+        if self.scene is None:
+            p.setPen(QColor("#333")); p.drawText(self.viewport().rect(), Qt.AlignCenter, self.placeholder); p.end(); return
+        if self.interim_size is not None:
+            if self.backdrop is not None:
+                scale = self.interim_size / self.backdrop[1].point_size
+                # 估计缩放后的内容顶端：矮的内容按新高度居中，长的保持视口顶端对着同一处内容
+                top = max((self.viewport().height() - self.backdrop[1].height * scale) / 2, 0) - self.verticalScrollBar().value() * scale
+                self.paint_backdrop(p, scale, top)
+            p.end(); return
+        if self.viewport().width() != self.scene.width:
+            # 正在调整大小：按宽度比例缩放已有瓦片，不请求新瓦片
+            self.paint_cached_tiles(p, self.scene, self.viewport().width() / max(self.scene.width, 1)); p.end(); return
+        top = self.content_top(); missing = self.paint_cached_tiles(p, self.scene)
+        # 还没画好的瓦片先垫上旧画面：换宽度时用上一个宽度的瓦片，拖动滑块后用缩放过的截图
+        if missing and (self.stand_in is not None or self.backdrop is not None):
+            clip = QRegion()
+            for col, row in missing: clip += QRect(col * TILE_SIZE, math.floor(top + row * TILE_SIZE), TILE_SIZE, TILE_SIZE)
+            p.save(); p.setClipRegion(clip)
+            if self.stand_in is not None: self.paint_cached_tiles(p, self.stand_in, self.viewport().width() / max(self.stand_in.width, 1))
+            else: self.paint_backdrop(p, self.scene.point_size / self.backdrop[1].point_size, top)
+            p.restore()
+        if self.coverage is not None and self.scene.paths is None: self.paint_missing_marks(p, top)
+        p.end()
+        self.request_tiles(missing)
+
+    def paint_cached_tiles(self, painter, scene, scale=1.0):
+        # 画出 scene 已缓存的可见瓦片，返回缺少的瓦片
+        painter.save(); painter.scale(scale, scale)
+        top = self.content_top(scene, scale); missing = []
+        for col, row in self.visible_tiles(scene=scene, scale=scale):
+            key = self.tile_key(col, row, scene); image = self.tiles.get(key)
+            if image is None: missing.append((col, row)); continue
+            self.tiles.move_to_end(key); painter.drawImage(QPointF(col * TILE_SIZE, top + row * TILE_SIZE), image)
+        painter.restore()
+        return missing
+
+    def paint_missing_marks(self, painter, top):
+        # 标记画在瓦片上面而不是画进瓦片，开关检查不用重画瓦片
+        fill = QColor(MISSING_MARK_COLOR); fill.setAlpha(50)
+        painter.translate(0, top); painter.setPen(Qt.NoPen)
+        for index in self.scene.paragraph_indexes(-top, self.viewport().height() - top):
+            for rect in self.scene.missing_rects(index, self.coverage):
+                painter.fillRect(rect, fill); painter.fillRect(QRectF(rect.left(), rect.bottom() - 2, rect.width(), 2), MISSING_MARK_COLOR)
+        painter.translate(0, -top)
+
+    def mouseMoveEvent(self, event):
+        if self.coverage is None or self.scene is None or self.scene.paths is not None or self.interim_size is not None:
+            super().mouseMoveEvent(event); return
+        hit = self.scene.hit_test(event.pos().x(), event.pos().y() - self.content_top())
+        if hit == self.hovered: return
+        self.hovered = hit
+        if hit is None: QToolTip.hideText(); return
+        char, glyph, family = self.scene.character_info(*hit); cp = ord(char)
+        lines = [f"U+{cp:04X}  {unicodedata.name(char, '')}", f"字形 {'-' if glyph is None else glyph} · {family or '未知字体'}"]
+        if glyph == 0: lines.append("没有可用的字体能显示这个字符")
+        elif not self.coverage[cp >> 3] >> (cp & 7) & 1: lines.append("当前字体没有这个字符，由其它字体代替显示")
+        QToolTip.showText(event.globalPos(), "\n".join(lines), self.viewport())
+
+    def paint_backdrop(self, painter, scale, top):
+        # 以文本左上角为原点缩放旧画面，让它的内容原点落在 top 处
+        pixmap, _, old_top = self.backdrop
+        painter.translate(PREVIEW_MARGIN, top); painter.scale(scale, scale); painter.translate(-PREVIEW_MARGIN, -old_top); painter.drawPixmap(0, 0, pixmap)
+
+    def request_tiles(self, tiles):
+        # 已经滚出视口的瓦片取消掉，只排队现在需要的
+        wanted = {self.tile_key(col, row): (col, row) for col, row in tiles}
+        for key in [k for k in self.pending if k not in wanted]: self.pending.pop(key).cancel()
+        scene = self.scene; dpr = self.devicePixelRatioF()
+        for key, (col, row) in wanted.items():
+            if key in self.pending: continue
+            self.pending[key] = self.scheduler.submit(
+                self.lane, render_tile, scene, col, row, dpr,
+                callback=lambda image, k=key: self.on_tile_ready(k, image),
+                error_callback=lambda e, k=key: (self.pending.pop(k, None), print(f"预览瓦片绘制失败: {e}")))
+
+    def on_tile_ready(self, key, image):
+        self.pending.pop(key, None)
+        if key in self.tiles: return
+        self.tiles[key] = image; self.tile_bytes += image.sizeInBytes()
+        while self.tile_bytes > TILE_CACHE_BUDGET and len(self.tiles) > 1:
+            _, old = self.tiles.popitem(last=False); self.tile_bytes -= old.sizeInBytes()
+        if self.scene is not None and key[0] == self.scene.key: self.viewport().update()
+
+# -------------------------------------------------------------------
+# 本地查询接口（可选，--rpc-socket PATH 或环境变量 AFV_RPC_SOCKET 开启）
+# 在 Unix 域套接字上提供按行分隔的 JSON-RPC 2.0，让其它工具直接查询已经打开的
+# 字体库：元数据、哪些字体覆盖某段文字、渲染 PNG。请求在调度器的查询通道上并发
+# 执行，每个请求有超时，结果按 (方法, 参数, 字体库版本) 缓存
+# -------------------------------------------------------------------
+RPC_DEFAULT_TIMEOUT_MS = 10000
+RPC_MAX_PENDING = 64      # 同时在处理的请求上限，超过直接回复忙
+RPC_CACHE_ENTRIES = 256
+RPC_PARSE_ERROR, RPC_INVALID_REQUEST, RPC_METHOD_NOT_FOUND, RPC_INVALID_PARAMS, RPC_INTERNAL_ERROR = -32700, -32600, -32601, -32602, -32603
+RPC_TIMEOUT, RPC_BUSY, RPC_NOT_READY = -32000, -32001, -32002
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message); self.code = code
+
+def range_contains(ranges, starts, codepoint):
+    i = bisect.bisect_right(starts, codepoint) - 1
+    return i >= 0 and ranges[i][1] >= codepoint
+
+def fonts_covering(entries, codepoints, partial=False):
+    # entries 是主线程给出的 [(路径, 索引条目)] 快照，条目只会被整体替换，不会原地修改
+    results = []
+    for path, entry in entries:
+        for face_index, face in enumerate(entry.get("faces", ())):
+            ranges = face["coverage"]; starts = [r[0] for r in ranges]
+            missing = [cp for cp in codepoints if not range_contains(ranges, starts, cp)]
+            if missing and not partial: continue
+            results.append({"path": path, "face_index": face_index, "family": face["family"], "style": face["style"],
+                            "missing": [f"U+{cp:04X}" for cp in missing]})
+    results.sort(key=lambda r: len(r["missing"]))
+    return results
+
+def lookup_or_index(index, path):
+    # 返回 (条目, 是否新解析)；索引里没有或已失效时当场解析
+    entry = index.lookup(path)
+    if entry is not None: return entry, False
+    return index_font_file(path)[1], True
+
+def render_png(data, text, point_size, width, height, transparent):
+    # 直接用 QRawFont 从文件数据画（逐字折行、不整形），不注册到进程共用的字体数据库：
+    # 不会和已经加载的同名字体冲突，也没有要注销的东西；字号按 QImage 的逻辑 DPI 换算，和 QFont 画到图上一致
+    raw = QRawFont(QByteArray(data), point_size * QImage(1, 1, QImage.Format_ARGB32_Premultiplied).logicalDpiY() / 72)
+    if not raw.isValid(): raise RpcError(RPC_INVALID_PARAMS, "无法加载字体文件")
+    glyphs, positions, content_height = raw_text_layout(raw, text, width, PREVIEW_MARGIN)
+    image = draw_glyphs(raw, glyphs, positions, width, height or content_height, Qt.transparent if transparent else Qt.white)
+    buffer = QBuffer(); buffer.open(QIODevice.WriteOnly); image.save(buffer, "PNG")
+    return {"width": image.width(), "height": image.height(), "png": base64.b64encode(bytes(buffer.data())).decode("ascii")}
+
+class _RpcCall:
+    # 一个进行中的请求：负责超时、取消和只回复一次
+    def __init__(self, server, socket, request_id, cache_key, timeout_ms):
+        self.server = server; self.socket = socket; self.request_id = request_id; self.cache_key = cache_key
+        self.token = CancelToken(); self.done = False
+        self.timer = QTimer(server); self.timer.setSingleShot(True); self.timer.timeout.connect(lambda: self.fail(RPC_TIMEOUT, f"请求超过 {timeout_ms} ms 未完成"))
+        self.timer.start(timeout_ms); server.pending += 1
+
+    def submit(self, fn, *args, callback, token=None):
+        self.server.scheduler.submit(LANE_QUERY, fn, *args, token=token or self.token,
+                                     callback=lambda result: self.done or self.guard(callback, result),
+                                     error_callback=lambda e: self.fail(e.code if isinstance(e, RpcError) else RPC_INTERNAL_ERROR, str(e)))
+
+    def guard(self, fn, *args):
+        try: fn(*args)
+        except RpcError as e: self.fail(e.code, str(e))
+
+    def reply(self, result):
+        if self._finish(): self.server.store(self.cache_key, result); self.server.send(self.socket, self.request_id, result=result)
+
+    def fail(self, code, message):
+        if self._finish(): self.server.send(self.socket, self.request_id, error={"code": code, "message": message})
+
+    def _finish(self):
+        if self.done: return False
+        self.done = True; self.token.cancel(); self.timer.stop(); self.timer.deleteLater(); self.server.pending -= 1
+        return True
+
+class QueryServer(QObject):
+    def __init__(self, viewer, parent=None):
+        super().__init__(parent)
+        self.viewer = viewer; self.scheduler = viewer.scheduler
+        self.server = QLocalServer(self); self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+        self.sockets = set(); self.pending = 0; self.cache = OrderedDict()
+        self.methods = {"fonts": self.rpc_fonts, "metadata": self.rpc_metadata, "coverage": self.rpc_coverage, "render": self.rpc_render}
+
+    def listen(self, path):
+        QLocalServer.removeServer(path)
+        if not self.server.listen(path): print(f"查询接口启动失败: {self.server.errorString()}"); return False
+        print(f"查询接口已开启：{self.server.fullServerName()}")
+        return True
+
+    def close(self):
+        self.server.close()
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection(); self.sockets.add(socket)
+            socket.readyRead.connect(lambda s=socket: self.on_ready_read(s))
+            socket.disconnected.connect(lambda s=socket: (self.sockets.discard(s), s.deleteLater()))
+
+    def on_ready_read(self, socket):
+        while socket.canReadLine():
+            line = bytes(socket.readLine()).strip()
+            if line: self.handle_request(socket, line)
+
+    def send(self, socket, request_id, result=None, error=None):
+        # 客户端可能已经断开（例如自己先超时了），这时直接丢弃
+        if socket not in self.sockets: return
+        message = {"jsonrpc": "2.0", "id": request_id}
+        if error is not None: message["error"] = error
+        else: message["result"] = result
+        socket.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def store(self, key, result):
+        self.cache[key] = result
+        while len(self.cache) > RPC_CACHE_ENTRIES: self.cache.popitem(last=False)
+
+    def handle_request(self, socket, line):
+        try: request = json.loads(line)
+        except ValueError as e: self.send(socket, None, error={"code": RPC_PARSE_ERROR, "message": f"JSON 解析失败: {e}"}); return
+        # 解析失败和无效请求按 JSON-RPC 2.0 回复 "id": null；只有合法但不带 id 成员的通知才不回复
+        request_id = request.get("id") if isinstance(request, dict) else None
+        if not isinstance(request_id, (str, int, type(None))) or isinstance(request_id, bool): request_id = None
+        params = request.get("params", {}) if isinstance(request, dict) else None
+        if not isinstance(params, dict) or not isinstance(request.get("method"), str):
+            self.send(socket, request_id, error={"code": RPC_INVALID_REQUEST, "message": "需要 method 和对象形式的 params"}); return
+        # 这里的方法都只是查询，通知没有人接收结果，不必执行
+        if "id" not in request: return
+        handler = self.methods.get(request["method"])
+        if handler is None: self.send(socket, request_id, error={"code": RPC_METHOD_NOT_FOUND, "message": f"未知方法: {request['method']}"}); return
+        timeout_ms = params.pop("timeout_ms", RPC_DEFAULT_TIMEOUT_MS)
+        key = (request["method"], json.dumps(params, sort_keys=True), self.viewer.library_generation)
+        if key in self.cache:
+            self.cache.move_to_end(key); self.send(socket, request_id, result=self.cache[key]); return
+        if self.pending >= RPC_MAX_PENDING: self.send(socket, request_id, error={"code": RPC_BUSY, "message": "请求过多，请稍后重试"}); return
+        call = _RpcCall(self, socket, request_id, key, timeout_ms if isinstance(timeout_ms, int) and timeout_ms > 0 else RPC_DEFAULT_TIMEOUT_MS)
+        call.guard(handler, params, call)
+
+    def require_index(self):
+        if self.viewer.font_index is None: raise RpcError(RPC_NOT_READY, "字体索引尚未加载，请稍后重试")
+        return self.viewer.font_index
+
+    @staticmethod
+    def param(params, name, kind, default=None, check=None):
+        value = params.get(name, default)
+        if not isinstance(value, kind) or isinstance(value, bool) and kind is int or (check and not check(value)):
+            raise RpcError(RPC_INVALID_PARAMS, f"参数 {name} 无效")
+        return value
+
+    # 各个方法：在主线程里取快照、校验参数，耗时部分交给查询通道
+    def rpc_fonts(self, params, call):
+        indexed = self.viewer.font_index.entries if self.viewer.font_index else {}
+        call.reply([{"path": path, "status": item.data(FONT_STATUS_ROLE) or PATH_OK, "indexed": path in indexed}
+                    for path, item in self.viewer.font_items.items()])
+
+    def rpc_metadata(self, params, call):
+        index = self.require_index(); path = self.param(params, "path", str)
+        def done(result):
+            entry, fresh = result
+            # 只把字体库里的文件写回索引，任意路径的查询不污染索引
+            if fresh and path in self.viewer.font_items: self.viewer.on_index_chunk([(path, entry)])
+            call.reply(list(face_records(path, entry)))
+        call.submit(lookup_or_index, index, path, callback=done)
+
+    def rpc_coverage(self, params, call):
+        index = self.require_index()
+        text = self.param(params, "text", str, check=bool); partial = self.param(params, "partial", bool, False)
+        paths = self.param(params, "fonts", list, list(self.viewer.font_items))
+        entries = [(p, index.entries[p]) for p in paths if isinstance(p, str) and "faces" in index.entries.get(p, {})]
+        pending = [p for p in paths if isinstance(p, str) and p not in index.entries]
+        codepoints = sorted({ord(c) for c in text if not c.isspace()})
+        call.submit(fonts_covering, entries, codepoints, partial,
+                    callback=lambda fonts: call.reply({"codepoints": len(codepoints), "fonts": fonts, "pending": pending}))
+
+    def rpc_render(self, params, call):
+        path = self.param(params, "path", str)
+        text = self.param(params, "text", str, DEFAULT_SAMPLE_TEXT)
+        size = self.param(params, "size", int, INITIAL_FONT_SIZE, lambda v: MIN_FONT_SIZE <= v <= MAX_FONT_SIZE)
+        width = self.param(params, "width", int, 1200, lambda v: 16 <= v <= 8192)
+        height = self.param(params, "height", int, 0, lambda v: 0 <= v <= 8192)
+        transparent = self.param(params, "transparent", bool, False)
+        # 读文件和绘制都用这个请求的取消令牌，超时后还没开始的那一步就不再占用查询通道
+        call.submit(read_font_bytes, path, callback=lambda data: call.submit(render_png, data, text, size, width, height, transparent, callback=call.reply))
+
+# -------------------------------------------------------------------
+# 语料覆盖率
+# 分块流式读取 UTF-8 语料统计每个码位出现的次数（内存只和块大小、不同字符数有关），
+# 再拿字体库里每个字体的覆盖范围去数：覆盖了多少种字符、按字频加权覆盖了多少比例
+# -------------------------------------------------------------------
+CORPUS_CHUNK_CHARS = 1 << 22   # 每次读入的字符数
+
+def corpus_countable(cp):
+    # 空白、控制字符和解码替换符不参与统计，和预览里的缺字标记一致
+    char = chr(cp)
+    return cp != 0xFFFD and not char.isspace() and unicodedata.category(char)[0] != "C"
+
+def corpus_histogram(path, token=None, chunk_chars=CORPUS_CHUNK_CHARS):
+    # 返回按码位排序的 (码位, 次数)，有 NumPy 时是两个数组；读取途中被取消返回 None
+    counts = np.zeros(0x110000, dtype=np.int64) if np is not None else Counter()
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        while True:
+            if token is not None and token.cancelled: return None
+            chunk = f.read(chunk_chars)
+            if not chunk: break
+            if np is not None: counts += np.bincount(np.frombuffer(chunk.encode("utf-32-le"), dtype=np.uint32), minlength=0x110000)
+            else: counts.update(chunk)
+    if np is not None:
+        codepoints = np.array([cp for cp in np.flatnonzero(counts).tolist() if corpus_countable(cp)], dtype=np.int64)
+        return codepoints, counts[codepoints]
+    codepoints = sorted(cp for cp in map(ord, counts) if corpus_countable(cp))
+    return codepoints, [counts[chr(cp)] for cp in codepoints]
+
+def corpus_scores(entries, histogram):
+    # entries 是 [(路径, 索引条目)]；返回 {路径: (覆盖字符数, 覆盖比例, 加权覆盖比例)}，取每个文件的第一个字体面
+    codepoints, counts = histogram
+    distinct = len(codepoints); total = int(sum(counts)) if np is None else int(counts.sum())
+    paths = [path for path, entry in entries if entry.get("faces")]
+    faces = [entry["faces"][0]["coverage"] for _, entry in entries if entry.get("faces")]
+    if not paths or not distinct: return {path: (0, 0.0, 0.0) for path in paths}
+    if np is not None:
+        # 所有字体的所有区间拼成一个数组一次二分，再按所属字体分组求和
+        lengths = np.fromiter(map(len, faces), dtype=np.int64, count=len(faces))
+        bounds = np.fromiter(itertools.chain.from_iterable(itertools.chain.from_iterable(faces)), dtype=np.int64, count=int(lengths.sum()) * 2).reshape(-1, 2)
+        owners = np.repeat(np.arange(len(faces)), lengths)
+        lo = np.searchsorted(codepoints, bounds[:, 0], 'left'); hi = np.searchsorted(codepoints, bounds[:, 1], 'right')
+        cumulative = np.concatenate(([0], np.cumsum(counts)))
+        covered = np.bincount(owners, weights=hi - lo, minlength=len(faces))
+        weighted = np.bincount(owners, weights=cumulative[hi] - cumulative[lo], minlength=len(faces))
+        return {path: (int(c), c / distinct, w / total) for path, c, w in zip(paths, covered.tolist(), weighted.tolist())}
+    cumulative = list(itertools.accumulate(counts, initial=0)); scores = {}
+    for path, ranges in zip(paths, faces):
+        covered = weighted = 0
+        for start, end in ranges:
+            lo = bisect.bisect_left(codepoints, start); hi = bisect.bisect_right(codepoints, end)
+            covered += hi - lo; weighted += cumulative[hi] - cumulative[lo]
+        scores[path] = (covered, covered / distinct, weighted / total)
+    return scores
+
+def analyze_corpus(histogram, entries, pending):
+    # 在工作线程里运行：先解析还没进索引的字体，返回 (得分, 新解析的索引条目)
+    fresh = [index_font_file(path) for path in pending]
+    return corpus_scores(entries + [(path, entry) for path, entry in fresh if "faces" in entry], histogram), fresh
+
+# -------------------------------------------------------------------
+# 字符名搜索
+# 预先把所有 Unicode 字符名拆成单词建倒排索引（单词 -> 码位列表），再对单词表建三字母
+# 索引，查询词可以匹配单词的任意一段；索引和 Python 的 Unicode 版本一起存到
+# fonts/unicode_names.idx，之后启动直接读入。查询结果和当前字体的覆盖位图求交集
+# -------------------------------------------------------------------
+UNICODE_NAME_INDEX_VERSION = 1
+GLYPH_SEARCH_RANK_LIMIT = 5000   # 结果不超过这么多时才按匹配程度和名字长短排序，否则按码位顺序
+
+def coverage_bitset(codepoints):
+    bits = bytearray(0x110000 >> 3)
+    for cp in codepoints: bits[cp >> 3] |= 1 << (cp & 7)
+    return bits
+
+def font_coverage(index, path, data=None):
+    # 在工作线程里运行：字体索引里有这个文件（大小和修改时间没变）就直接用存好的覆盖范围，否则读文件解析 cmap
+    entry = index.lookup(path) if index is not None else None
+    faces = entry.get("faces") if entry else None
+    ranges = faces[0]["coverage"] if faces else parse_font_data(data if data is not None else read_font_bytes(path))[0]["coverage"]
+    return coverage_bitset(expand_ranges(ranges))
+
+def name_words(name):
+    return name.replace("-", " ").split()
+
+def parse_codepoint_query(query):
+    # "U+1F63A"、"0x1f63a" 或直接粘贴的单个字符；不是这几种形式返回 None
+    text = query.strip()
+    if len(text) == 1 and not text.isascii(): return ord(text)
+    for prefix in ("U+", "u+", "0x", "0X"):
+        if text.startswith(prefix):
+            try: cp = int(text[len(prefix):], 16)
+            except ValueError: return None
+            return cp if 0 <= cp <= 0x10FFFF else None
+    return None
+
+class UnicodeNameIndex:
+    def __init__(self, words, offsets, postings, trigrams):
+        self.words = words          # 排好序的单词表
+        self.offsets = offsets      # 第 i 个单词的码位在 postings[offsets[i]:offsets[i + 1]]
+        self.postings = postings    # array('I')，每个单词的码位按升序连续存放
+        self.trigrams = trigrams    # 三个字母 -> 含有它的单词下标列表
+
+    @classmethod
+    def build(cls):
+        by_word = {}
+        for cp in range(0x110000):
+            name = unicodedata.name(chr(cp), None)
+            if name is None: continue
+            # "CJK UNIFIED IDEOGRAPH-4E00" 这类按码位生成的名字，码位部分不进索引（用 U+ 查）
+            suffix = f"{cp:04X}"
+            for word in set(name_words(name)):
+                if word != suffix: by_word.setdefault(word, []).append(cp)
+        words = sorted(by_word); offsets = [0]; postings = array.array("I"); trigrams = {}
+        for i, word in enumerate(words):
+            postings.extend(by_word[word]); offsets.append(len(postings))
+            for gram in {word[k:k + 3] for k in range(len(word) - 2)}: trigrams.setdefault(gram, []).append(i)
+        return cls(words, offsets, postings, trigrams)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+        if data.get("version") != UNICODE_NAME_INDEX_VERSION or data.get("unidata") != unicodedata.unidata_version: return None
+        postings = array.array("I"); postings.frombytes(base64.b64decode(data["postings"]))
+        if sys.byteorder == "big": postings.byteswap()
+        return cls(data["words"], data["offsets"], postings, data["trigrams"])
+
+    def save(self, path):
+        postings = array.array("I", self.postings)
+        if sys.byteorder == "big": postings.byteswap()
+        atomic_write_text(path, json.dumps({
+            "version": UNICODE_NAME_INDEX_VERSION, "unidata": unicodedata.unidata_version, "words": self.words,
+            "offsets": self.offsets, "trigrams": self.trigrams, "postings": base64.b64encode(postings.tobytes()).decode("ascii"),
+        }, separators=(",", ":")))
+
+    def matching_words(self, token):
+        # 短词按前缀在单词表里二分查找，三个字母以上的用三字母索引找出包含它的单词
+        if len(token) < 3:
+            lo = bisect.bisect_left(self.words, token); hi = bisect.bisect_left(self.words, token + "\uffff")
+            return range(lo, hi)
+        grams = sorted((self.trigrams.get(token[k:k + 3], ()) for k in range(len(token) - 2)), key=len)
+        candidates = set(grams[0]).intersection(*grams[1:])
+        return [i for i in candidates if token in self.words[i]]
+
+    def match_arrays(self, tokens, coverage):
+        # 有 NumPy 时每个查询词展开成整个码位空间的布尔数组，和覆盖位图一起按位与，耗时和结果多少无关
+        mask = np.unpackbits(np.frombuffer(coverage, np.uint8), bitorder="little").view(bool) if coverage is not None else np.ones(0x110000, bool)
+        postings = np.frombuffer(self.postings, np.uint32)
+        for token in tokens:
+            hits = np.zeros(0x110000, bool)
+            for i in self.matching_words(token): hits[postings[self.offsets[i]:self.offsets[i + 1]]] = True
+            mask &= hits
+        return np.flatnonzero(mask).tolist()
+
+    def match_sets(self, tokens, coverage):
+        sets = []
+        for token in tokens:
+            hits = set()
+            for i in self.matching_words(token): hits.update(self.postings[self.offsets[i]:self.offsets[i + 1]])
+            sets.append(hits)
+        sets.sort(key=len)
+        return sorted(cp for cp in sets[0].intersection(*sets[1:]) if coverage is None or coverage[cp >> 3] >> (cp & 7) & 1)
+
+    def search(self, query, coverage=None):
+        # 返回名字里包含所有查询词的码位；coverage 是 coverage_bitset 的位图，只保留字体支持的字符
+        cp = parse_codepoint_query(query)
+        if cp is not None: return [cp] if coverage is None or coverage[cp >> 3] >> (cp & 7) & 1 else []
+        tokens = name_words(query.upper())
+        if not tokens: return []
+        result = self.match_arrays(tokens, coverage) if np is not None else self.match_sets(tokens, coverage)
+        if len(result) > GLYPH_SEARCH_RANK_LIMIT: return result
+        # 每个查询词都是完整单词的排在前面，其次名字短的（"CAT FACE" 排在 "CAT FACE WITH WRY SMILE" 前面）
+        def rank(cp):
+            words = name_words(unicodedata.name(chr(cp), ""))
+            return (not all(token in words for token in tokens), len(words), cp)
+        return sorted(result, key=rank)
+
+def load_unicode_name_index(path):
+    # 在工作线程里运行：读不到或版本不对就重新建一份再存起来
+    try:
+        index = UnicodeNameIndex.load(path)
+        if index is not None: return index
+    except FileNotFoundError: pass
+    except (OSError, ValueError, KeyError, TypeError) as e: print(f"字符名索引损坏，重新生成: {e}")
+    index = UnicodeNameIndex.build()
+    try: index.save(path)
+    except OSError as e: print(f"保存字符名索引失败: {e}")
+    return index
+
+# -------------------------------------------------------------------
+# 字符表
+# 按码位顺序列出字体 cmap 里的全部字符。网格是虚拟的：只有视口里（和上下各一行）的
+# 格子才会在工作线程里用 QRawFont 光栅化，一行一个任务；画好的格子按 (字体, 格子大小)
+# 缓存，滚动时每帧只画可见的几十个格子，耗时和字体里有多少字符无关
+# -------------------------------------------------------------------
+GLYPH_CELL_SIZE = 56                        # 默认格子边长（逻辑像素）
+GLYPH_CELL_MIN = 32
+GLYPH_CELL_MAX = 160
+GLYPH_CELL_STEP = 8                         # Ctrl+滚轮每格改变的边长
+GLYPH_CELL_CACHE_BUDGET = 32 * 1024 * 1024  # 格子缓存上限（字节）
+
+def font_cmap(data):
+    # 第一个字体面的 (按码位排序的码位列表, 码位 -> 字形号)
+    tables = _table_directory(data, _face_offsets(data)[0])
+    if b"cmap" not in tables: return [], []
+    try: glyphs = _parse_cmap_glyphs(data, tables[b"cmap"][0])
+    except (struct.error, IndexError) as e: raise FontParseError(f"cmap 表损坏: {e}")
+    return sorted(glyphs), glyphs
+
+def glyph_map_data(data):
+    codepoints, glyphs = font_cmap(data)
+    return codepoints, glyphs, coverage_bitset(codepoints)
+
+def render_glyph_cells(font_bytes, glyphs, cell, dpr):
+    # 一行格子画在同一张图上再切开，返回每格一张 QImage；字形水平居中，基线让字身垂直居中。
+    # font_bytes 是各行共用的 QByteArray，每个任务只是在它上面打开一次字体，不复制数据；
+    # QRawFont 不跨任务缓存：线程池的线程空闲久了会退出，字体引擎随线程一起销毁
+    size = int(cell * dpr); raw = QRawFont(font_bytes, size * 0.6)
+    if not raw.isValid(): raise FontParseError("无法读取字体数据")
+    baseline = (size - raw.ascent() - raw.descent()) / 2 + raw.ascent()
+    advances = raw.advancesForGlyphIndexes(glyphs)
+    positions = [QPointF(i * size + (size - advance.x()) / 2, baseline) for i, advance in enumerate(advances)]
+    strip = draw_glyphs(raw, glyphs, positions, size * len(glyphs), size)
+    cells = []
+    for i in range(len(glyphs)):
+        image = strip.copy(i * size, 0, size, size); image.setDevicePixelRatio(dpr); cells.append(image)
+    return cells
+
+def codepoint_label(cp):
+    return f"U+{cp:04X}  {chr(cp) if unicodedata.category(chr(cp))[0] not in 'CZ' else ''}  {unicodedata.name(chr(cp), '')}"
+
+class GlyphMapView(QAbstractScrollArea):
+    characterClicked = pyqtSignal(int)
+    characterHovered = pyqtSignal(int)   # 离开格子时为 -1
+    firstRowChanged = pyqtSignal(int)    # 视口顶端那一格在码位列表里的下标
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.setObjectName("GlyphMapView")
+        self.scheduler = scheduler
+        self.font_key = None; self.font_bytes = None; self.codepoints = []; self.glyphs = {}
+        self.cell = GLYPH_CELL_SIZE; self.placeholder = "从左边选一个字体查看它的全部字符"
+        self.cells = OrderedDict(); self.cell_bytes = 0   # (字体 key, 格子大小, dpr, 码位) -> QImage
+        self.pending = {}                                 # (字体 key, 格子大小, dpr, 列数, 行) -> 取消令牌
+        self.hovered = -1
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff); self.setFrameShape(QFrame.NoFrame)
+        self.viewport().setMouseTracking(True)
+        self.verticalScrollBar().valueChanged.connect(lambda _: self.firstRowChanged.emit(self.first_visible_index()))
+
+    def set_font(self, font_key, data, codepoints, glyphs):
+        self.font_key = font_key; self.font_bytes = QByteArray(data); self.glyphs = glyphs; self.set_codepoints(codepoints)
+
+    def set_codepoints(self, codepoints):
+        # 换成另一组要显示的字符（比如搜索结果）；字形号在画到那一行时才查，格子缓存按码位，已经画过的不用重画
+        for token in self.pending.values(): token.cancel()
+        self.pending.clear()
+        self.codepoints = codepoints; self.hovered = -1
+        self.verticalScrollBar().setValue(0); self.update_scrollbar(); self.viewport().update()
+
+    def set_placeholder(self, text):
+        self.placeholder = text; self.font_key = None; self.font_bytes = None; self.codepoints = []; self.glyphs = {}
+        self.update_scrollbar(); self.viewport().update()
+
+    def clear_cells(self):
+        for token in self.pending.values(): token.cancel()
+        self.pending.clear(); self.cells.clear(); self.cell_bytes = 0
+
+    def columns(self):
+        return max(self.viewport().width() // self.cell, 1)
+
+    def row_count(self):
+        return math.ceil(len(self.codepoints) / self.columns())
+
+    def first_visible_index(self):
+        return min(self.verticalScrollBar().value() // self.cell * self.columns(), max(len(self.codepoints) - 1, 0))
+
+    def update_scrollbar(self):
+        bar = self.verticalScrollBar()
+        bar.setRange(0, max(self.row_count() * self.cell - self.viewport().height(), 0)); bar.setPageStep(self.viewport().height()); bar.setSingleStep(self.cell)
+
+    def scroll_to_index(self, index):
+        self.verticalScrollBar().setValue(index // self.columns() * self.cell)
+
+    def set_cell_size(self, cell):
+        # 换格子大小时保持视口顶端的字符不动
+        cell = max(GLYPH_CELL_MIN, min(GLYPH_CELL_MAX, cell))
+        if cell == self.cell: return
+        index = self.first_visible_index(); self.cell = cell
+        self.update_scrollbar(); self.scroll_to_index(index); self.viewport().update()
+
+    def visible_rows(self, margin_rows=1):
+        # 视口内的行在前，预读的上下几行在后
+        first = self.verticalScrollBar().value() // self.cell
+        last = min((self.verticalScrollBar().value() + self.viewport().height()) // self.cell, self.row_count() - 1)
+        return list(range(first, last + 1)) + [r for k in range(1, margin_rows + 1) for r in (last + k, first - k) if 0 <= r < self.row_count()]
+
+    def cell_key(self, cp):
+        return (self.font_key, self.cell, self.devicePixelRatioF(), cp)
+
+    def index_at(self, pos):
+        col = pos.x() // self.cell; row = (pos.y() + self.verticalScrollBar().value()) // self.cell
+        index = row * self.columns() + col
+        return index if col < self.columns() and 0 <= index < len(self.codepoints) else -1
+
+    def resizeEvent(self, event):
+        # 列数变了会改变每行的内容，保持视口顶端的字符不动
+        index = self.first_visible_index()
+        super().resizeEvent(event); self.update_scrollbar(); self.scroll_to_index(index)
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def wheelEvent(self, event):
+        if event.modifiers() & Qt.ControlModifier:
+            steps = round(event.angleDelta().y() / 120)
+            if steps: self.set_cell_size(self.cell + steps * GLYPH_CELL_STEP)
+            event.accept(); return
+        super().wheelEvent(event)
+
+    def mouseMoveEvent(self, event):
+        index = self.index_at(event.pos())
+        if index != self.hovered:
+            self.hovered = index; self.viewport().update()
+            self.characterHovered.emit(self.codepoints[index] if index >= 0 else -1)
+
+    def leaveEvent(self, event):
+        if self.hovered != -1: self.hovered = -1; self.viewport().update(); self.characterHovered.emit(-1)
+        super().leaveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        index = self.index_at(event.pos())
+        if event.button() == Qt.LeftButton and index >= 0: self.characterClicked.emit(self.codepoints[index])
+        super().mouseReleaseEvent(event)
+
+    def paintEvent(self, event):
+        p = QPainter(self.viewport())
+        if not self.codepoints:
+            p.setPen(QColor("#333")); p.drawText(self.viewport().rect(), Qt.AlignCenter, self.placeholder); p.end(); return
+        columns = self.columns(); top = -self.verticalScrollBar().value()
+        p.setPen(QColor("#E1E8ED"))
+        for row in self.visible_rows(margin_rows=0):
+            y = top + row * self.cell
+            for index in range(row * columns, min((row + 1) * columns, len(self.codepoints))):
+                x = (index - row * columns) * self.cell
+                if index == self.hovered: p.fillRect(x, y, self.cell, self.cell, QColor("#F0F4F8"))
+                p.drawRect(x, y, self.cell, self.cell)
+                key = self.cell_key(self.codepoints[index]); image = self.cells.get(key)
+                if image is not None: self.cells.move_to_end(key); p.drawImage(QPointF(x, y), image)
+        p.end()
+        self.request_rows([row for row in self.visible_rows() if self.row_missing(row, columns)])
+
+    def row_missing(self, row, columns):
+        return any(self.cell_key(cp) not in self.cells for cp in self.codepoints[row * columns:(row + 1) * columns])
+
+    def request_rows(self, rows):
+        # 已经滚出视口的行取消掉，只排队现在需要的
+        columns = self.columns(); dpr = self.devicePixelRatioF()
+        wanted = {(self.font_key, self.cell, dpr, columns, row): row for row in rows}
+        for key in [k for k in self.pending if k not in wanted]: self.pending.pop(key).cancel()
+        for key, row in wanted.items():
+            if key in self.pending: continue
+            codepoints = self.codepoints[row * columns:(row + 1) * columns]; glyphs = [self.glyphs[cp] for cp in codepoints]
+            self.pending[key] = self.scheduler.submit(
+                LANE_PREVIEW, render_glyph_cells, self.font_bytes, glyphs, self.cell, dpr,
+                callback=lambda images, k=key, cps=codepoints: self.on_cells_ready(k, cps, images),
+                error_callback=lambda e, k=key: (self.pending.pop(k, None), print(f"字符表绘制失败: {e}")))
+
+    def on_cells_ready(self, key, codepoints, images):
+        self.pending.pop(key, None)
+        font_key, cell, dpr = key[:3]
+        for cp, image in zip(codepoints, images):
+            cell_key = (font_key, cell, dpr, cp)
+            if cell_key in self.cells: continue
+            self.cells[cell_key] = image; self.cell_bytes += image.sizeInBytes()
+        while self.cell_bytes > GLYPH_CELL_CACHE_BUDGET and len(self.cells) > 1:
+            _, old = self.cells.popitem(last=False); self.cell_bytes -= old.sizeInBytes()
+        if font_key == self.font_key and cell == self.cell: self.viewport().update()
+
+class GlyphMapPanel(QFrame):
+    characterClicked = pyqtSignal(str)
+
+    def __init__(self, scheduler, name_index_path, parent=None):
+        super().__init__(parent)
+        self.setObjectName("GlyphMapPanel")
+        self.scheduler = scheduler; self.token = CancelToken()
+        self.font_key = None; self.data = None; self.loaded_key = None
+        self.codepoints = []; self.glyphs = {}; self.coverage = None   # 整个字符表、码位 -> 字形号和覆盖位图
+        self.block_starts = []   # 区块下拉框各项对应的码位列表下标
+        self.name_index_path = name_index_path; self.name_index = None; self.name_index_token = None
+        layout = QVBoxLayout(self); layout.setContentsMargins(8, 8, 8, 8); layout.setSpacing(6)
+        header = QHBoxLayout(); header.setContentsMargins(0, 0, 0, 0)
+        self.block_combo = QComboBox(); self.block_combo.activated.connect(lambda i: self.view.scroll_to_index(self.block_starts[i]))
+        self.search_edit = QLineEdit(); self.search_edit.setObjectName("GlyphSearch"); self.search_edit.setPlaceholderText("搜索字符名或 U+XXXX，如 cat face"); self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(lambda _: self.apply_search())
+        self.count_label = QLabel(); self.count_label.setObjectName("GlyphMapStatus")
+        header.addWidget(self.block_combo, 1); header.addWidget(self.search_edit, 1); header.addWidget(self.count_label)
+        self.view = GlyphMapView(scheduler, self)
+        self.view.characterClicked.connect(lambda cp: self.characterClicked.emit(chr(cp)))
+        self.view.characterHovered.connect(lambda cp: self.status_label.setText(codepoint_label(cp) if cp >= 0 else ""))
+        self.view.firstRowChanged.connect(self.sync_block)
+        self.status_label = QLabel(); self.status_label.setObjectName("GlyphMapStatus")
+        layout.addLayout(header); layout.addWidget(self.view, 1); layout.addWidget(self.status_label)
+
+    def set_font(self, font_key, data):
+        # 只记下字体；面板显示时才解析 cmap
+        self.font_key = font_key; self.data = data
+        if self.isVisible(): self.load()
+
+    def showEvent(self, event):
+        super().showEvent(event); self.load()
+
+    def load(self):
+        if self.font_key is None or self.font_key == self.loaded_key: return
+        self.loaded_key = self.font_key; self.token.cancel()
+        self.codepoints = []; self.glyphs = {}; self.coverage = None
+        self.view.set_placeholder("正在读取字符表..."); self.block_combo.clear(); self.count_label.setText("")
+        self.token = self.scheduler.submit(
+            LANE_PREVIEW, glyph_map_data, self.data,
+            callback=lambda result, k=self.font_key, d=self.data: self.on_cmap_ready(k, d, *result),
+            error_callback=lambda e: self.view.set_placeholder(f"无法读取字符表: {e}"))
+
+    def on_cmap_ready(self, font_key, data, codepoints, glyphs, coverage):
+        if font_key != self.font_key: return
+        if not codepoints: self.view.set_placeholder("这个字体没有 Unicode 字符表"); return
+        self.codepoints = codepoints; self.glyphs = glyphs; self.coverage = coverage
+        self.view.set_font(font_key, data, codepoints, glyphs)
+        self.block_starts = []; self.block_combo.blockSignals(True); self.block_combo.clear()
+        for start, end, name in UNICODE_BLOCKS:
+            lo = bisect.bisect_left(codepoints, start); hi = bisect.bisect_right(codepoints, end)
+            if hi > lo: self.block_combo.addItem(f"{name}（{hi - lo}）"); self.block_starts.append(lo)
+        self.block_combo.blockSignals(False)
+        self.apply_search()
+
+    def apply_search(self):
+        # 索引已经在内存里时直接在界面线程查询（几毫秒）；第一次搜索时才在后台读入或生成索引
+        query = self.search_edit.text().strip()
+        if not self.codepoints: return
+        if not query:
+            self.block_combo.setEnabled(True); self.count_label.setText(f"{len(self.codepoints)} 个字符")
+            if self.view.codepoints is not self.codepoints: self.view.set_codepoints(self.codepoints)
+            self.sync_block(self.view.first_visible_index()); return
+        if self.name_index is None:
+            self.count_label.setText("正在载入字符名索引...")
+            if self.name_index_token is None:
+                self.name_index_token = self.scheduler.submit(
+                    LANE_PREVIEW, load_unicode_name_index, self.name_index_path,
+                    callback=self.on_name_index_ready, error_callback=lambda e: self.count_label.setText(f"字符名索引不可用: {e}"))
+            return
+        matches = self.name_index.search(query, self.coverage)
+        self.block_combo.setEnabled(False); self.count_label.setText(f"找到 {len(matches)} 个字符")
+        self.view.set_codepoints(matches)
+        if not matches: self.view.placeholder = "当前字体里没有匹配的字符"
+
+    def on_name_index_ready(self, index):
+        self.name_index = index; self.apply_search()
+
+    def sync_block(self, index):
+        # 滚动时让下拉框跟着显示视口顶端所在的区块（搜索结果不按区块排列，不跟）
+        if not self.block_starts or self.view.codepoints is not self.codepoints: return
+        self.block_combo.blockSignals(True); self.block_combo.setCurrentIndex(max(bisect.bisect_right(self.block_starts, index) - 1, 0)); self.block_combo.blockSignals(False)
+
+    def clear_cells(self):
+        self.view.clear_cells()
+
+# -------------------------------------------------------------------
+# 对比模式
+# 列表里多选的字体各占一格，显示同一段文字。每格是独立的预览画布，排版和瓦片
+# 都在工作线程里并行完成；输入（字体、文字、字号、宽度）没变的格子不会重画
+# -------------------------------------------------------------------
+COMPARE_MAX_FONTS = 9
+
+class ComparePane(QFrame):
+    closeRequested = pyqtSignal(str)
+
+    def __init__(self, scheduler, path, parent=None):
+        super().__init__(parent)
+        self.setObjectName("ComparePane")
+        self.scheduler = scheduler; self.path = path; self.family = None
+        self.wanted = None; self.token = CancelToken()   # 最近一次请求的场景 key 和它的取消令牌
+        layout = QVBoxLayout(self); layout.setContentsMargins(0, 0, 0, 0); layout.setSpacing(4)
+        header = QHBoxLayout(); header.setContentsMargins(8, 0, 0, 0)
+        self.caption = QLabel(Path(path).name); self.caption.setObjectName("CompareCaption"); self.caption.setToolTip(path); self.caption.setMinimumWidth(40)
+        close_button = QPushButton("×"); close_button.setObjectName("CompareClose"); close_button.clicked.connect(lambda: self.closeRequested.emit(self.path))
+        header.addWidget(self.caption, 1); header.addWidget(close_button)
+        self.canvas = PreviewCanvas(scheduler, "正在加载...", lane=LANE_COMPARE)
+        layout.addLayout(header); layout.addWidget(self.canvas, 1)
+
+    def set_face(self, face, label):
+        # face 是 (家族, 粗细, 斜体)，直接交给 make_preview_font
+        self.family = face
+        self.caption.setText(f"{Path(self.path).name} · {label}")
+
+    def set_error(self, message):
+        self.canvas.placeholder = message; self.canvas.viewport().update()
+
+    def update_scene(self, text, point_size):
+        if not self.family: return
+        key = (self.family, text, point_size, self.canvas.viewport().width())
+        if key == self.wanted:
+            # 输入没变：不重新排版也不重画，只撤掉拖动滑块时的临时画面
+            if self.canvas.scene is not None and self.canvas.scene.key[:4] == key: self.canvas.set_scene(self.canvas.scene)
+            return
+        # 场景（段落排版）也放到工作线程里建，几个格子同时排版；对比只用原生排版，工作线程之间不共享缓存
+        self.wanted = key; self.token.cancel()
+        self.token = self.scheduler.submit(
+            LANE_COMPARE, PreviewScene, *key,
+            callback=self.on_scene_ready, error_callback=lambda e: print(f"对比预览排版失败: {e}"))
+
+    def on_scene_ready(self, scene):
+        if scene.key[:4] != self.wanted: return
+        # 排版期间格子大小可能变了（比如又加了一个字体），按现在的宽度再排一次
+        self.canvas.set_scene(scene); self.canvas.on_resize_settled()
+
+    def show_interim(self, point_size):
+        self.canvas.show_interim(point_size)
+
+    def release(self):
+        self.token.cancel(); self.canvas.clear_tiles()
+
+class ComparePanel(QWidget):
+    closeRequested = pyqtSignal(str)
+    zoomRequested = pyqtSignal(int)
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.panes = OrderedDict()   # 路径 -> ComparePane，按列表顺序
+        self.text = ""; self.point_size = INITIAL_FONT_SIZE
+        self.grid = QGridLayout(self); self.grid.setContentsMargins(0, 0, 0, 0); self.grid.setSpacing(10)
+        self.placeholder = QLabel("按住 Ctrl 或 Shift 在左边多选几个字体进行对比"); self.placeholder.setAlignment(Qt.AlignCenter)
+        self.grid.addWidget(self.placeholder, 0, 0)
+
+    def set_fonts(self, paths):
+        # 保留仍被选中的格子（不重画），去掉取消选择的，补上新选的；返回新加的路径
+        for path in [p for p in self.panes if p not in paths]:
+            pane = self.panes.pop(path); pane.release(); self.grid.removeWidget(pane); pane.deleteLater()
+        added = [p for p in paths if p not in self.panes]
+        for path in added:
+            pane = self.panes[path] = ComparePane(self.scheduler, path, self)
+            pane.closeRequested.connect(self.closeRequested); pane.canvas.zoomRequested.connect(self.zoomRequested)
+            pane.canvas.layoutWidthChanged.connect(lambda _, pn=pane: pn.update_scene(self.text, self.point_size))
+        self.panes = OrderedDict((p, self.panes[p]) for p in paths)
+        self.relayout()
+        return added
+
+    def relayout(self):
+        for pane in self.panes.values(): self.grid.removeWidget(pane)
+        self.placeholder.setVisible(not self.panes)
+        columns = max(math.ceil(math.sqrt(len(self.panes))), 1)
+        for i, pane in enumerate(self.panes.values()): self.grid.addWidget(pane, i // columns, i % columns)
+        for col in range(self.grid.columnCount()): self.grid.setColumnStretch(col, 1 if col < columns else 0)
+        for row in range(self.grid.rowCount()): self.grid.setRowStretch(row, 1 if row < math.ceil(len(self.panes) / columns) else 0)
+
+    def set_face(self, path, face, label):
+        pane = self.panes.get(path)
+        if pane is not None: pane.set_face(face, label); pane.update_scene(self.text, self.point_size)
+
+    def set_error(self, path, message):
+        pane = self.panes.get(path)
+        if pane is not None: pane.set_error(message)
+
+    def update_panes(self, text, point_size):
+        self.text = text; self.point_size = point_size
+        for pane in self.panes.values(): pane.update_scene(text, point_size)
+
+    def show_interim(self, point_size):
+        for pane in self.panes.values(): pane.show_interim(point_size)
+
+# -------------------------------------------------------------------
+# 字体差异
+# 把同一段文字分别用两个字体文件栅格化（直接用 QRawFont 读文件数据，同名的新旧版本
+# 也不会混淆），用 NumPy 对两张图的覆盖率逐像素比较；另外把两边 cmap 共有的字符
+# 分块画成字形网格，在工作线程里并行逐格比较，得到每个字符是否改变的报告
+# -------------------------------------------------------------------
+DIFF_MARGIN = 16
+DIFF_THRESHOLD = 64          # 覆盖率（0-255）相差超过这个值才算不同，抵消抗锯齿的细微差别
+DIFF_BLOCK = 16              # 差异区域按这么大的方块高亮
+GLYPH_DIFF_CHUNK = 512       # 每个工作线程任务比较的字符数
+DIFF_LIST_LIMIT = 2000       # 窗口里最多列出的改变字符数（导出的报告是完整的）
+
+def image_alpha(image):
+    # QImage（ARGB32_Premultiplied）的 alpha 通道，复制成独立的 uint8 数组
+    bits = image.constBits(); bits.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(bits, np.uint8).reshape(image.height(), image.bytesPerLine())[:, :image.width() * 4]
+    return pixels.reshape(image.height(), image.width(), 4)[..., 3 if sys.byteorder == "little" else 0].copy()
+
+def array_image(rgb):
+    # (高, 宽, 3) 的 uint8 数组转成 QImage（自带一份数据拷贝）
+    height, width, _ = rgb.shape
+    pixels = np.empty((height, width, 4), np.uint8); pixels[..., 3] = 255
+    pixels[..., :3] = rgb[..., ::-1] if sys.byteorder == "little" else rgb
+    return QImage(pixels.data, width, height, width * 4, QImage.Format_RGB32).copy()
+
+def draw_glyphs(raw, glyphs, positions, width, height, background=Qt.transparent):
+    image = QImage(max(int(width), 1), max(int(height), 1), QImage.Format_ARGB32_Premultiplied); image.fill(background)
+    run = QGlyphRun(); run.setRawFont(raw); run.setGlyphIndexes(glyphs); run.setPositions(positions)
+    p = QPainter(image); p.setRenderHint(QPainter.Antialiasing); p.drawGlyphRun(QPointF(0, 0), run); p.end()
+    return image
+
+def raw_text_layout(raw, text, width, margin):
+    # 不经过字体数据库和整形，按字形宽度（含字偶距）逐字折行；返回 (字形, 位置, 总高度)
+    line_height = raw.ascent() + raw.descent() + max(raw.leading(), 0)
+    glyphs = []; positions = []; y = margin + raw.ascent()
+    for paragraph in text.split("\n"):
+        ids = raw.glyphIndexesForString(paragraph); x = margin
+        for gid, advance in zip(ids, raw.advancesForGlyphIndexes(ids, QRawFont.KernedAdvances)):
+            if x > margin and x + advance.x() > width - margin: x = margin; y += line_height
+            glyphs.append(gid); positions.append(QPointF(x, y)); x += advance.x()
+        y += line_height
+    return glyphs, positions, y - line_height + raw.descent() + margin
+
+def raw_text_alpha(data, text, pixel_size, width):
+    # 返回覆盖率数组
+    raw = QRawFont(QByteArray(data), pixel_size)
+    if not raw.isValid(): raise FontParseError("无法读取字体数据")
+    glyphs, positions, height = raw_text_layout(raw, text if text else DEFAULT_SAMPLE_TEXT, width, DIFF_MARGIN)
+    return image_alpha(draw_glyphs(raw, glyphs, positions, width, height))
+
+def render_diff_pair(data_a, data_b, text, pixel_size, width):
+    a = raw_text_alpha(data_a, text, pixel_size, width); b = raw_text_alpha(data_b, text, pixel_size, width)
+    # 两边行数可能不同，补齐到同样高度
+    height = max(a.shape[0], b.shape[0])
+    return tuple(np.pad(x, ((0, height - x.shape[0]), (0, 0))) for x in (a, b))
+
+def changed_blocks(a, b):
+    # 每个 DIFF_BLOCK 方块里有没有超过阈值的像素差异，返回方块级的布尔数组
+    mask = np.abs(a.astype(np.int16) - b) > DIFF_THRESHOLD
+    height, width = mask.shape
+    mask = np.pad(mask, ((0, -height % DIFF_BLOCK), (0, -width % DIFF_BLOCK)))
+    return mask.reshape(mask.shape[0] // DIFF_BLOCK, DIFF_BLOCK, mask.shape[1] // DIFF_BLOCK, DIFF_BLOCK).any(axis=(1, 3))
+
+def compose_diff(a, b, blocks):
+    # 两边都有的笔画画成灰色，只有 A 有的红色，只有 B 有的蓝色；有差异的方块垫上浅黄色
+    common = np.minimum(a, b).astype(np.float32); only_a = a - common; only_b = b - common
+    rgb = np.empty(a.shape + (3,), np.float32)
+    rgb[..., 0] = 255 - 0.7 * common - only_b
+    rgb[..., 1] = 255 - 0.7 * common - only_a - only_b
+    rgb[..., 2] = 255 - 0.7 * common - only_a
+    tint = np.repeat(np.repeat(blocks, DIFF_BLOCK, axis=0), DIFF_BLOCK, axis=1)[:a.shape[0], :a.shape[1]]
+    rgb[tint, 2] -= 70
+    return array_image(np.clip(rgb, 0, 255).astype(np.uint8))
+
+def compose_onion(a, b, weight):
+    # 洋葱皮：A（红）和 B（蓝）按 weight 混合，weight=0 只看 A，1 只看 B
+    a = a.astype(np.float32) * (1 - weight); b = b.astype(np.float32) * weight
+    rgb = np.stack((255 - b, 255 - a - b, 255 - a), axis=-1)
+    return array_image(np.clip(rgb, 0, 255).astype(np.uint8))
+
+def diff_glyph_chunk(pair, codepoints):
+    # 在工作线程里运行：比较轮廓数据本身（glyf 原始数据，或 Qt 取出的轮廓路径的哈希）和字体单位的宽度，
+    # 多小的改动都能发现，不受光栅化字号和像素阈值影响；返回 [(码位, [原因...])]，只列出改变了的字符
+    a, b = pair
+    if a.kind == "path":
+        # QRawFont 不能跨线程共用：每个任务用自己的副本，轮廓哈希缓存也各自一份
+        a, b = (copy.copy(outlines) for outlines in pair)
+        for outlines in (a, b): outlines.raw = None; outlines.hashes = {}
+    return [(cp, [reason for reason in ("outline", "advance") if reason in record]) for cp, record in diff_outline_chunk(codepoints, (a, b))]
+
+def read_font_pair(path_a, path_b):
+    return read_font_bytes(path_a), read_font_bytes(path_b)
+
+def expand_ranges(ranges):
+    return [cp for start, end in ranges for cp in range(start, end + 1)]
+
+def glyph_diff_plan(data_a, data_b):
+    # 后台读两边的字符表和轮廓：返回 (B 删除的, B 新增的, 两边都有的码位, 轮廓对)
+    a, b = outline_pair(data_a, data_b)
+    return sorted(a.glyphs.keys() - b.glyphs.keys()), sorted(b.glyphs.keys() - a.glyphs.keys()), sorted(a.glyphs.keys() & b.glyphs.keys()), (a, b)
+
+class FontDiffWindow(QWidget):
+    # 两个字体文件的差异比较窗口：上面是整段文字的差异图/洋葱皮，下面是逐字符的比较结果
+    def __init__(self, scheduler, path_a, data_a, path_b, data_b, text, pixel_size, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.scheduler = scheduler; self.paths = (path_a, path_b); self.datas = (data_a, data_b)
+        self.text = text; self.pixel_size = pixel_size
+        self.alphas = None; self.blocks = None; self.tokens = []; self.common = []; self.pending_chunks = 0
+        self.report = {"a": path_a, "b": path_b, "compared_by": None, "added": [], "removed": [], "changed": [], "unchanged": 0}
+        self.setWindowTitle(f"字体差异 - {Path(path_a).name} / {Path(path_b).name}"); self.resize(900, 700)
+        layout = QVBoxLayout(self)
+        legend = QLabel(f"<span style='color:#D0021B'>■</span> A：{path_a}<br><span style='color:#1F5FD8'>■</span> B：{path_b}"); legend.setWordWrap(True)
+        controls = QHBoxLayout()
+        self.diff_button = QPushButton("差异"); self.onion_button = QPushButton("洋葱皮")
+        for button in (self.diff_button, self.onion_button): button.setCheckable(True); button.setAutoExclusive(True); button.toggled.connect(lambda _: self.refresh_image()); controls.addWidget(button)
+        self.onion_slider = QSlider(Qt.Horizontal); self.onion_slider.setRange(0, 100); self.onion_slider.setValue(50); self.onion_slider.valueChanged.connect(lambda _: self.refresh_image())
+        self.region_label = QLabel("正在比较...")
+        controls.addWidget(self.onion_slider, 1); controls.addWidget(self.region_label)
+        self.image_label = QLabel(); self.image_label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        scroll = QScrollArea(); scroll.setWidget(self.image_label); scroll.setWidgetResizable(True)
+        self.summary_label = QLabel("正在比较字形..."); self.changed_list = QListWidget()
+        export_button = QPushButton("导出报告..."); export_button.clicked.connect(self.export_report)
+        bottom = QHBoxLayout(); bottom.addWidget(self.summary_label, 1); bottom.addWidget(export_button)
+        layout.addWidget(legend); layout.addLayout(controls); layout.addWidget(scroll, 3); layout.addLayout(bottom); layout.addWidget(self.changed_list, 1)
+        self.diff_button.setChecked(True)
+
+    def start(self):
+        self.tokens.append(self.scheduler.submit(
+            LANE_COMPARE, render_diff_pair, *self.datas, self.text, self.pixel_size, max(self.width() - 60, 200),
+            callback=self.on_text_diff, error_callback=lambda e: self.region_label.setText(f"渲染失败：{e}")))
+        # 字符表解析和区间展开放到后台，读完再分块提交逐字符比较；读的这一步也算一块，免得摘要提前显示"完成"
+        self.pending_chunks = 1
+        self.tokens.append(self.scheduler.submit(
+            LANE_COMPARE, glyph_diff_plan, *self.datas, callback=self.on_glyph_plan, error_callback=self.on_glyph_plan_failed))
+        self.summary_label.setText("正在读取字符表...")
+
+    def on_glyph_plan(self, plan):
+        self.report["removed"], self.report["added"], common, outlines = plan; self.common = common
+        self.report["compared_by"] = "glyf" if outlines[0].kind == "glyf" else "path"
+        self.pending_chunks = 0
+        for i in range(0, len(common), GLYPH_DIFF_CHUNK):
+            self.pending_chunks += 1
+            self.tokens.append(self.scheduler.submit(
+                LANE_COMPARE, diff_glyph_chunk, outlines, common[i:i + GLYPH_DIFF_CHUNK],
+                callback=self.on_glyph_chunk, error_callback=self.on_glyph_chunk_failed))
+        self.update_summary()
+
+    def on_text_diff(self, alphas):
+        self.alphas = alphas; self.blocks = changed_blocks(*alphas)
+        count = int(self.blocks.sum())
+        self.region_label.setText(f"{count} 处像素差异" if count else "文字渲染完全相同")
+        self.refresh_image()
+
+    def refresh_image(self):
+        self.onion_slider.setEnabled(self.onion_button.isChecked())
+        if self.alphas is None: return
+        image = compose_onion(*self.alphas, self.onion_slider.value() / 100) if self.onion_button.isChecked() else compose_diff(*self.alphas, self.blocks)
+        self.image_label.setPixmap(QPixmap.fromImage(image))
+
+    def on_glyph_chunk(self, changed):
+        self.pending_chunks -= 1
+        for cp, reasons in changed:
+            self.report["changed"].append({"codepoint": cp, "reasons": reasons})
+            if self.changed_list.count() < DIFF_LIST_LIMIT:
+                self.changed_list.addItem(f"U+{cp:04X}  {chr(cp)}  {unicodedata.name(chr(cp), '')}  ({'、'.join({'outline': '轮廓', 'advance': '宽度'}[r] for r in reasons)})")
+        self.update_summary()
+
+    def on_glyph_plan_failed(self, e):
+        self.pending_chunks = 0; self.summary_label.setText(f"无法解析字符表：{e}")
+
+    def on_glyph_chunk_failed(self, e):
+        self.pending_chunks -= 1; print(f"字形比较失败: {e}"); self.update_summary()
+
+    def update_summary(self):
+        changed = len(self.report["changed"]); added = len(self.report["added"]); removed = len(self.report["removed"])
+        if self.pending_chunks:
+            self.summary_label.setText(f"正在比较字形：还剩 {self.pending_chunks} 块，已发现 {changed} 个改变"); return
+        self.report["changed"].sort(key=lambda c: c["codepoint"])
+        self.report["unchanged"] = len(self.common) - changed
+        self.summary_label.setText(f"共有字符 {len(self.common)} 个：改变 {changed}，未变 {self.report['unchanged']}；B 新增 {added}，B 删除 {removed}")
+
+    def export_report(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出差异报告", "font-diff.json", "JSON (*.json)")
+        if not path: return
+        report = dict(self.report, complete=not self.pending_chunks)
+        for key in ("added", "removed"): report[key] = [f"U+{cp:04X}" for cp in report[key]]
+        report["changed"] = [{"codepoint": f"U+{c['codepoint']:04X}", "reasons": c["reasons"]} for c in report["changed"]]
+        if not self.pending_chunks:
+            changed = {c["codepoint"] for c in self.report["changed"]}
+            report["unchanged_ranges"] = [[f"U+{a:04X}", f"U+{b:04X}"] for a, b in merge_ranges((cp, cp) for cp in self.common if cp not in changed)]
+        try: atomic_write_text(path, json.dumps(report, ensure_ascii=False, indent=2))
+        except OSError as e: QMessageBox.warning(self, "导出失败", str(e))
+
+    def closeEvent(self, event):
+        for token in self.tokens: token.cancel()
+        super().closeEvent(event)
+
 # -------------------------------------------------------------------
 # 主窗口
 # -------------------------------------------------------------------
 INITIAL_FONT_SIZE = 32
 MIN_FONT_SIZE = 8
 MAX_FONT_SIZE = 300
+FONT_CACHE_BUDGET = 64 * 1024 * 1024   # 预取字体数据缓存上限（字节）
+PREVIEW_SCENE_CACHE = 8                 # 最近用过的预览场景个数（来回调整到同样宽度时不用重新排版）
+COVERAGE_CACHE_FONTS = 8                # 缺字检查缓存最近几个字体的覆盖位图
+PREFETCH_RADIUS = 2                     # 预取当前字体上下各几个
+PROGRESSIVE_IDLE_MS = 150               # 拖动字号滑块时停顿这么久就按完整质量重画一次
 class FontViewerApp(QMainWindow):
     def __init__(self):
         super().__init__()
-        setup_external_fonts()
+        self.scheduler = TaskScheduler(self)
+        self.font_data_cache = OrderedDict(); self.font_data_cache_bytes = 0
+        self.preview_token = CancelToken(); self.prefetching = set()
+        self.startup_timings = {}; self.first_paint_done = False
+        self.font_items = {}   # 路径 -> 列表项，查重和查找不用再遍历整个列表
+        self.font_index = None; self.index_queue = []
+        self.library_generation = 0   # 列表或索引每变化一次加一，查询接口的缓存以此失效
+        self.index_timer = QTimer(self); self.index_timer.setSingleShot(True); self.index_timer.setInterval(200); self.index_timer.timeout.connect(self.flush_index_queue)
+        self.index_save_timer = QTimer(self); self.index_save_timer.setSingleShot(True); self.index_save_timer.setInterval(3000); self.index_save_timer.timeout.connect(self.save_font_index)
         self.config_path = self.get_config_path()
-        self.saved_font_paths = self.load_saved_paths()
+        self.snapshot_path = self.get_app_path() / "fonts" / "library_snapshot.json"
+        self.saved_font_paths = SavedPathsStore(self.config_path, self); self.saved_font_paths.load()
         self.setup_stylesheet()
         self.current_font_id = -1
-        self.current_font_family = ""
+        self.current_font_family = ""; self.current_font_path = ""
         self.preview_font_size = INITIAL_FONT_SIZE
+        self.text_paths = TextPathCache()
+        self.preview_scenes = OrderedDict()
+        self.coverage_cache = OrderedDict(); self.coverage_token = CancelToken()   # 路径 -> 覆盖位图
+        self.corpus_histogram = None; self.corpus_token = CancelToken()   # 最近一次统计的语料 (码位, 次数)
+        self.facets = FacetStore(); self.facets_filtered = False   # 分面筛选的列式存储；上次应用时是否有选项被选中
+        self.facet_timer = QTimer(self); self.facet_timer.setSingleShot(True); self.facet_timer.setInterval(50); self.facet_timer.timeout.connect(self.apply_facets)
+        self.compare_fonts = {}   # 对比中的字体路径 -> (字体 id, (家族, 粗细, 斜体))，对比期间一直保持注册
+        self.compare_tokens = {}  # 还在读取的对比字体路径 -> 取消令牌
+        self.full_render_timer = QTimer(self); self.full_render_timer.setSingleShot(True); self.full_render_timer.setInterval(PROGRESSIVE_IDLE_MS); self.full_render_timer.timeout.connect(self.update_preview)
         self.init_ui()
         self.load_initial_fonts()
 
     def get_app_path(self):
-        if getattr(sys, 'frozen', False): return Path(os.path.dirname(sys.executable))
-        return Path(os.path.dirname(os.path.abspath(__file__)))
+        return app_path()
 
     def get_config_path(self):
         return self.get_app_path() / "fonts" / "saved_paths.json"
 
-    def load_saved_paths(self):
-        if self.config_path.exists():
-            try:
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    paths = json.load(f)
-                    return [p for p in paths if Path(p).exists()]
-            except (json.JSONDecodeError, IOError): return []
-        return []
-
-    def save_paths(self):
+    def load_snapshot(self):
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.saved_font_paths, f, indent=4)
-        except IOError as e: print(f"保存路径失败: {e}")
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError): return {}
+
+    def save_snapshot(self):
+        # 保存上次的字体列表和预览状态，下次启动时先直接显示它
+        selected = self.font_list_widget.currentItem()
+        snapshot = {
+            "fonts": [self.font_list_widget.item(i).data(Qt.UserRole) for i in range(self.font_list_widget.count())],
+            "selected": selected.data(Qt.UserRole) if selected else None,
+            "text": self.sample_text(),
+            "multiline": self.multiline_button.isChecked(),
+            "glyph_map": self.glyph_map_button.isChecked(),
+            "font_size": self.preview_font_size,
+        }
+        try: atomic_write_text(self.snapshot_path, json.dumps(snapshot, ensure_ascii=False))
+        except OSError as e: print(f"保存启动快照失败: {e}")
 
     def setup_stylesheet(self):
         handle_path = resource_path("assets/radio-checked-hover@2x.png")
@@ -307,26 +2880,47 @@ class FontViewerApp(QMainWindow):
         sidebar_title = QLabel("字体选择"); sidebar_title.setObjectName("TitleLabel")
         
         # 使用FontListWidget
-        self.font_list_widget = FontListWidget(self)
+        self.font_list_widget = FontListWidget(self.scheduler, self)
         self.font_list_widget.setItemDelegate(CustomItemDelegate(self.font_list_widget))
+        # 行高固定，统一尺寸让筛选时隐藏几万行也不用逐行重新测量；文件名太长时由委托省略，不再横向滚动
+        self.font_list_widget.setUniformItemSizes(True); self.font_list_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.font_list_widget.itemClicked.connect(self.on_font_selected)
         self.font_list_widget.setContextMenuPolicy(Qt.CustomContextMenu)
         self.font_list_widget.customContextMenuRequested.connect(self.show_font_context_menu)
         # 连接自定义的 fontDropped 信号到 add_font_to_list 槽函数
         self.font_list_widget.fontDropped.connect(self.add_font_to_list)
 
+        # 统计过语料之后才显示排序方式
+        self.sort_combo = QComboBox(); self.sort_combo.addItems(["按文件名排序", "按语料覆盖率排序", "按字频加权覆盖率排序"]); self.sort_combo.hide(); self.sort_combo.currentIndexChanged.connect(self.sort_font_list)
         add_font_button = QPushButton("添加字体..."); add_font_button.clicked.connect(self.add_font_file)
-        sidebar_layout.addWidget(sidebar_title); sidebar_layout.addWidget(self.font_list_widget); sidebar_layout.addWidget(add_font_button)
+        self.corpus_button = QPushButton("语料覆盖率..."); self.corpus_button.setToolTip("选择一个 UTF-8 文本文件，按字体库里每个字体能显示其中多少字符排序"); self.corpus_button.clicked.connect(self.analyze_corpus_file)
+        button_layout = QHBoxLayout(); button_layout.setContentsMargins(0, 0, 0, 0); button_layout.addWidget(add_font_button); button_layout.addWidget(self.corpus_button)
+        # 字体索引读入之后才能按元数据筛选
+        self.filter_button = QPushButton("筛选"); self.filter_button.setObjectName("FacetOption"); self.filter_button.setCheckable(True); self.filter_button.setEnabled(False); self.filter_button.toggled.connect(self.set_filter_mode)
+        self.facet_panel = FacetPanel(); self.facet_panel.hide(); self.facet_panel.selectionChanged.connect(self.apply_facets)
+        title_layout = QHBoxLayout(); title_layout.setContentsMargins(0, 0, 0, 0); title_layout.addWidget(sidebar_title, 1); title_layout.addWidget(self.filter_button, 0, Qt.AlignVCenter)
+        sidebar_layout.addLayout(title_layout); sidebar_layout.addWidget(self.facet_panel); sidebar_layout.addWidget(self.sort_combo); sidebar_layout.addWidget(self.font_list_widget); sidebar_layout.addLayout(button_layout)
         
         # 中央和右侧UI代码
         center_frame = QFrame(); center_layout = QVBoxLayout(center_frame); center_layout.setContentsMargins(10, 10, 10, 10); center_layout.setSpacing(20)
-        self.text_entry = QLineEdit(); self.text_entry.setPlaceholderText("在这里打字，看看字体的样子... 😄"); self.text_entry.textChanged.connect(self.update_preview)
-        self.preview_label = QLabel("\n从左边选一个字体开始查看吧！"); self.preview_label.setAlignment(Qt.AlignCenter); self.preview_label.setStyleSheet("background-color: #FFFFFF; border-radius: 12px;"); self.preview_label.setMinimumHeight(300)
+        self.text_entry = QLineEdit(); self.text_entry.setPlaceholderText("在这里打字，看看字体的样子... 😄"); self.text_entry.textChanged.connect(lambda _: self.update_preview())
+        # 多行模式：长文本按段落排版和缓存，每次按键只重新排版改动的段落
+        self.sample_editor = QPlainTextEdit(); self.sample_editor.setPlaceholderText("每行一个段落，可以粘贴整章文字..."); self.sample_editor.setMaximumHeight(160); self.sample_editor.hide(); self.sample_editor.textChanged.connect(lambda: self.update_preview())
+        self.multiline_button = QPushButton("多行"); self.multiline_button.setCheckable(True); self.multiline_button.toggled.connect(self.set_multiline)
+        self.compare_button = QPushButton("对比"); self.compare_button.setCheckable(True); self.compare_button.toggled.connect(self.set_compare_mode)
+        self.glyph_map_button = QPushButton("字符表"); self.glyph_map_button.setCheckable(True); self.glyph_map_button.toggled.connect(lambda on: self.glyph_map_panel.setVisible(on))
+        self.inspect_button = QPushButton("缺字"); self.inspect_button.setCheckable(True); self.inspect_button.setToolTip("标出当前字体没有、由其它字体代替显示的字符；鼠标悬停查看码位、字形号和实际使用的字体"); self.inspect_button.toggled.connect(self.set_inspect_mode)
+        entry_layout = QHBoxLayout(); entry_layout.setContentsMargins(0, 0, 0, 0); entry_layout.addWidget(self.text_entry, 1); entry_layout.addWidget(self.sample_editor, 1)
+        entry_layout.addWidget(self.multiline_button, 0, Qt.AlignTop); entry_layout.addWidget(self.compare_button, 0, Qt.AlignTop); entry_layout.addWidget(self.glyph_map_button, 0, Qt.AlignTop); entry_layout.addWidget(self.inspect_button, 0, Qt.AlignTop)
+        self.preview_canvas = PreviewCanvas(self.scheduler, "从左边选一个字体开始查看吧！"); self.preview_canvas.setMinimumHeight(300); self.preview_canvas.zoomRequested.connect(self.on_zoom_requested); self.preview_canvas.layoutWidthChanged.connect(lambda _: self.update_preview())
         size_control_frame = QFrame(); size_control_layout = QHBoxLayout(size_control_frame); size_control_layout.setContentsMargins(0, 0, 0, 0)
-        size_label = QLabel("字体大小:"); self.size_slider = QSlider(Qt.Horizontal); self.size_slider.setRange(MIN_FONT_SIZE, MAX_FONT_SIZE); self.size_slider.setValue(INITIAL_FONT_SIZE); self.size_slider.valueChanged.connect(self.on_size_changed)
+        size_label = QLabel("字体大小:"); self.size_slider = QSlider(Qt.Horizontal); self.size_slider.setRange(MIN_FONT_SIZE, MAX_FONT_SIZE); self.size_slider.setValue(INITIAL_FONT_SIZE); self.size_slider.valueChanged.connect(self.on_size_changed); self.size_slider.sliderReleased.connect(self.on_size_slider_released)
         self.size_value_label = QLabel(str(INITIAL_FONT_SIZE)); self.size_value_label.setObjectName("ValueLabel"); self.size_value_label.setMinimumWidth(40)
         size_control_layout.addWidget(size_label); size_control_layout.addWidget(self.size_slider); size_control_layout.addWidget(self.size_value_label)
-        center_layout.addWidget(self.text_entry); center_layout.addWidget(self.preview_label, 1); center_layout.addWidget(size_control_frame)
+        self.compare_panel = ComparePanel(self.scheduler); self.compare_panel.hide(); self.compare_panel.closeRequested.connect(self.remove_from_comparison); self.compare_panel.zoomRequested.connect(self.on_zoom_requested)
+        self.font_list_widget.itemSelectionChanged.connect(self.sync_comparison)
+        self.glyph_map_panel = GlyphMapPanel(self.scheduler, self.get_app_path() / "fonts" / "unicode_names.idx"); self.glyph_map_panel.hide(); self.glyph_map_panel.characterClicked.connect(self.insert_character)
+        center_layout.addLayout(entry_layout); center_layout.addWidget(self.preview_canvas, 1); center_layout.addWidget(self.compare_panel, 1); center_layout.addWidget(self.glyph_map_panel, 1); center_layout.addWidget(size_control_frame)
         right_shadow_container = QWidget()
         right_shadow_container.setObjectName("ShadowContainer")
         right_shadow_container.setFixedWidth(240)
@@ -369,22 +2963,214 @@ class FontViewerApp(QMainWindow):
         info_layout.addWidget(self.font_path_label)
         info_layout.addWidget(QLabel("文件大小:"))
         info_layout.addWidget(self.font_size_label)
+        # 轮廓差异的摘要，导出过报告之后才显示
+        self.version_diff_title = QLabel("版本差异:"); self.version_diff_label = QLabel(); self.version_diff_label.setWordWrap(True)
+        info_layout.addWidget(self.version_diff_title); info_layout.addWidget(self.version_diff_label)
+        self.version_diff_title.hide(); self.version_diff_label.hide()
         info_layout.addStretch(1)
         info_button = QPushButton("关于")
         info_button.clicked.connect(self.show_info_dialog)
         info_layout.addWidget(info_button)
         main_splitter.addWidget(left_shadow_container); main_splitter.addWidget(center_frame); main_splitter.addWidget(right_shadow_container); main_splitter.setSizes([280, 700, 240])
         final_layout = QHBoxLayout(central_widget); final_layout.setContentsMargins(0, 0, 0, 0); final_layout.setSpacing(0); final_layout.addWidget(main_splitter)
+        self.scheduler_panel = SchedulerDebugPanel(self.scheduler, self)
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, activated=lambda: self.scheduler_panel.setVisible(not self.scheduler_panel.isVisible()))
 
+    @traced("load_initial_fonts")
     def load_initial_fonts(self):
-        app_path = self.get_app_path(); fonts_dir = app_path / "fonts"
+        # 先按快照立即显示上次的字体列表和预览（stale），再在后台和文件系统对账（revalidate）
+        snapshot = self.load_snapshot()
+        self.unverified_paths = set()
+        for path in snapshot.get("fonts", []):
+            self.add_font_to_list(path); self.unverified_paths.add(path)
+        if snapshot.get("multiline"): self.multiline_button.setChecked(True)
+        if snapshot.get("glyph_map"): self.glyph_map_button.setChecked(True)
+        if snapshot.get("text"):
+            (self.sample_editor.setPlainText if self.multiline_button.isChecked() else self.text_entry.setText)(snapshot["text"])
+        if snapshot.get("font_size"): self.size_slider.setValue(int(snapshot["font_size"]))
+        selected = snapshot.get("selected")
+        item = self.find_font_item(selected) if selected else None
+        if item is not None:
+            self.font_list_widget.setCurrentItem(item)
+            # 和程序在同一挂载点上才同步读取；外部位置可能离线，交给后台加载
+            mounts = list_mount_points()
+            if mount_point_of(selected, mounts) == mount_point_of(self.get_app_path(), mounts):
+                try: self.on_font_data_ready(selected, read_font_bytes(selected))
+                except OSError: pass
+            else: self.on_font_selected(item)
+        fonts_dir = self.get_app_path() / "fonts"
+        self.scheduler.submit(LANE_BACKGROUND, scan_library, fonts_dir, list(self.saved_font_paths), callback=self.apply_library_scan)
+        index = FontIndex(fonts_dir / "font_index.json")
+        self.scheduler.submit(LANE_BACKGROUND, index.load, callback=self.on_font_index_loaded)
+
+    def find_font_item(self, filepath):
+        return self.font_items.get(filepath)
+
+    def remove_font_item(self, item):
+        self.font_items.pop(item.data(Qt.UserRole), None); self.library_generation += 1
+        self.facets.remove(item.data(Qt.UserRole)); self.facet_timer.start()
+        self.font_list_widget.takeItem(self.font_list_widget.row(item))
+
+    @traced("apply_library_scan")
+    def apply_library_scan(self, result):
+        # 只把差异（新增/删除）应用到列表上，已经显示的条目保持不动
+        paths, statuses = result
+        target = set(paths)
+        for path in list(self.unverified_paths):
+            if path not in target:
+                item = self.find_font_item(path)
+                if item is not None: self.remove_font_item(item)
+        self.unverified_paths.clear()
+        for row, path in enumerate(paths):
+            if path in self.font_items: continue
+            item = QListWidgetItem(os.path.basename(path)); item.setData(Qt.UserRole, path)
+            self.font_list_widget.insertItem(min(row, self.font_list_widget.count()), item); self.font_items[path] = item
+            self.facets.add(path); self.facet_timer.start()
+        self.library_generation += 1
+        for path, status in statuses.items():
+            item = self.find_font_item(path)
+            if item is not None: item.setData(FONT_STATUS_ROLE, status)
+        # 只有确认已被删除的快捷方式才移除，离线的继续保留在保存列表里
+        missing = {p for p, status in statuses.items() if status == PATH_MISSING}
+        if missing: self.saved_font_paths.remove_many(missing)
+        self.startup_timings["consistent_ms"] = (time.perf_counter() - APP_START_TIME) * 1000
+        self.report_startup_timings()
+        self.save_snapshot()
+        self.queue_indexing(paths)
 
-        if fonts_dir.is_dir():
-            font_files = sorted(fonts_dir.glob("*.ttf")) + sorted(fonts_dir.glob("*.otf"))
-            for font_path in font_files: self.add_font_to_list(str(font_path))
+    # 后台索引：空闲时分批解析还不在索引里（或已经变化）的字体
+    def on_font_index_loaded(self, index):
+        self.font_index = index
+        self.queue_indexing(list(self.font_items)); self.filter_button.setEnabled(True)
 
-        for path in self.saved_font_paths:
-            self.add_font_to_list(path)
+    def queue_indexing(self, paths):
+        if self.font_index is None: return
+        self.index_queue.extend(paths); self.index_timer.start()
+
+    def flush_index_queue(self, chunk_size=32):
+        queued = [p for p in dict.fromkeys(self.index_queue) if p in self.font_items]
+        paths = [p for p in queued if self.font_items[p].data(FONT_STATUS_ROLE) != PATH_OFFLINE]
+        self.index_queue = []
+        # 索引里已有的条目（包括离线的字体）直接交给分面筛选，缺的等解析完再补
+        self.queue_facets([(p, self.font_index.entries[p]) for p in queued if "faces" in self.font_index.entries.get(p, {})])
+        for i in range(0, len(paths), chunk_size):
+            self.scheduler.submit(LANE_BACKGROUND, refresh_index, self.font_index, paths[i:i + chunk_size], callback=self.on_index_chunk, idle_only=True)
+
+    def on_index_chunk(self, results):
+        for path, entry in results: self.font_index.put(path, entry)
+        self.library_generation += 1
+        if results: self.index_save_timer.start()
+        self.queue_facets([(path, entry) for path, entry in results if path in self.font_items and "faces" in entry])
+
+    # 分面筛选：元数据在后台转换成各列的值，主线程只写入列存储和切换列表项的隐藏状态
+    def queue_facets(self, entries, chunk_size=2048):
+        for i in range(0, len(entries), chunk_size):
+            self.scheduler.submit(LANE_BACKGROUND, facet_rows, entries[i:i + chunk_size], callback=self.on_facet_rows)
+
+    def on_facet_rows(self, rows):
+        self.facets.update(rows); self.facet_timer.start()
+
+    def set_filter_mode(self, enabled):
+        self.facet_panel.setVisible(enabled)
+        # 关闭时清掉所有选项，列表恢复显示全部字体
+        if enabled: self.apply_facets()
+        else: self.facet_panel.clear()
+
+    @traced("apply_facets")
+    def apply_facets(self):
+        # 只改变可见性变化了的列表项；面板关着并且之前也没筛选过就什么都不用做
+        enabled = self.filter_button.isChecked()
+        if not enabled and not self.facets_filtered: return
+        selection = self.facet_panel.selection() if enabled else {}
+        lw = self.font_list_widget
+        visible, counts, show_rows, hide_rows = self.facets.apply(selection)
+        if len(show_rows) > len(self.font_items) - visible:
+            # 要重新显示的行比筛选后仍然隐藏的行还多：QListView.reset 一次清掉所有隐藏状态（选择也会被清掉，之后恢复），再只隐藏不匹配的行
+            current = lw.currentItem(); selected = lw.selectedItems(); blocked = lw.blockSignals(True)
+            lw.reset(); self.facets.mark_all_shown(); visible, counts, show_rows, hide_rows = self.facets.apply(selection)
+            if current is not None: lw.setCurrentItem(current, QItemSelectionModel.NoUpdate)
+            for item in selected: item.setSelected(True)
+            lw.blockSignals(blocked)
+        self.facets_filtered = bool(selection); paths = self.facets.paths
+        for row in hide_rows: self.font_items[paths[row]].setHidden(True)
+        for row in show_rows: self.font_items[paths[row]].setHidden(False)
+        if enabled: self.facet_panel.set_counts(visible, len(self.font_items), counts)
+
+    # 语料覆盖率：后台统计字频，再对整个字体库打分，结果显示在列表右侧并可按它排序
+    def analyze_corpus_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择语料文件（UTF-8 文本）", "", "文本文件 (*.txt);;所有文件 (*)")
+        if not path: return
+        self.corpus_token.cancel(); self.corpus_token = CancelToken()
+        self.corpus_button.setEnabled(False); self.corpus_button.setText("正在统计...")
+        self.scheduler.submit(LANE_BACKGROUND, corpus_histogram, path, self.corpus_token, token=self.corpus_token,
+                              callback=lambda histogram: self.on_corpus_histogram(path, histogram), error_callback=self.on_corpus_failed)
+
+    def on_corpus_histogram(self, path, histogram):
+        codepoints, counts = histogram
+        self.corpus_histogram = histogram
+        self.sort_combo.setToolTip(f"语料：{Path(path).name}，{len(codepoints)} 种字符，共 {int(sum(counts))} 个")
+        self.score_corpus()
+
+    def score_corpus(self):
+        # 索引里已有的条目直接打分，还没索引的字体（离线的除外）在同一个任务里顺便解析
+        indexed = self.font_index.entries if self.font_index else {}
+        entries = [(p, indexed[p]) for p in self.font_items if "faces" in indexed.get(p, {})]
+        pending = [p for p, item in self.font_items.items() if p not in indexed and item.data(FONT_STATUS_ROLE) != PATH_OFFLINE]
+        self.scheduler.submit(LANE_BACKGROUND, analyze_corpus, self.corpus_histogram, entries, pending, token=self.corpus_token,
+                              callback=self.on_corpus_scores, error_callback=self.on_corpus_failed)
+
+    def on_corpus_scores(self, result):
+        scores, fresh = result
+        if self.font_index is not None: self.on_index_chunk([(p, entry) for p, entry in fresh if p in self.font_items])
+        distinct = len(self.corpus_histogram[0])
+        for path, item in self.font_items.items():
+            score = scores.get(path); item.setData(FONT_CORPUS_ROLE, score)
+            item.setToolTip(f"覆盖语料中 {score[0]}/{distinct} 种字符（{score[1]:.1%}），按字频加权 {score[2]:.1%}" if score else "")
+        self.corpus_button.setEnabled(True); self.corpus_button.setText("语料覆盖率...")
+        self.sort_combo.show()
+        if self.sort_combo.currentIndex() == 0: self.sort_combo.setCurrentIndex(2)
+        else: self.sort_font_list()
+
+    def on_corpus_failed(self, e):
+        self.corpus_button.setEnabled(True); self.corpus_button.setText("语料覆盖率...")
+        self.show_native_error_message("统计失败", f"无法统计语料覆盖率:\n{e}")
+
+    @traced("sort_font_list")
+    def sort_font_list(self, column=None):
+        # 把所有条目取出来按新顺序放回去，选中状态和当前项保持不变；没有得分的排在最后
+        column = self.sort_combo.currentIndex() if column is None else column
+        if column: self.font_list_widget.itemDelegate().score_column = column
+        lw = self.font_list_widget; current = lw.currentItem(); selected = lw.selectedItems()
+        items = [lw.item(i) for i in range(lw.count())]
+        if column == 0: items.sort(key=lambda item: item.text().lower())
+        else: items.sort(key=lambda item: -(item.data(FONT_CORPUS_ROLE) or (0, -1.0, -1.0))[column])
+        lw.setUpdatesEnabled(False); blocked = lw.blockSignals(True)
+        while lw.count(): lw.takeItem(lw.count() - 1)
+        for item in items: lw.addItem(item)
+        if current is not None: lw.setCurrentItem(current, QItemSelectionModel.NoUpdate)
+        for item in selected: item.setSelected(True)
+        lw.blockSignals(blocked); lw.setUpdatesEnabled(True); lw.scrollToTop()
+        self.facets.mark_all_shown(); self.apply_facets()
+
+    def save_font_index(self):
+        self.scheduler.submit(LANE_BACKGROUND, self.font_index.save, dict(self.font_index.entries))
+
+    def report_startup_timings(self):
+        # 首帧时间和对账完成时间分开统计，两者都有了才输出
+        if "first_paint_ms" in self.startup_timings and "consistent_ms" in self.startup_timings:
+            print(f"启动耗时：首帧 {self.startup_timings['first_paint_ms']:.0f} ms，列表与磁盘一致 {self.startup_timings['consistent_ms']:.0f} ms")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_paint_done:
+            self.first_paint_done = True
+            self.startup_timings["first_paint_ms"] = (time.perf_counter() - APP_START_TIME) * 1000
+            self.report_startup_timings()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 构造时预览控件还没有最终尺寸，显示时按实际大小重画一次
+        if not self.first_paint_done: self.update_preview()
 
     def add_font_file(self):
         start_dir = str(self.get_app_path())
@@ -407,6 +3193,9 @@ class FontViewerApp(QMainWindow):
         if not filepaths:
             return
         
+        self.add_font_paths(filepaths)
+
+    def add_font_paths(self, filepaths):
         app_fonts_dir = self.get_app_path() / "fonts"
         for filepath in filepaths:
             path_obj = Path(filepath)
@@ -415,23 +3204,34 @@ class FontViewerApp(QMainWindow):
                 self.add_font_to_list(filepath)
                 continue
             
-            if filepath not in self.saved_font_paths:
-                self.saved_font_paths.append(filepath)
+            # 写盘由 SavedPathsStore 防抖合并，一批添加只写一次
+            if self.saved_font_paths.add(filepath):
                 self.add_font_to_list(filepath)
-        
-        self.save_paths()
+
+    def open_font_files(self, filepaths):
+        # 命令行参数或其它实例转发过来的文件：加入列表并立即预览最后一个
+        filepaths = [p for p in filepaths if p.lower().endswith(FONT_SUFFIXES) and os.path.isfile(p)]
+        if filepaths:
+            self.add_font_paths(filepaths)
+            item = self.find_font_item(filepaths[-1])
+            if item is not None:
+                self.font_list_widget.setCurrentItem(item); self.on_font_selected(item)
+        if self.isMinimized(): self.showNormal()
+        self.raise_(); self.activateWindow()
 
     # 增加防重复检查
+    @traced("add_font_to_list")
     def add_font_to_list(self, filepath):
         # 检查该路径是否已在列表中
-        for i in range(self.font_list_widget.count()):
-            if self.font_list_widget.item(i).data(Qt.UserRole) == filepath:
-                print(f"字体路径 '{filepath}' 已在列表中，跳过添加。")
-                return
+        if self.find_font_item(filepath) is not None:
+            print(f"字体路径 '{filepath}' 已在列表中，跳过添加。")
+            return
         
         item = QListWidgetItem(os.path.basename(filepath))
         item.setData(Qt.UserRole, filepath)
-        self.font_list_widget.addItem(item)
+        self.font_list_widget.addItem(item); self.font_items[filepath] = item; self.library_generation += 1
+        self.facets.add(filepath); self.facet_timer.start()
+        self.queue_indexing([filepath])
 
     def show_font_context_menu(self, pos):
         item = self.font_list_widget.itemAt(pos)
@@ -439,6 +3239,10 @@ class FontViewerApp(QMainWindow):
         font_path = Path(item.data(Qt.UserRole)); app_fonts_dir = self.get_app_path() / "fonts"; is_internal = font_path.parent == app_fonts_dir
         menu = QMenu(); menu.setAttribute(Qt.WA_TranslucentBackground)
         delete_text = "删除字体文件" if is_internal else "删除快捷方式"; delete_action = menu.addAction(delete_text)
+        menu.addSeparator()
+        diff_current_action = menu.addAction("与当前字体比较差异"); diff_current_action.setEnabled(bool(self.current_font_path) and self.current_font_path != str(font_path))
+        diff_file_action = menu.addAction("与其他文件比较差异...")
+        outline_action = menu.addAction("导出轮廓差异报告..."); outline_action.setEnabled(diff_current_action.isEnabled())
         menu.setStyleSheet("""
             QMenu { background-color: #FFFFFF; border: 3px solid #E1E8ED; border-radius: 8px; padding: 0px; font-family: sans-serif; }
             QMenu::item { padding: 8px 20px; border-radius: 6px; background-color: transparent; border: none; }
@@ -447,6 +3251,34 @@ class FontViewerApp(QMainWindow):
         """)
         action = menu.exec_(self.font_list_widget.mapToGlobal(pos))
         if action == delete_action: self.delete_font_item(item, is_internal)
+        elif action == diff_current_action: self.open_font_diff(self.current_font_path, str(font_path))
+        elif action == diff_file_action:
+            other, _ = QFileDialog.getOpenFileName(self, "选择要比较的字体文件", str(font_path.parent), "字体文件 (*.ttf *.otf *.ttc)")
+            if other: self.open_font_diff(str(font_path), other)
+        elif action == outline_action: self.export_outline_diff(self.current_font_path, str(font_path))
+    def open_font_diff(self, path_a, path_b):
+        if np is None: self.show_native_error_message("缺少 NumPy", "字体差异比较需要 NumPy，请先安装：pip install numpy"); return
+        pixel_size = self.preview_font_size * self.logicalDpiY() / 72
+        self.scheduler.submit(
+            LANE_PREVIEW, read_font_pair, path_a, path_b,
+            callback=lambda datas: self.show_font_diff(path_a, path_b, datas, pixel_size),
+            error_callback=lambda e: self.show_native_error_message("加载失败", f"无法读取字体文件:\n{e}"))
+    def show_font_diff(self, path_a, path_b, datas, pixel_size):
+        window = FontDiffWindow(self.scheduler, path_a, datas[0], path_b, datas[1], self.sample_text(), pixel_size, self)
+        window.setStyleSheet(self.final_stylesheet); window.show(); window.start()
+    def export_outline_diff(self, path_a, path_b):
+        out_path, _ = QFileDialog.getSaveFileName(self, "保存轮廓差异报告", f"{Path(path_a).stem}-vs-{Path(path_b).stem}.json", "JSON (*.json)")
+        if not out_path: return
+        self.version_diff_label.setText("正在比较..."); self.version_diff_label.show(); self.version_diff_title.show()
+        # 在进程内逐字形比较（workers=1）：不从界面进程再拉起进程池，也不做工作进程的初始化
+        self.scheduler.submit(
+            LANE_COMPARE, outline_diff, path_a, path_b, 1,
+            callback=lambda report: self.on_outline_diff_ready(out_path, report),
+            error_callback=lambda e: (self.version_diff_label.setText("比较失败"), self.show_native_error_message("比较失败", f"无法比较字体轮廓:\n{e}")))
+    def on_outline_diff_ready(self, out_path, report):
+        self.version_diff_label.setText(f"{Path(report['b']['path']).name}：{outline_diff_summary(report)}")
+        try: atomic_write_text(out_path, json.dumps(report, ensure_ascii=False, indent=2))
+        except OSError as e: self.show_native_error_message("保存失败", f"无法写入报告文件:\n{e}")
     def delete_font_item(self, item, is_internal):
         font_path_str = item.data(Qt.UserRole); font_path = Path(font_path_str)
         if is_internal:
@@ -466,25 +3298,79 @@ class FontViewerApp(QMainWindow):
             msg_box.exec_()
             if msg_box.clickedButton() == yes_button:
                 try:
-                    os.remove(font_path); row = self.font_list_widget.row(item); self.font_list_widget.takeItem(row)
+                    os.remove(font_path); self.remove_font_item(item)
                 except OSError as e: self.show_native_error_message("删除失败", f"无法删除文件: {e}")
         else:
-            if font_path_str in self.saved_font_paths: self.saved_font_paths.remove(font_path_str); self.save_paths()
-            row = self.font_list_widget.row(item); self.font_list_widget.takeItem(row)
+            self.saved_font_paths.remove(font_path_str)
+            self.remove_font_item(item)
     def on_font_selected(self, item):
         if not item: return
         filepath = item.data(Qt.UserRole)
-        font_details = self.load_font(filepath)
+        # 取消上一次还没完成的加载，只保留最后一次点击
+        self.preview_token.cancel()
+        if item.data(FONT_STATUS_ROLE) == PATH_OFFLINE:
+            # 离线的快捷方式先带超时重新检查一次，恢复了再加载
+            self.preview_token = self.scheduler.submit(
+                LANE_PREVIEW, validate_paths, [filepath],
+                callback=lambda statuses, it=item: self.on_font_revalidated(it, statuses))
+            return
+        data = self.font_data_cache.get(filepath)
+        if data is not None:
+            self.font_data_cache.move_to_end(filepath)
+            self.on_font_data_ready(filepath, data)
+        else:
+            self.preview_token = self.scheduler.submit(
+                LANE_PREVIEW, read_font_bytes, filepath,
+                callback=lambda data, p=filepath: self.on_font_data_ready(p, data),
+                error_callback=lambda e, p=filepath: self.show_native_error_message("加载失败", f"无法读取字体文件:\n{p}\n{e}"))
+        self.prefetch_neighbours(self.font_list_widget.row(item))
+    def on_font_revalidated(self, item, statuses):
+        filepath = item.data(Qt.UserRole); status = statuses.get(filepath, PATH_OFFLINE)
+        if self.font_list_widget.row(item) < 0: return
+        if status == PATH_OK:
+            item.setData(FONT_STATUS_ROLE, PATH_OK); self.on_font_selected(item)
+        elif status == PATH_MISSING:
+            item.setData(FONT_STATUS_ROLE, PATH_MISSING)
+            self.show_native_error_message("加载失败", f"字体文件已不存在:\n{filepath}")
+        else:
+            self.show_native_error_message("字体离线", f"字体所在的位置当前无法访问，请确认磁盘或网络共享已连接:\n{filepath}")
+    def on_font_data_ready(self, filepath, data):
+        self.cache_font_data(filepath, data)
+        font_details = self.load_font(filepath, data)
         if font_details:
             family, style, weight, italic, font_id = font_details
-            self.current_font_family = family; self.current_font_id = font_id
+            self.current_font_family = family; self.current_font_id = font_id; self.current_font_path = filepath
             self.font_name_label.setText(family); self.font_style_label.setText(style); self.font_weight_label.setText(f"{weight}"); self.font_italic_label.setText("是" if italic else "否"); self.font_path_label.setText(filepath)
-            try: size_kb = Path(filepath).stat().st_size / 1024; self.font_size_label.setText(f"{size_kb:.1f} KB")
-            except FileNotFoundError: self.font_size_label.setText("未知大小")
+            self.font_size_label.setText(f"{len(data) / 1024:.1f} KB")
+            self.glyph_map_panel.set_font((filepath, len(data)), data)
+            if self.inspect_button.isChecked(): self.load_coverage(filepath, data)
             self.update_preview()
-    def load_font(self, filepath):
+    def prefetch_neighbours(self, row):
+        # 低优先级预读相邻字体文件，上下切换时可以直接从内存加载
+        for offset in range(1, PREFETCH_RADIUS + 1):
+            for r in (row + offset, row - offset):
+                item = self.font_list_widget.item(r)
+                if item is None: continue
+                path = item.data(Qt.UserRole)
+                if item.data(FONT_STATUS_ROLE) == PATH_OFFLINE: continue
+                if path in self.font_data_cache or path in self.prefetching: continue
+                self.prefetching.add(path)
+                self.scheduler.submit(
+                    LANE_PREFETCH, read_font_bytes, path,
+                    callback=lambda data, p=path: self.cache_font_data(p, data),
+                    error_callback=lambda e, p=path: self.prefetching.discard(p))
+    def cache_font_data(self, filepath, data):
+        self.prefetching.discard(filepath)
+        if len(data) > FONT_CACHE_BUDGET // 4 or filepath in self.font_data_cache: return
+        self.font_data_cache[filepath] = data; self.font_data_cache_bytes += len(data)
+        while self.font_data_cache_bytes > FONT_CACHE_BUDGET:
+            _, old = self.font_data_cache.popitem(last=False); self.font_data_cache_bytes -= len(old)
+    @traced("load_font")
+    def load_font(self, filepath, data=None):
         if self.current_font_id != -1: QFontDatabase.removeApplicationFont(self.current_font_id)
-        font_id = QFontDatabase.addApplicationFont(filepath)
+        # 字体 id 和家族名在卸载后可能被别的文件复用，矢量缓存和瓦片随字体一起清掉
+        self.text_paths.clear(); clear_paragraph_layouts(); self.preview_scenes.clear(); self.preview_canvas.clear_tiles()
+        font_id = QFontDatabase.addApplicationFontFromData(QByteArray(data)) if data is not None else QFontDatabase.addApplicationFont(filepath)
         if font_id == -1: self.show_native_error_message("加载失败", f"无法加载字体文件:\n{filepath}"); return None
         families = QFontDatabase.applicationFontFamilies(font_id)
         if not families: self.show_native_error_message("加载失败", f"无法从此文件获取字体家族名称:\n{filepath}"); QFontDatabase.removeApplicationFont(font_id); return None
@@ -497,15 +3383,120 @@ class FontViewerApp(QMainWindow):
         weight = font_info.weight(); italic = font_info.italic()
         return family, style, weight, italic, font_id
     def on_size_changed(self, value):
-        self.preview_font_size = value; self.size_value_label.setText(str(value)); self.update_preview()
+        self.preview_font_size = value; self.size_value_label.setText(str(value))
+        # 拖动中只缩放上一次的完整渲染，耗时和字号、文本长度无关；松开或停顿后再完整重画
+        if self.compare_button.isChecked() and self.size_slider.isSliderDown():
+            self.compare_panel.show_interim(value); self.full_render_timer.start()
+        elif self.size_slider.isSliderDown() and self.preview_canvas.scene is not None:
+            self.preview_canvas.show_interim(value); self.full_render_timer.start()
+        else: self.update_preview()
+    def on_size_slider_released(self):
+        if self.full_render_timer.isActive(): self.full_render_timer.stop(); self.update_preview()
+    def sample_text(self):
+        return self.sample_editor.toPlainText() if self.multiline_button.isChecked() else self.text_entry.text()
+    def set_multiline(self, enabled):
+        # 切换单行/多行输入，文字跟着带过去（转回单行时换行变成空格）
+        editor, other = (self.sample_editor, self.text_entry) if enabled else (self.text_entry, self.sample_editor)
+        editor.blockSignals(True)
+        if enabled: self.sample_editor.setPlainText(self.text_entry.text())
+        else: self.text_entry.setText(" ".join(self.sample_editor.toPlainText().splitlines()))
+        editor.blockSignals(False)
+        other.hide(); editor.show(); editor.setFocus()
+        self.update_preview()
+    def set_inspect_mode(self, enabled):
+        # 检查时预览一律用原生排版（矢量绘制没有字符位置，无法命中测试）
+        if not enabled: self.coverage_token.cancel(); self.preview_canvas.set_coverage(None)
+        elif self.current_font_path: self.load_coverage(self.current_font_path, self.font_data_cache.get(self.current_font_path))
+        self.update_preview()
+    def load_coverage(self, path, data):
+        self.coverage_token.cancel(); self.preview_canvas.set_coverage(None)
+        coverage = self.coverage_cache.get(path)
+        if coverage is not None: self.coverage_cache.move_to_end(path); self.preview_canvas.set_coverage(coverage); return
+        self.coverage_token = self.scheduler.submit(
+            LANE_PREVIEW, font_coverage, self.font_index, path, data,
+            callback=lambda coverage: self.on_coverage_ready(path, coverage),
+            error_callback=lambda e: print(f"读取字体覆盖范围失败: {e}"))
+    def on_coverage_ready(self, path, coverage):
+        self.coverage_cache[path] = coverage
+        while len(self.coverage_cache) > COVERAGE_CACHE_FONTS: self.coverage_cache.popitem(last=False)
+        if path == self.current_font_path and self.inspect_button.isChecked(): self.preview_canvas.set_coverage(coverage)
+    def insert_character(self, char):
+        # 字符表里点击的字符插到输入框的光标处
+        if self.multiline_button.isChecked(): self.sample_editor.insertPlainText(char)
+        else: self.text_entry.insert(char)
+    def set_compare_mode(self, enabled):
+        # 对比模式下列表可以多选；退出时卸载所有对比字体，回到单选和当前字体的预览
+        self.font_list_widget.setSelectionMode(QListWidget.ExtendedSelection if enabled else QListWidget.SingleSelection)
+        self.preview_canvas.setVisible(not enabled); self.compare_panel.setVisible(enabled)
+        if enabled: self.sync_comparison(); self.update_preview(); return
+        current = self.font_list_widget.currentItem()
+        self.font_list_widget.blockSignals(True); self.font_list_widget.clearSelection()
+        if current is not None: current.setSelected(True)
+        self.font_list_widget.blockSignals(False)
+        self.set_compared_fonts([]); self.update_preview()
+    def sync_comparison(self):
+        if not self.compare_button.isChecked(): return
+        selected = sorted(self.font_list_widget.selectedItems(), key=self.font_list_widget.row)
+        self.set_compared_fonts([item.data(Qt.UserRole) for item in selected[:COMPARE_MAX_FONTS]])
+    def remove_from_comparison(self, path):
+        item = self.find_font_item(path)
+        if item is not None: item.setSelected(False)
+        else: self.set_compared_fonts([p for p in self.compare_panel.panes if p != path])
+    def set_compared_fonts(self, paths):
+        for path in [p for p in self.compare_fonts if p not in paths]:
+            font_id, _ = self.compare_fonts.pop(path); QFontDatabase.removeApplicationFont(font_id)
+            # 家族名卸载后可能被别的文件复用，按家族缓存的段落排版一起清掉
+            clear_paragraph_layouts()
+        for path in [p for p in self.compare_tokens if p not in paths]: self.compare_tokens.pop(path).cancel()
+        for path in self.compare_panel.set_fonts(paths):
+            data = self.font_data_cache.get(path)
+            if data is not None: self.on_compare_data_ready(path, data); continue
+            self.compare_tokens[path] = self.scheduler.submit(
+                LANE_PREVIEW, read_font_bytes, path,
+                callback=lambda data, p=path: self.on_compare_data_ready(p, data),
+                error_callback=lambda e, p=path: (self.compare_tokens.pop(p, None), self.compare_panel.set_error(p, f"无法读取字体文件：{e}")))
+    def on_compare_data_ready(self, path, data):
+        self.compare_tokens.pop(path, None); self.cache_font_data(path, data)
+        font_id = QFontDatabase.addApplicationFontFromData(QByteArray(data))
+        families = QFontDatabase.applicationFontFamilies(font_id) if font_id != -1 else []
+        if not families:
+            if font_id != -1: QFontDatabase.removeApplicationFont(font_id)
+            self.compare_panel.set_error(path, "无法加载这个字体"); return
+        # 粗细和斜体从文件本身读，同一家族的不同字重才能各自显示
+        raw = QRawFont(QByteArray(data), INITIAL_FONT_SIZE)
+        face = (families[0], raw.weight(), raw.style() != QFont.StyleNormal) if raw.isValid() else (families[0], QFont.Normal, False)
+        label = f"{families[0]} {raw.styleName()}" if raw.isValid() else families[0]
+        # 家族、粗细、斜体都相同的两个文件（比如新旧版本）只能查到其中一个，提示一下
+        if any(f == face for _, f in self.compare_fonts.values()): label += "（与另一格同名同字重，显示可能相同）"
+        self.compare_fonts[path] = (font_id, face)
+        self.compare_panel.set_face(path, face, label)
+    def on_zoom_requested(self, steps):
+        size = round(self.preview_font_size * ZOOM_STEP ** steps)
+        if size == self.preview_font_size: size += 1 if steps > 0 else -1
+        self.size_slider.setValue(max(MIN_FONT_SIZE, min(MAX_FONT_SIZE, size)))
+    @traced("update_preview")
     def update_preview(self):
+        self.full_render_timer.stop()
+        if self.compare_button.isChecked(): self.compare_panel.update_panes(self.sample_text(), self.preview_font_size); return
         if not self.current_font_family: return
-        text = self.text_entry.text(); font = QFont(self.current_font_family, self.preview_font_size); font.setStyleStrategy(QFont.PreferAntialias)
-        rect = self.preview_label.rect(); pixmap = QPixmap(rect.size() * self.devicePixelRatioF()); pixmap.setDevicePixelRatio(self.devicePixelRatioF()); pixmap.fill(Qt.transparent)
-        p = QPainter(pixmap); p.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing | QPainter.SmoothPixmapTransform); p.setFont(font); p.setPen(QColor("#222"))
-        doc = QTextDocument(); doc.setDefaultFont(font); doc.setPlainText(text if text else "从左边选一个字体开始查看吧！"); doc.setTextWidth(rect.width() - 20)
-        y = max((rect.height() - doc.size().height()) / 2, 0); p.translate(10, y); doc.drawContents(p); p.end()
-        self.preview_label.setPixmap(pixmap)
+        text = self.sample_text()
+        width = self.preview_canvas.viewport().width(); inspecting = self.inspect_button.isChecked()
+        key = (self.current_font_family, text, self.preview_font_size, width, inspecting)
+        scene = self.preview_scenes.get(key)
+        if scene is None:
+            # 大字号优先用缓存的字形轮廓直接缩放绘制，不用重新排版；瓦片由画布按需在后台绘制
+            paths = self.text_paths.get(self.current_font_family, text) if self.preview_font_size >= VECTOR_MIN_POINT_SIZE and not inspecting else None
+            scene = self.preview_scenes[key] = PreviewScene(*key[:4], paths)
+            while len(self.preview_scenes) > PREVIEW_SCENE_CACHE: self.preview_scenes.popitem(last=False)
+        else: self.preview_scenes.move_to_end(key)
+        self.preview_canvas.set_scene(scene)
+    def closeEvent(self, event):
+        self.corpus_token.cancel()
+        self.save_snapshot()
+        self.saved_font_paths.close()
+        self.scheduler.shutdown()
+        if self.index_save_timer.isActive(): self.index_save_timer.stop(); self.font_index.save()
+        super().closeEvent(event)
     def show_native_error_message(self, title, text):
         msg_box = QMessageBox(); msg_box.setIcon(QMessageBox.Critical); msg_box.setWindowTitle("错误"); msg_box.setText(title); msg_box.setInformativeText(text); msg_box.setWindowFlags(msg_box.windowFlags() | Qt.WindowStaysOnTopHint); msg_box.exec_()
     def show_info_dialog(self):
@@ -520,15 +3511,305 @@ class FontViewerApp(QMainWindow):
         """)
         msg.exec_()
 
+# -------------------------------------------------------------------
+# 命令行样张渲染（--render DIR）
+# 无界面运行，按字体文件分发到进程池，每个进程有自己的 QFontDatabase，
+# 互不干扰；复用上面的预览渲染代码，逐个输出进度
+# -------------------------------------------------------------------
+FONT_SUFFIXES = ('.ttf', '.otf', '.ttc')
+_worker_app = None
+
+def init_render_worker():
+    global _worker_app
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    _worker_app = QGuiApplication.instance() or QGuiApplication([sys.argv[0]])
+
+def render_specimen(job):
+    font_path, out_path, text, point_size, width, height, transparent = job
+    font_id = QFontDatabase.addApplicationFont(font_path)
+    if font_id == -1: return font_path, None, "无法加载字体文件"
+    try:
+        families = QFontDatabase.applicationFontFamilies(font_id)
+        if not families: return font_path, None, "无法获取字体家族名称"
+        image = render_text_image(families[0], text, point_size, width, height, transparent)
+        if not image.save(out_path, "PNG"): return font_path, None, "写入 PNG 失败"
+        return font_path, out_path, None
+    finally:
+        QFontDatabase.removeApplicationFont(font_id)
+
+def run_render_cli(args):
+    font_dir = Path(args.render); out_dir = Path(args.out)
+    if not font_dir.is_dir(): print(f"错误：{font_dir} 不是目录", file=sys.stderr); return 2
+    font_files = sorted(p for p in font_dir.iterdir() if p.is_file() and p.name.lower().endswith(FONT_SUFFIXES))
+    if not font_files: print(f"{font_dir} 中没有字体文件", file=sys.stderr); return 0
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [(str(p), str(out_dir / f"{p.stem}.png"), args.text, args.size, args.width, args.height, args.transparent) for p in font_files]
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(jobs)))
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    failures = 0
+    # 用 spawn 启动，子进程不会继承父进程里的任何 Qt 状态
+    with multiprocessing.get_context("spawn").Pool(workers, initializer=init_render_worker) as pool:
+        for done, (font_path, out_path, error) in enumerate(pool.imap_unordered(render_specimen, jobs), start=1):
+            if error: failures += 1; print(f"[{done}/{len(jobs)}] 失败 {font_path}: {error}", flush=True)
+            else: print(f"[{done}/{len(jobs)}] {font_path} -> {out_path}", flush=True)
+    print(f"完成：{len(jobs) - failures} 个成功，{failures} 个失败", flush=True)
+    return 1 if failures else 0
+
+# -------------------------------------------------------------------
+# 命令行元数据导出（--dump-metadata [PATH ...]）
+# 每个字体面输出一行 JSON 到标准输出（NDJSON），边扫描边输出；
+# 索引里已有且未变化的直接输出，其余的用进程池并行解析并写回索引
+# -------------------------------------------------------------------
+def expand_font_paths(targets):
+    paths = []
+    for target in targets:
+        target = Path(target)
+        if target.is_dir(): paths.extend(str(p) for p in sorted(target.rglob("*")) if p.is_file() and p.name.lower().endswith(FONT_SUFFIXES))
+        else: paths.append(str(target))
+    return paths
+
+def run_dump_metadata(args):
+    fonts_dir = app_path() / "fonts"
+    if args.dump_metadata: paths = expand_font_paths(args.dump_metadata)
+    else:
+        # 默认导出整个字体库：fonts 目录和保存的外部快捷方式
+        saved = SavedPathsStore(fonts_dir / "saved_paths.json").load()
+        library = list_fonts_dir(fonts_dir); in_library = set(library)
+        paths = library + [p for p in saved if p not in in_library]
+    index = FontIndex(fonts_dir / "font_index.json").load()
+    out = sys.stdout
+    def emit(path, entry):
+        for record in face_records(path, entry): out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+    cold = []; pool = None
+    try:
+        for path in paths:
+            entry = index.lookup(path)
+            if entry is None: cold.append(path)
+            else: emit(path, entry)
+        if len(cold) < 8 or args.workers == 1:
+            results = map(index_font_file, cold)
+        else:
+            workers = min(args.workers or os.cpu_count() or 1, len(cold))
+            pool = multiprocessing.get_context("spawn").Pool(workers)
+            results = pool.imap_unordered(index_font_file, cold, chunksize=4)
+        for path, entry in results:
+            index.put(path, entry); emit(path, entry)
+        if pool is not None: pool.close()
+    except BrokenPipeError:
+        # 下游（例如 head）提前关闭了管道，不算错误
+        os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+    finally:
+        # 正常结束时任务都已完成；中途退出时剩下的任务不再需要，直接结束子进程
+        if pool is not None: pool.terminate(); pool.join()
+        if cold: index.save()
+    return 0
+
+# -------------------------------------------------------------------
+# 逐字形轮廓比较（--outline-diff A B）
+# 按码位对齐两个字体文件，比较字形宽度（hmtx）和轮廓。TrueType 直接对 glyf 里的原始数据
+# 取哈希（去掉微调指令；复合字形按组件自己的哈希展开，不受字形重新编号影响），其它格式
+# 用 QRawFont.pathForGlyph 按字体单位取轮廓、序列化后取哈希，字符多时分块交给进程池
+# -------------------------------------------------------------------
+OUTLINE_DIFF_CHUNK = 4096
+OUTLINE_DIFF_POOL_MIN = 8192   # 需要 Qt 取轮廓且字符数超过这个值才启动进程池（启动进程本身要一两秒）
+
+class GlyphOutlines:
+    # 一个字体文件（集合里的第一个面）的 cmap、宽度和逐字形轮廓哈希
+    def __init__(self, data):
+        self.data = data; tables = self.tables = _table_directory(data, _face_offsets(data)[0])
+        self.glyphs = _parse_cmap_glyphs(data, tables[b"cmap"][0]) if b"cmap" in tables else {}
+        self.num_glyphs = _u16(data, tables[b"maxp"][0] + 4) if b"maxp" in tables else 0
+        self.units_per_em = _u16(data, tables[b"head"][0] + 18) if b"head" in tables else 0
+        self.hmetrics = _u16(data, tables[b"hhea"][0] + 34) if b"hhea" in tables and b"hmtx" in tables else 0
+        self.kind = "glyf" if all(t in tables for t in (b"glyf", b"loca", b"head")) else "path"
+        if self.kind == "glyf": self.long_loca = struct.unpack_from(">h", data, tables[b"head"][0] + 50)[0] == 1
+        self.hashes = {}; self.raw = None
+
+    def advance(self, gid):
+        if not self.hmetrics: return 0
+        return _u16(self.data, self.tables[b"hmtx"][0] + min(gid, self.hmetrics - 1) * 4)
+
+    def side_bearing(self, gid):
+        if not self.hmetrics: return b""
+        hmtx = self.tables[b"hmtx"][0]
+        offset = hmtx + gid * 4 + 2 if gid < self.hmetrics else hmtx + self.hmetrics * 4 + (gid - self.hmetrics) * 2
+        return self.data[offset:offset + 2]
+
+    def outline_hash(self, gid, depth=0):
+        digest = self.hashes.get(gid)
+        if digest is None:
+            # 左侧空白（hmtx 的 lsb）变了，渲染出的轮廓位置也会变，一起算进去
+            if self.kind == "glyf": digest = self.hashes[gid] = hashlib.blake2b(self.side_bearing(gid) + self._glyf_hash(gid, depth), digest_size=8).digest()
+            else: digest = self.hashes[gid] = self._path_hash(gid)
+        return digest
+
+    def _glyf_hash(self, gid, depth):
+        if gid >= self.num_glyphs: return b""
+        data = self.data; loca = self.tables[b"loca"][0]; base = self.tables[b"glyf"][0]
+        if self.long_loca: start, end = struct.unpack_from(">II", data, loca + gid * 4)
+        else: start, end = (2 * x for x in struct.unpack_from(">HH", data, loca + gid * 2))
+        start += base; end += base
+        if end <= start: return b""
+        contours = struct.unpack_from(">h", data, start)[0]
+        if contours >= 0:
+            # 简单字形：去掉微调指令和末尾的对齐填充
+            instructions = start + 10 + 2 * contours
+            return hashlib.blake2b(data[start:instructions] + data[instructions + 2 + _u16(data, instructions):end].rstrip(b"\0"), digest_size=8).digest()
+        digest = hashlib.blake2b(data[start:start + 10], digest_size=8); pos = start + 10
+        while True:
+            flags, component = struct.unpack_from(">HH", data, pos); pos += 4
+            size = (4 if flags & 0x0001 else 2) + (2 if flags & 0x0008 else 4 if flags & 0x0040 else 8 if flags & 0x0080 else 0)
+            # 0x0100 表示后面带微调指令，不算轮廓的一部分
+            digest.update(struct.pack(">H", flags & ~0x0100)); digest.update(self.outline_hash(component, depth + 1) if depth < 16 else b"")
+            digest.update(data[pos:pos + size]); pos += size
+            if not flags & 0x0020: break
+        return digest.digest()
+
+    def _path_hash(self, gid):
+        if self.raw is None:
+            # 像素字号等于每 em 单位数时，轮廓坐标就是字体单位；不做微调
+            self.raw = QRawFont(QByteArray(self.data), 12, QFont.PreferNoHinting); self.raw.setPixelSize(self.raw.unitsPerEm())
+        buffer = QByteArray(); stream = QDataStream(buffer, QIODevice.WriteOnly); stream << self.raw.pathForGlyph(gid)
+        return hashlib.blake2b(bytes(buffer), digest_size=8).digest()
+
+def load_outline_pair(path_a, path_b):
+    return outline_pair(read_font_bytes(path_a), read_font_bytes(path_b))
+
+def outline_pair(data_a, data_b):
+    a = GlyphOutlines(data_a); b = GlyphOutlines(data_b)
+    # 一个是 glyf 一个是 CFF 时原始数据没法比，都改用 Qt 取轮廓
+    if a.kind != b.kind: a.kind = b.kind = "path"
+    return a, b
+
+_outline_pair = None
+
+def init_outline_worker(path_a, path_b):
+    global _outline_pair
+    init_render_worker()
+    _outline_pair = load_outline_pair(path_a, path_b)
+
+def diff_outline_chunk(codepoints, pair=None):
+    # 返回 [(码位, {"advance": [A, B], "outline": True})]，只列出有变化的
+    a, b = pair or _outline_pair; changed = []
+    for cp in codepoints:
+        glyph_a = a.glyphs[cp]; glyph_b = b.glyphs[cp]; record = {}
+        advance_a = a.advance(glyph_a); advance_b = b.advance(glyph_b)
+        if advance_a != advance_b: record["advance"] = [advance_a, advance_b]
+        if a.outline_hash(glyph_a) != b.outline_hash(glyph_b): record["outline"] = True
+        if record: changed.append((cp, record))
+    return changed
+
+def outline_diff(path_a, path_b, workers=1):
+    # workers 为 1 时完全在当前进程里比较，不做任何工作进程的初始化：按轮廓路径比较要用 QRawFont，
+    # 由调用方保证已经有 QGuiApplication（界面进程本来就有，命令行入口自己建一个）；只有进程池里的子进程才调用 init_render_worker
+    start = time.perf_counter()
+    a, b = load_outline_pair(path_a, path_b)
+    common = sorted(a.glyphs.keys() & b.glyphs.keys())
+    chunks = [common[i:i + OUTLINE_DIFF_CHUNK] for i in range(0, len(common), OUTLINE_DIFF_CHUNK)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks)))
+    if a.kind == "path" and len(common) >= OUTLINE_DIFF_POOL_MIN and workers > 1:
+        with multiprocessing.get_context("spawn").Pool(workers, initializer=init_outline_worker, initargs=(path_a, path_b)) as pool:
+            results = list(pool.imap(diff_outline_chunk, chunks))
+    else:
+        results = [diff_outline_chunk(chunk, (a, b)) for chunk in chunks]
+    changed = [dict(codepoint=f"U+{cp:04X}", **record) for result in results for cp, record in result]
+    added = sorted(b.glyphs.keys() - a.glyphs.keys()); removed = sorted(a.glyphs.keys() - b.glyphs.keys())
+    def describe(path, outlines):
+        face = parse_font_data(outlines.data)[0]
+        return {"path": path, "family": face["family"], "style": face["style"], "glyph_count": outlines.num_glyphs,
+                "codepoints": len(outlines.glyphs), "units_per_em": outlines.units_per_em, "outlines": face["outline"]}
+    return {
+        "a": describe(path_a, a), "b": describe(path_b, b), "compared_by": "glyf" if a.kind == "glyf" else "path",
+        "summary": {"common": len(common), "added": len(added), "removed": len(removed),
+                    "advance_changed": sum("advance" in c for c in changed), "outline_changed": sum("outline" in c for c in changed),
+                    "unchanged": len(common) - len(changed)},
+        "added": [f"U+{cp:04X}" for cp in added], "removed": [f"U+{cp:04X}" for cp in removed], "changed": changed,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+def outline_diff_summary(report):
+    summary = report["summary"]
+    return (f"新增 {summary['added']}，删除 {summary['removed']}，宽度改变 {summary['advance_changed']}，"
+            f"轮廓改变 {summary['outline_changed']}（共有 {summary['common']} 个字符，{summary['unchanged']} 个未变）")
+
+def run_outline_diff(args):
+    path_a, path_b = args.outline_diff
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QGuiApplication.instance() or QGuiApplication([sys.argv[0]])
+    try: report = outline_diff(path_a, path_b, args.workers)
+    except (OSError, FontParseError, struct.error) as e: print(f"错误：{e}", file=sys.stderr); return 2
+    try: print(json.dumps(report, ensure_ascii=False, indent=2))
+    except BrokenPipeError: os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+    print(f"{Path(path_a).name} -> {Path(path_b).name}：{outline_diff_summary(report)}，用时 {report['elapsed_ms']} ms", file=sys.stderr)
+    return 0
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="字体预览器")
+    parser.add_argument("--trace", metavar="FILE", default=os.environ.get("AFV_TRACE"),
+                        help="记录性能追踪并在退出时写入 FILE（Chrome Trace JSON，可用 Perfetto 打开）")
+    # 开关和阈值分成两个参数，否则 --watchdog 后面的字体文件会被当成阈值吃掉
+    parser.add_argument("--watchdog", action="store_true", help="开启界面卡顿监视")
+    parser.add_argument("--watchdog-ms", type=int, default=None, metavar="MS",
+                        help=f"卡顿阈值毫秒数（默认 {DEFAULT_STALL_THRESHOLD_MS}），指定时也会开启卡顿监视")
+    render = parser.add_argument_group("样张渲染（无界面）")
+    render.add_argument("--render", metavar="DIR", help="为 DIR 中每个字体渲染一张 PNG 样张后退出")
+    render.add_argument("--text", default=DEFAULT_SAMPLE_TEXT, help="样张文字")
+    render.add_argument("--size", type=int, default=INITIAL_FONT_SIZE, help="字号（磅）")
+    render.add_argument("--out", metavar="DIR", default="specimens", help="PNG 输出目录")
+    render.add_argument("--width", type=int, default=1200, help="图片宽度（像素）")
+    render.add_argument("--height", type=int, default=0, help="图片高度（像素），0 表示按内容自动")
+    render.add_argument("--transparent", action="store_true", help="透明背景（默认白底）")
+    parser.add_argument("--workers", type=int, default=0, help="进程数（--render / --dump-metadata / --outline-diff），默认等于 CPU 核数")
+    parser.add_argument("files", nargs="*", metavar="FONT", help="启动后直接预览的字体文件；已有窗口在运行时交给它打开")
+    parser.add_argument("--rpc-socket", metavar="PATH", default=os.environ.get("AFV_RPC_SOCKET"),
+                        help="在 Unix 域套接字 PATH 上开启本地 JSON-RPC 查询接口（元数据、字符覆盖、渲染 PNG）")
+    parser.add_argument("--new-instance", action="store_true", help="不转发给已在运行的窗口，另开一个实例")
+    parser.add_argument("--dump-metadata", nargs="*", metavar="PATH",
+                        help="以 NDJSON 格式把字体元数据输出到标准输出后退出；不指定 PATH 时导出整个字体库")
+    parser.add_argument("--outline-diff", nargs=2, metavar=("A", "B"),
+                        help="逐字形比较两个字体文件（新增/删除的字符、宽度和轮廓变化），JSON 报告输出到标准输出后退出")
+    # 其余参数（例如 Qt 自己的 -style 等）原样交给 QApplication
+    args, qt_args = parser.parse_known_args(argv[1:])
+    # 位置参数里只有字体文件是给我们的，其它的（例如 -style 的取值）还给 Qt
+    files = [f for f in args.files if f.lower().endswith(FONT_SUFFIXES)]
+    qt_args += [f for f in args.files if f not in files]; args.files = files
+    # 之后 args.watchdog 是阈值毫秒数，None 表示不开启
+    if args.watchdog or args.watchdog_ms: args.watchdog = args.watchdog_ms or DEFAULT_STALL_THRESHOLD_MS
+    elif os.environ.get("AFV_WATCHDOG"):
+        value = os.environ["AFV_WATCHDOG"]
+        args.watchdog = int(value) if value.isdigit() and int(value) > 1 else DEFAULT_STALL_THRESHOLD_MS
+    else: args.watchdog = None
+    return args, argv[:1] + qt_args
+
 # -------------------------------------------------------------------
 # 程序主入口
 # -------------------------------------------------------------------
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    args, qt_argv = parse_args(sys.argv)
+    if args.render: sys.exit(run_render_cli(args))
+    if args.dump_metadata is not None: sys.exit(run_dump_metadata(args))
+    if args.outline_diff: sys.exit(run_outline_diff(args))
+    # 已有窗口在运行：把文件交给它，跳过界面初始化直接退出
+    if not args.new_instance and forward_to_running_instance(args.files): sys.exit(0)
+    if args.trace: TRACER.enable(args.trace)
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
     setup_fcitx5_im_plugin()
-    app = QApplication(sys.argv)
+    app = QApplication(qt_argv)
     viewer = FontViewerApp()
+    if not args.new_instance:
+        instance_server = InstanceServer(app)
+        instance_server.filesReceived.connect(viewer.open_font_files)
+        instance_server.listen()
+    if args.files: viewer.open_font_files(args.files)
+    if args.rpc_socket:
+        query_server = QueryServer(viewer, parent=app)
+        if query_server.listen(args.rpc_socket): app.aboutToQuit.connect(query_server.close)
+    if args.watchdog:
+        watchdog = StallWatchdog(viewer.get_app_path() / "stall_reports.jsonl", args.watchdog, parent=app)
+        watchdog.start(); app.aboutToQuit.connect(watchdog.stop)
     viewer.show()
     sys.exit(app.exec_())